@@ -1,5 +1,51 @@
 import sys
-from src.rag_engine import RAGEngine
+import json
+from src.service_client import create_engine
+
+def parse_filters(text):
+    """'subject=physics grade=9,10' -> {"subject": "physics", "grade": [9, 10]}; empty text clears the filter."""
+    filters = {}
+    for pair in text.split():
+        key, _, value = pair.partition("=")
+        values = [int(v) if v.isdigit() else v for v in value.split(",") if v]
+        filters[key] = values[0] if len(values) == 1 else values
+    return filters or None
+
+def run_batch(engine, path, mode="hybrid", out_path=None, filters=None):
+    """Answers every non-empty line of a file as one batch."""
+    with open(path, 'r', encoding='utf-8') as f:
+        queries = [line.strip() for line in f if line.strip()]
+
+    print(f"\nAnswering {len(queries)} queries from {path}...")
+    results = engine.get_responses(queries, search_mode=mode, filters=filters)
+
+    for n, result in enumerate(results, start=1):
+        print(f"\n[{n}] Student: {result['query']}")
+        if result["error"]:
+            print(f"❌ {result['error']}")
+        else:
+            print(f"ScienceBot: {result['answer']}")
+        print("-" * 50)
+
+    if out_path:
+        with open(out_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"Saved {len(results)} answers to {out_path}")
+
+def print_stats(engine):
+    """Prints per-stage latency percentiles and request counters."""
+    stats = engine.stats()
+    if not stats["timings_ms"]:
+        print("\nNo requests measured yet.")
+        return
+    print(f"\n{'stage':<18}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, t in stats["timings_ms"].items():
+        print(f"{stage:<18}{t['count']:>6}{t['p50']:>10.1f}{t['p95']:>10.1f}{t['p99']:>10.1f}")
+    for name, c in stats["counters"].items():
+        print(f"{name:<18}{c['count']:>6}  mean {c['mean']:.1f}  p95 {c['p95']:.1f}")
+    print(f"startup: {stats['startup']}")
+    print(f"cache: {stats['cache']}")
+    print(f"logger: {stats['logger']}")
 
 def main():
     print("========================================")
@@ -7,14 +53,26 @@ def main():
     print("========================================")
     print("Initializing...")
     
-    engine = RAGEngine()
+    # Loads the index and graph in the background (or uses the service at SCIENCEBOT_SERVICE_URL)
+    engine = create_engine()
+
+    # Non-interactive: python app.py --batch queries.txt [answers.json]
+    if len(sys.argv) > 2 and sys.argv[1] == "--batch":
+        engine.wait_ready()
+        run_batch(engine, sys.argv[2], out_path=sys.argv[3] if len(sys.argv) > 3 else None)
+        return
     
     print("\n✅ READY! Commands:")
     print(" - Type your question normally for HYBRID search.")
     print(" - Type '/v your query' for VECTOR ONLY.")
     print(" - Type '/k your query' for KG ONLY.")
+    print(" - Type '/batch queries.txt' to answer a file of questions (one per line).")
+    print(" - Type '/filter subject=physics grade=10' to search only those books ('/filter' clears it).")
+    print(" - Type '/stats' for stage latencies, or '/stats json FILE' to export them.")
+    print(" - Type '/status' to see what is still loading.")
     print(" - Type 'exit' to quit.\n")
-    
+
+    filters = None
     while True:
         user_input = input("Student: ").strip()
         
@@ -26,7 +84,36 @@ def main():
         query = user_input
         
         # Check for commands
-        if user_input.startswith("/v "):
+        if user_input.startswith("/batch "):
+            try:
+                run_batch(engine, user_input[7:].strip(), filters=filters)
+            except Exception as e:
+                print(f"Error: {e}")
+            continue
+        elif user_input == "/filter" or user_input.startswith("/filter "):
+            filters = parse_filters(user_input[7:])
+            print(f"Filter: {filters or 'all books'}")
+            if filters is None:
+                for book in engine.books:
+                    print(f" {book['id']:<32} {book['subject']:<12} grade {book['grade']}")
+            continue
+        elif user_input == "/status":
+            report = engine.startup_report()
+            for component, state in report["status"].items():
+                print(f" {component:<8} {state}")
+            for phase, seconds in report["phases_s"].items():
+                print(f" {phase:<24} {seconds:.2f}s")
+            continue
+        elif user_input.startswith("/stats"):
+            args = user_input.split()
+            if len(args) == 3 and args[1] == "json":
+                with open(args[2], 'w', encoding='utf-8') as f:
+                    json.dump(engine.stats(), f, indent=2)
+                print(f"Saved stats to {args[2]}")
+            else:
+                print_stats(engine)
+            continue
+        elif user_input.startswith("/v "):
             mode = "vector"
             query = user_input[3:]
         elif user_input.startswith("/k "):
@@ -35,11 +122,16 @@ def main():
             
         print("\nBot is thinking...")
         try:
-            answer = engine.get_response(query, search_mode=mode)
-            print(f"\nScienceBot: {answer}\n")
+            started = False
+            for chunk in engine.stream_response(query, search_mode=mode, filters=filters):
+                if not started:
+                    print("\nScienceBot: ", end="")
+                    started = True
+                print(chunk, end="", flush=True)
+            print("\n")
             print("-" * 50)
         except Exception as e:
             print(f"Error: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,41 @@
+"""
+Recall@k and p50/p99 search latency of each vector index type against exact search.
+Run from the repo root:
+  python -m benchmarks.ann_eval                      # synthetic clustered vectors
+  python -m benchmarks.ann_eval data/faiss_index/KEY # embeddings of a saved index
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+from src.vector_store import INDEX_TYPES, build_faiss_index, evaluate_index, index_params
+
+
+def synthetic_embeddings(n=50_000, dim=384, clusters=200, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype('float32')
+    points = centers[rng.integers(0, clusters, n)] + 0.5 * rng.normal(size=(n, dim)).astype('float32')
+    return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+
+def run(embeddings, k=10):
+    print(f"{len(embeddings)} vectors, dim {embeddings.shape[1]}")
+    print(f"{'index':<10} {'build s':>8} {f'recall@{k}':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for index_type in INDEX_TYPES:
+        params = dict(index_params(), type=index_type)
+        start = time.perf_counter()
+        index, params = build_faiss_index(embeddings, params)
+        build = time.perf_counter() - start
+        report = evaluate_index(index, embeddings, params, k=k)
+        print(f"{index_type:<10} {build:>8.2f} {report[f'recall@{k}']:>10.3f} "
+              f"{report['p50_ms']:>8.3f} {report['p99_ms']:>8.3f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        embeddings = np.load(os.path.join(sys.argv[1], "embeddings.npy"))
+    else:
+        embeddings = synthetic_embeddings()
+    run(np.ascontiguousarray(embeddings, dtype='float32'))
@@ -0,0 +1,77 @@
+"""
+Query-encoder latency and bulk-encoding throughput of each embedding path
+against the current one (torch model, one process, batches in corpus order).
+Run from the repo root:
+  python -m benchmarks.embedding_eval [--texts 5000] [--workers 4]
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from benchmarks.run import QUERIES, synthetic_paragraph
+from src.config import Config
+from src.embeddings import QUERY_ENCODERS, Embedder, min_cosine
+
+
+def query_latency(embedder, repeats=50):
+    embedder.encode_queries(QUERIES[:1])  # Warm up
+    times = []
+    for _ in range(repeats):
+        for query in QUERIES:
+            start = time.perf_counter()
+            embedder.encode_queries([query])
+            times.append(time.perf_counter() - start)
+    ms = np.array(times) * 1000
+    return float(np.percentile(ms, 50)), float(np.percentile(ms, 99))
+
+
+def bulk_throughput(encode, texts):
+    start = time.perf_counter()
+    embeddings = encode(texts)
+    return embeddings, len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=5000, help="corpus size for the bulk runs")
+    parser.add_argument("--workers", type=int, default=None, help="bulk encoding processes (default: Config)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    # Mixed lengths, like real chunks (headings next to full paragraphs)
+    texts = [" ".join(synthetic_paragraph(rng) for _ in range(rng.randint(1, 4)))[:rng.randint(60, 1200)]
+             for _ in range(args.texts)]
+
+    torch_embedder = Embedder(query_encoder="torch")
+    reference = torch_embedder.encode_queries(QUERIES)
+
+    print(f"Query encoding ({len(QUERIES)} queries, one at a time)")
+    print(f"{'encoder':<10} {'used':<10} {'p50 ms':>8} {'p99 ms':>8} {'min cos':>8}")
+    for backend in QUERY_ENCODERS:
+        embedder = Embedder(query_encoder=backend) if backend != "torch" else torch_embedder
+        p50, p99 = query_latency(embedder)
+        cosine = min_cosine(reference, embedder.encode_queries(QUERIES))
+        print(f"{backend:<10} {embedder.query_backend:<10} {p50:>8.2f} {p99:>8.2f} {cosine:>8.4f}")
+
+    print(f"\nBulk encoding ({len(texts)} texts, batch {Config.EMBED_BATCH_SIZE})")
+    model = torch_embedder.model
+    size = Config.EMBED_BATCH_SIZE
+
+    def current(texts):
+        return np.vstack([model.encode(texts[i:i + size], batch_size=size, convert_to_numpy=True)
+                          for i in range(0, len(texts), size)])
+    baseline, rate = bulk_throughput(current, texts)
+    print(f"{'current (1 process, corpus order)':<40} {rate:>8.1f} texts/s")
+
+    for workers in sorted({1, args.workers or Embedder().workers}):
+        embedder = Embedder(query_encoder="torch", workers=workers)
+        embedder._model = model # Reuse the loaded model for the in-process path
+        embeddings, rate = bulk_throughput(embedder.encode_corpus, texts)
+        label = f"length-sorted, {workers} process{'es' if workers > 1 else ''}"
+        print(f"{label:<40} {rate:>8.1f} texts/s   min cos vs current {min_cosine(baseline, embeddings):.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Offline KG build throughput against the fake LLM client, then a check that
+contrasting science terms (concave / convex, mitosis / meiosis) stay separate
+nodes. Entity merging is lexical only, as by default, unless --embed-merges
+loads the embedding model; the check then lists the pairs it would merge.
+Run from the repo root: python -m benchmarks.kg_build [--embed-merges [--threshold 0.9]]
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from src.config import Config
+from src.extraction_cache import ExtractionCache
+from src.fake_llm import FakeLLMClient
+from src.kg_canonical import canonicalize
+from src.knowledge_graph import SimpleKnowledgeGraph
+
+# Distinct concepts a textbook names side by side; none of them may merge
+CONTRASTING = [
+    ("concave mirror", "convex mirror"), ("concave lens", "convex lens"), ("mitosis", "meiosis"),
+    ("anode", "cathode"), ("acid", "base"), ("oxidation", "reduction"), ("endothermic", "exothermic"),
+    ("myopia", "hypermetropia"), ("artery", "vein"), ("metal", "non-metal"),
+]
+
+
+def contrasting_merges(embedder=None):
+    """Canonicalizes the contrasting pairs (each linked to a shared topic, not to each other); returns the merges."""
+    triples = [(name, "is_a", f"topic {i}") for i, pair in enumerate(CONTRASTING) for name in pair]
+    embed = embedder.encode_queries if embedder is not None else None
+    _, mapping, report = canonicalize(triples, embed=embed)
+    lexical = [[name, target, None] for name, target in mapping.items() if name != target]
+    return lexical + report["merged"]
+
+
+def run(num_chunks=200, latency=0.05, rate_limit_prob=0.05, embed_merges=False, threshold=0.9):
+    Config.LLM_RETRY_BASE_DELAY = 0.01
+    embedder = None
+    Config.KG_CANONICAL_THRESHOLD = threshold if embed_merges else None # Plural / determiner merges need no model
+    if embed_merges:
+        from src.embeddings import Embedder
+        embedder = Embedder() # One model for every run's canonicalization
+    chunks = [
+        {"text": f"The Nucleus of Atom{i} holds {'Protons' if i % 2 else 'the Proton'} while Electrons orbit in Shells."}
+        for i in range(num_chunks)
+    ]
+
+    print(f"{'workers':>8} {'per_prompt':>10} {'calls':>6} {'seconds':>8} {'chunks/s':>9} "
+          f"{'rebuild calls':>14} {'rebuild s':>10} {'nodes':>10} {'edges':>10}")
+    for workers, per_prompt in [(1, 1), (4, 1), (8, 1), (8, 4)]:
+        with tempfile.TemporaryDirectory() as tmp:
+            client = FakeLLMClient(latency=latency, rate_limit_prob=rate_limit_prob)
+            kg = SimpleKnowledgeGraph(client=client, graph_path=os.path.join(tmp, "kg"), embedder=embedder)
+            kg.extraction_cache = ExtractionCache(os.path.join(tmp, "kg_extractions.db"))
+            kg.max_workers = workers
+            kg.chunks_per_prompt = per_prompt
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                kg.build_graph(chunks)
+            elapsed = time.perf_counter() - start
+            calls = client.calls
+            report = kg.canonical_report
+
+            # Rebuild from scratch with the same texts: served from the extraction cache
+            rebuilt = SimpleKnowledgeGraph(client=client, graph_path=os.path.join(tmp, "kg_rebuilt"), embedder=embedder)
+            rebuilt.extraction_cache = kg.extraction_cache
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                rebuilt.build_graph(chunks)
+            rebuild = time.perf_counter() - start
+        nodes = f"{report['nodes_before']}->{report['nodes_after']}"
+        edges = f"{report['edges_before']}->{report['edges_after']}"
+        print(f"{workers:>8} {per_prompt:>10} {calls:>6} {elapsed:>8.2f} {num_chunks / elapsed:>9.1f} "
+              f"{client.calls - calls:>14} {rebuild:>10.3f} {nodes:>10} {edges:>10}")
+
+    merges = contrasting_merges(embedder)
+    for name, target, score in merges:
+        print(f"❌ '{name}' merged into '{target}'" + (f" (cosine {score:.3f})" if score is not None else ""))
+    if merges:
+        raise SystemExit(f"{len(merges)} of {2 * len(CONTRASTING)} contrasting names merged")
+    print(f"✅ {len(CONTRASTING)} contrasting pairs kept apart")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embed-merges", action="store_true", help="also merge near-duplicate names by embedding")
+    parser.add_argument("--threshold", type=float, default=0.9, help="cosine for --embed-merges")
+    args = parser.parse_args()
+    run(embed_merges=args.embed_merges, threshold=args.threshold)
@@ -0,0 +1,84 @@
+"""
+Compares the legacy pickled NetworkX graph with the columnar KG store.
+Run from the repo root: python -m benchmarks.kg_storage [num_edges]
+"""
+import gc
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import networkx as nx
+
+from src.graph_index import CompactGraph
+from src.kg_store import KGStore
+
+
+def synthetic_graph(num_edges, seed=0):
+    rng = random.Random(seed)
+    vocab = [f"concept{i}" for i in range(max(num_edges // 4, 10))]
+    relations = ["is", "contains", "depends_on", "related_to", "produces", "measured_in"]
+    graph = nx.DiGraph()
+    for _ in range(num_edges):
+        head = " ".join(rng.sample(vocab, rng.randint(1, 2)))
+        tail = " ".join(rng.sample(vocab, rng.randint(1, 2)))
+        graph.add_edge(head, tail, relation=rng.choice(relations))
+    return graph
+
+
+def measure(load):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = load()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, current, peak
+
+
+def run(num_edges=200_000):
+    graph = synthetic_graph(num_edges)
+    with tempfile.TemporaryDirectory() as tmp:
+        pkl_path = os.path.join(tmp, "kg.pkl")
+        with open(pkl_path, 'wb') as f:
+            pickle.dump(graph, f)
+        store = KGStore(os.path.join(tmp, "kg"))
+        store.write_graph(graph)
+        pkl_bytes = os.path.getsize(pkl_path)
+        store_bytes = sum(os.path.getsize(os.path.join(store.path, n)) for n in os.listdir(store.path))
+
+        def load_pickle():
+            with open(pkl_path, 'rb') as f:
+                return pickle.load(f)
+
+        def load_store():
+            nodes, relations, edges = KGStore(store.path).load()
+            return CompactGraph(nodes, relations, edges[:, 0], edges[:, 1], edges[:, 2])
+
+        del graph
+        _, p_time, p_mem, p_peak = measure(load_pickle)
+        _, s_time, s_mem, s_peak = measure(load_store)
+
+        # Appending reuses the loaded string tables; nothing already on disk is rewritten
+        loaded = KGStore(store.path)
+        loaded.load()
+        loaded.append([("warm up", "is", "concept1")])
+        start = time.perf_counter()
+        loaded.append([("new concept", "is", "concept1")])
+        append_time = time.perf_counter() - start
+
+    mb = 1024 * 1024
+    print(f"Edges: {num_edges}")
+    print(f"{'format':<10} {'file MB':>8} {'load s':>8} {'resident MB':>12} {'peak MB':>8}")
+    print(f"{'pickle':<10} {pkl_bytes / mb:>8.1f} {p_time:>8.3f} {p_mem / mb:>12.1f} {p_peak / mb:>8.1f}")
+    print(f"{'columnar':<10} {store_bytes / mb:>8.1f} {s_time:>8.3f} {s_mem / mb:>12.1f} {s_peak / mb:>8.1f}")
+    print(f"Load speed-up: {p_time / s_time:.1f}x, memory: {p_mem / max(s_mem, 1):.1f}x smaller")
+    print(f"Appending one edge: {append_time * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,109 @@
+"""
+Tail latency of Gemini calls made directly on the client versus through the
+LLM gateway (with and without hedging), against the fake client with a slow
+tail, rate limits and server errors. A share of the prompts repeat (a class
+asking the same quiz question), so concurrent duplicates can be coalesced.
+Finally the same prompts are streamed and generated at once, as serve.py does
+when /stream and /query get one question together; both must get the answer.
+Run from the repo root:
+  python -m benchmarks.llm_gateway [--requests 600] [--threads 12] [--slow-prob 0.03]
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src.config import Config
+from src.fake_llm import FakeLLMClient
+from src.llm_gateway import LLMGateway
+
+
+def workload(count, repeat_share, rng):
+    hot = [f"Give me a quiz on chapter {i}" for i in range(5)]
+    return [rng.choice(hot) if rng.random() < repeat_share else f"Explain concept {i}" for i in range(count)]
+
+
+def run(call, prompts, threads):
+    """Latencies (ms) of the successful calls and the number of failed ones."""
+    def timed(prompt):
+        start = time.perf_counter()
+        try:
+            call(prompt)
+            return (time.perf_counter() - start) * 1000
+        except Exception:
+            return None
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(timed, prompts))
+    latencies = [ms for ms in results if ms is not None]
+    return latencies, len(results) - len(latencies)
+
+
+def mixed_paths(gateway, prompts, threads):
+    """Streams and generates every prompt concurrently; raises if either path fails or the answers differ."""
+    def both(prompt):
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            streamed = pool.submit(lambda: "".join(gateway.stream(prompt)))
+            generated = pool.submit(gateway.generate, prompt)
+            if streamed.result() != generated.result():
+                raise AssertionError(f"stream and call disagree on {prompt!r}")
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(both, prompts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--threads", type=int, default=12, help="concurrent callers (the gateway allows LLM_MAX_CONCURRENCY)")
+    parser.add_argument("--latency", type=float, default=0.05, help="typical fake Gemini latency in seconds")
+    parser.add_argument("--slow-prob", type=float, default=0.03, help="share of calls in the slow tail")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="seconds a slow call takes")
+    parser.add_argument("--rate-limit-prob", type=float, default=0.005)
+    parser.add_argument("--error-prob", type=float, default=0.005)
+    parser.add_argument("--repeat-share", type=float, default=0.25, help="share of prompts that are hot duplicates")
+    args = parser.parse_args()
+
+    Config.LLM_RETRY_BASE_DELAY = 0.02
+    Config.LLM_HEDGE_QUIET_SECONDS = 0.2 # Scaled down with the fake latencies
+    prompts = workload(args.requests, args.repeat_share, random.Random(0))
+
+    def client():
+        return FakeLLMClient(latency=args.latency, jitter=args.latency / 2, rate_limit_prob=args.rate_limit_prob,
+                             error_prob=args.error_prob, slow_prob=args.slow_prob, slow_latency=args.slow_latency)
+
+    print(f"{len(prompts)} requests from {args.threads} threads | {args.slow_prob:.0%} take {args.slow_latency}s | "
+          f"{args.rate_limit_prob:.1%} rate-limited | {args.error_prob:.1%} fail")
+    print(f"{'path':<22} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'failed':>7} {'backend calls':>14} "
+          f"{'coalesced':>10} {'hedged':>7} {'retries':>8}")
+
+    fake = client()
+    latencies, failed = run(lambda p: fake.models.generate_content(model=Config.LLM_MODEL, contents=p).text,
+                            prompts, args.threads)
+    rows = [("direct client", latencies, failed, fake.calls, {})]
+    for label, percentile in [("gateway", None), ("gateway + hedging", 95)]:
+        Config.LLM_HEDGE_PERCENTILE = percentile
+        fake = client()
+        gateway = LLMGateway(fake)
+        run(gateway.generate, prompts[:Config.LLM_HEDGE_MIN_SAMPLES * 2], args.threads) # Learn the latency profile
+        fake.calls = 0
+        gateway.counts = dict.fromkeys(gateway.counts, 0)
+        latencies, failed = run(gateway.generate, prompts, args.threads)
+        rows.append((label, latencies, failed, fake.calls, gateway.counts))
+
+    for label, latencies, failed, calls, counts in rows:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        print(f"{label:<22} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {failed:>7} {calls:>14} "
+              f"{counts.get('coalesced', '-'):>10} {counts.get('hedged', '-'):>7} {counts.get('retries', '-'):>8}")
+
+    # Same prompts on both paths at once, without injected failures
+    gateway = LLMGateway(FakeLLMClient(latency=args.latency))
+    hot = workload(args.threads * 4, 1.0, random.Random(1))
+    mixed_paths(gateway, hot, args.threads)
+    print(f"✅ stream + call of the same prompt: {len(hot)} pairs answered | {gateway.counts['coalesced']} coalesced")
+
+
+if __name__ == "__main__":
+    main()
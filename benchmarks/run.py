@@ -0,0 +1,306 @@
+"""
+Offline benchmark suite for the retrieval and answer pipeline.
+
+Uses a generated fixture PDF, the fake LLM client and a null log sink, so no
+Gemini key, textbook or Google Sheets access is needed (only the embedding
+model has to be available locally). Results are written as JSON so runs can
+be compared.
+
+Run from the repo root:
+  python -m benchmarks.run [--quick] [--llm-latency 0.05] [--out FILE] [--compare OLD.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from src.config import Config
+from src.corpus import CorpusVectorStore
+from src.fake_llm import FakeLLMClient
+from src.ingestion import PDFIngestor
+from src.knowledge_graph import SimpleKnowledgeGraph
+from src.logger import NullSink, create_logger
+from src.vector_store import VectorStore, build_faiss_index, index_params
+
+TERMS = [
+    "Photosynthesis", "Chlorophyll", "Glucose", "Respiration", "Mitochondria", "Atomic Mass",
+    "Periodic Table", "Valency", "Electron", "Proton", "Neutron", "Isotope", "Acceleration",
+    "Velocity", "Gravitation", "Refraction", "Lens", "Current", "Resistance", "Ohm's Law",
+    "Enzyme", "Digestion", "Hormone", "Neuron", "Reflex", "Acid", "Base", "Salt", "Oxidation",
+]
+QUERIES = [
+    "what is photosynthesis", "define atomic mass", "explain refraction through a lens",
+    "give me a quiz on acids and bases", "how does respiration release energy",
+    "calculate resistance using ohm's law", "summary of the periodic table", "what is an isotope",
+]
+
+
+def percentiles(samples):
+    ms = np.array(samples) * 1000
+    return {f"p{p}_ms": round(float(np.percentile(ms, p)), 3) for p in (50, 95, 99)}
+
+
+def synthetic_paragraph(rng):
+    a, b, c = rng.sample(TERMS, 3)
+    return (f"{a} is closely related to {b}. In this chapter we study how {a} affects {c} "
+            f"and why {b} matters for everyday life. Experiments show that {c} depends on {a}.")
+
+
+def write_fixture_pdf(path, pages, rng):
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        text = "\n\n".join(synthetic_paragraph(rng) for _ in range(6))
+        page.insert_textbox(fitz.Rect(40, 40, 555, 800), text, fontsize=9)
+    doc.save(path)
+
+
+def bench_ingestion(pdf_path, pages):
+    ingestor = PDFIngestor(pdf_path)
+    start = time.perf_counter()
+    chunks = list(ingestor.iter_chunks())
+    elapsed = time.perf_counter() - start
+    return chunks, {
+        "pages": pages, "chunks": len(chunks), "seconds": round(elapsed, 3),
+        "pages_per_s": round(pages / elapsed, 1), "chunks_per_s": round(len(chunks) / elapsed, 1),
+    }
+
+
+def bench_embedding(store, texts):
+    """Bulk (corpus) encoding throughput, as create_index does it."""
+    store._normalized(store.embedder.encode_corpus(texts[:8]))  # Warm up
+    start = time.perf_counter()
+    embeddings = store._normalized(store.embedder.encode_corpus(texts))
+    elapsed = time.perf_counter() - start
+    return embeddings, {"texts": len(texts), "seconds": round(elapsed, 3), "texts_per_s": round(len(texts) / elapsed, 1),
+                        "workers": store.embedder.workers if len(texts) >= Config.EMBED_WINDOW else 1}
+
+
+def bench_index_build(embeddings):
+    start = time.perf_counter()
+    build_faiss_index(embeddings, index_params())
+    return {"vectors": len(embeddings), "type": Config.VECTOR_INDEX_TYPE, "seconds": round(time.perf_counter() - start, 4)}
+
+
+def bench_search(store, base_embeddings, chunks, sizes, rng):
+    """VectorStore.search latency (excluding query encoding) as the corpus grows."""
+    query_vectors = store.encode_queries(QUERIES)
+    encode_times = []
+    for q in QUERIES:
+        start = time.perf_counter()
+        store.encode_query(q)
+        encode_times.append(time.perf_counter() - start)
+
+    results = {"query_encoding": percentiles(encode_times)}
+    noise = np.random.default_rng(0)
+    for size in sizes:
+        # Scale the real embeddings up with small perturbations
+        picks = noise.integers(0, len(base_embeddings), size)
+        scaled = base_embeddings[picks] + 0.01 * noise.normal(size=(size, base_embeddings.shape[1])).astype('float32')
+        scaled /= np.linalg.norm(scaled, axis=1, keepdims=True)
+        store.index, store.params = build_faiss_index(np.ascontiguousarray(scaled, dtype='float32'), index_params())
+        store.chunks = [chunks[i] for i in picks]
+
+        times = []
+        for _ in range(200):
+            i = rng.randrange(len(QUERIES))
+            start = time.perf_counter()
+            store.search(QUERIES[i], k=3, query_vector=query_vectors[i:i + 1])
+            times.append(time.perf_counter() - start)
+        results[str(size)] = percentiles(times)
+    return results
+
+
+def bench_corpus(store, base_embeddings, chunks, book_counts, rng, book_size=5_000):
+    """Search latency as books (shards) are added: filtered to one subject vs fanned out over all."""
+    query_vectors = store.encode_queries(QUERIES)
+    noise = np.random.default_rng(1)
+    subjects = ["physics", "chemistry", "biology"]
+    results = {}
+    for count in book_counts:
+        books, stores = [], []
+        for b in range(count):
+            picks = noise.integers(0, len(base_embeddings), book_size)
+            scaled = base_embeddings[picks] + 0.01 * noise.normal(size=(book_size, base_embeddings.shape[1])).astype('float32')
+            scaled /= np.linalg.norm(scaled, axis=1, keepdims=True)
+            shard = VectorStore(embedder=store.embedder)
+            shard.index, shard.params = build_faiss_index(np.ascontiguousarray(scaled, dtype='float32'), index_params())
+            shard.chunks = [chunks[i] for i in picks]
+            stores.append(shard)
+            books.append({"id": f"book-{b}", "title": f"book-{b}", "subject": subjects[b % 3], "grade": 10})
+        corpus = CorpusVectorStore(books, stores)
+
+        for label, filters in (("filtered", {"subject": "physics"}), ("all_books", None)):
+            times = []
+            for _ in range(200):
+                i = rng.randrange(len(QUERIES))
+                start = time.perf_counter()
+                corpus.search(QUERIES[i], k=3, query_vector=query_vectors[i:i + 1], filters=filters)
+                times.append(time.perf_counter() - start)
+            results[f"{count}_books_{label}"] = percentiles(times)
+    return results
+
+
+def bench_kg(sizes, rng):
+    """get_related_concepts latency (and index build time) as the graph grows."""
+    results = {}
+    vocab = [t.lower() for t in TERMS] + [f"concept {i}" for i in range(max(sizes) // 3)]
+    relations = ["is", "contains", "depends_on", "related_to", "produces"]
+    for size in sizes:
+        kg = SimpleKnowledgeGraph(client=FakeLLMClient())
+        for _ in range(size):
+            kg._add_triple(rng.choice(vocab), rng.choice(relations), rng.choice(vocab))
+
+        start = time.perf_counter()
+        kg.get_compact_graph()
+        build = time.perf_counter() - start
+
+        times = []
+        for _ in range(200):
+            query = rng.choice(QUERIES)
+            start = time.perf_counter()
+            kg.get_related_concepts(query, hops=Config.KG_HYBRID_HOPS)
+            times.append(time.perf_counter() - start)
+        results[str(size)] = dict(percentiles(times), index_build_s=round(build, 3))
+    return results
+
+
+def bench_startup(chunks):
+    """Time until the constructor returns, until a first answer, and per warm-up phase."""
+    from src.rag_engine import RAGEngine
+
+    start = time.perf_counter()
+    engine = RAGEngine(client=FakeLLMClient(), logger=create_logger(NullSink()), chunks=chunks)
+    constructed = time.perf_counter() - start
+    engine.get_response(QUERIES[0])
+    first_answer = time.perf_counter() - start
+    engine.wait_ready()
+    results = {
+        "constructor_s": round(constructed, 4),
+        "first_answer_s": round(first_answer, 4),
+        "all_ready_s": round(time.perf_counter() - start, 4),
+    }
+    results.update({f"{phase}_s": seconds for phase, seconds in engine.startup_phases.items()})
+    engine.logger.close()
+    return results
+
+
+def bench_end_to_end(chunks, llm_latency, requests, rng):
+    from src.rag_engine import RAGEngine
+
+    client = FakeLLMClient()
+    engine = RAGEngine(client=client, logger=create_logger(NullSink()), chunks=chunks, wait=True)
+    client.latency = llm_latency  # Build the KG instantly, then simulate Gemini
+
+    results = {}
+    for mode in ("vector", "kg", "hybrid"):
+        times = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            engine.get_response(rng.choice(QUERIES), search_mode=mode)
+            times.append(time.perf_counter() - start)
+        results[mode] = percentiles(times)
+    engine.logger.close()
+    return results
+
+
+def flatten(tree, prefix=""):
+    flat = {}
+    for key, value in tree.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(current, previous_path, tolerance=0.2):
+    """Prints metrics that got worse than `tolerance` relative to a previous run."""
+    with open(previous_path, 'r', encoding='utf-8') as f:
+        previous = flatten(json.load(f)["results"])
+    regressions = 0
+    for name, value in flatten(current).items():
+        old = previous.get(name)
+        if not old:
+            continue
+        # Latencies and durations should go down; throughputs should go up
+        if name.endswith("per_s"):
+            change = (old - value) / old
+        elif name.endswith(("_ms", "_s", "seconds")):
+            change = (value - old) / old
+        else:
+            continue
+        if change > tolerance:
+            regressions += 1
+            print(f"⚠️ REGRESSION {name}: {old} -> {value} ({change:+.0%})")
+    print(f"Compared with {previous_path}: {regressions} regressions over {tolerance:.0%}.")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="smaller corpus and graphs")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="fake Gemini latency in seconds")
+    parser.add_argument("--out", help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="previous results file to check for regressions")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    pages = 20 if args.quick else 200
+    corpus_sizes = [1_000, 10_000] if args.quick else [1_000, 10_000, 100_000]
+    graph_sizes = [1_000, 10_000] if args.quick else [1_000, 10_000, 100_000]
+    book_counts = [1, 3, 6] if args.quick else [1, 3, 6, 12]
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Keep every artefact (KG store, extraction cache) out of data/
+        Config.KG_PATH = os.path.join(tmp, "knowledge_graph")
+        Config.KG_LEGACY_PATH = os.path.join(tmp, "missing.pkl")
+        Config.KG_EXTRACTION_CACHE_PATH = os.path.join(tmp, "kg_extractions.db")
+        Config.QUIZ_BANK_PATH = os.path.join(tmp, "quiz_bank.db")
+        Config.CACHE_ENABLED = False  # Measure the full pipeline, not cache hits
+        Config.QUIZ_BANK_ENABLED = False  # Nor quiz bank hits
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            pdf_path = os.path.join(tmp, "fixture.pdf")
+            write_fixture_pdf(pdf_path, pages, rng)
+            chunks, results["ingestion"] = bench_ingestion(pdf_path, pages)
+
+            store = VectorStore()
+            embeddings, results["embedding"] = bench_embedding(store, [c["text"] for c in chunks])
+            results["index_build"] = bench_index_build(embeddings)
+            results["vector_search"] = bench_search(store, embeddings, chunks, corpus_sizes, rng)
+            results["corpus_search"] = bench_corpus(store, embeddings, chunks, book_counts, rng)
+            results["kg_lookup"] = bench_kg(graph_sizes, rng)
+            results["startup"] = bench_startup(chunks)
+            results["end_to_end"] = bench_end_to_end(chunks, args.llm_latency, 30 if args.quick else 100, rng)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip(),
+        "settings": {"quick": args.quick, "llm_latency": args.llm_latency, "index": index_params(),
+                     "embedding_model": Config.EMBEDDING_MODEL},
+        "results": results,
+    }
+    out_path = args.out or os.path.join("benchmarks", "results", time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print(json.dumps(results, indent=2))
+    print(f"Results written to {out_path}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+Builds or refreshes the quiz bank: quiz sets for every chapter (or page range)
+and definitions of each book's key concepts, answered later without a Gemini
+call. Only entries whose source chunks, KG facts, prompt or model changed are
+regenerated, so re-run it after adding or updating books.
+
+  python build_quiz_bank.py [--book ID ...] [--variants 3] [--definitions 50]
+"""
+import argparse
+from src.config import Config
+from src.quiz_bank import QuizBank, build_bank
+from src.rag_engine import RAGEngine
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--book", action="append", help="book id to refresh (default: every book)")
+    parser.add_argument("--variants", type=int, default=Config.QUIZ_BANK_VARIANTS, help="quiz sets per chapter")
+    parser.add_argument("--definitions", type=int, default=Config.QUIZ_BANK_DEFINITIONS, help="entities per book")
+    args = parser.parse_args()
+
+    engine = RAGEngine(wait=True)
+    if not engine.wait_ready():
+        raise SystemExit(f"❌ Engine not ready: {engine.status()}")
+    counts = build_bank(engine, QuizBank(), args.book, args.variants, args.definitions)
+    print(f"✅ Quiz bank: {counts['generated']} generated, {counts['kept']} kept, "
+          f"{counts['removed']} removed, {counts['failed']} failed")
+
+if __name__ == "__main__":
+    main()
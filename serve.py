@@ -0,0 +1,22 @@
+"""
+Runs the ScienceBot query service: one shared RAGEngine that micro-batches
+query encoding and FAISS searches and caps concurrent Gemini calls.
+
+  python serve.py [--host 127.0.0.1] [--port 8765]
+
+Point the UIs at it with SCIENCEBOT_SERVICE_URL=http://127.0.0.1:8765 (in the
+environment or data/.env), then run `streamlit run web_app.py` or `python app.py`.
+"""
+import argparse
+from src.config import Config
+from src.service import serve
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=Config.SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=Config.SERVICE_PORT)
+    args = parser.parse_args()
+    serve(args.host, args.port)
+
+if __name__ == "__main__":
+    main()
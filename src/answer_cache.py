@@ -0,0 +1,103 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from src.config import Config
+
+
+class AnswerCache:
+    """
+    Two-tier answer cache in front of the LLM.
+    Tier 1 is an exact LRU keyed on (normalized query, search mode, intent).
+    Tier 2 compares the query embedding against past queries with the same
+    mode and intent, and reuses an answer above a cosine-similarity threshold.
+    """
+    def __init__(self, max_size=None, ttl=None, threshold=None):
+        self.max_size = max_size or Config.CACHE_MAX_SIZE
+        self.ttl = ttl or Config.CACHE_TTL_SECONDS
+        self.threshold = threshold or Config.CACHE_SIMILARITY_THRESHOLD
+
+        self.entries = OrderedDict()  # key -> (answer, created_at, unit vector or None)
+        self._groups = {}  # (mode, intent) -> (keys, matrix), rebuilt lazily after changes
+        self._lock = threading.Lock()
+
+        self.hits = {"exact": 0, "semantic": 0}
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(query):
+        return " ".join(re.findall(r"[a-z0-9]+", query.lower()))
+
+    @staticmethod
+    def _unit(vector):
+        if vector is None:
+            return None
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def get(self, query, search_mode, intent, vector=None):
+        """Returns a cached answer, or None on a miss."""
+        key = (self.normalize(query), search_mode, intent)
+        now = time.time()
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry and now - entry[1] <= self.ttl:
+                self.entries.move_to_end(key)
+                self.hits["exact"] += 1
+                return entry[0]
+            if entry:
+                self._evict(key)
+
+            unit = self._unit(vector)
+            if unit is not None:
+                keys, matrix = self._group(search_mode, intent)
+                if keys:
+                    scores = matrix @ unit
+                    best = int(np.argmax(scores))
+                    match = self.entries.get(keys[best])
+                    if scores[best] >= self.threshold and match and now - match[1] <= self.ttl:
+                        self.entries.move_to_end(keys[best])
+                        self.hits["semantic"] += 1
+                        return match[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, query, search_mode, intent, answer, vector=None):
+        key = (self.normalize(query), search_mode, intent)
+        with self._lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (answer, time.time(), self._unit(vector))
+            self._groups.pop((search_mode, intent), None)
+            while len(self.entries) > self.max_size:
+                self._evict(next(iter(self.entries)))
+
+    def _evict(self, key):
+        del self.entries[key]
+        self._groups.pop(key[1:], None)
+        self.evictions += 1
+
+    def _group(self, search_mode, intent):
+        """Stacked unit vectors of cached queries with this mode and intent."""
+        group = self._groups.get((search_mode, intent))
+        if group is None:
+            keys = [k for k, e in self.entries.items() if k[1:] == (search_mode, intent) and e[2] is not None]
+            matrix = np.stack([self.entries[k][2] for k in keys]) if keys else None
+            group = (keys, matrix)
+            self._groups[(search_mode, intent)] = group
+        return group
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits["exact"] + self.hits["semantic"] + self.misses
+            return {
+                "size": len(self.entries),
+                "exact_hits": self.hits["exact"],
+                "semantic_hits": self.hits["semantic"],
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0,
+            }
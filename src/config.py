@@ -12,7 +12,11 @@ class Config:
     # Paths
     PDF_PATH = "data/textbook.pdf"
     VECTOR_DB_PATH = "data/faiss_index"
-    KG_PATH = "data/knowledge_graph.pkl"
+    KG_PATH = "data/knowledge_graph" # Columnar store directory
+    KG_LEGACY_PATH = "data/knowledge_graph.pkl" # Migrated once if present
+    KG_EXTRACTION_CACHE_PATH = "data/kg_extractions.db" # Triples per chunk text, shared by every book
+    CORPUS_DIR = "data/corpus" # One PDF per book, e.g. corpus/physics/grade10/light.pdf; PDF_PATH is used if empty
+    KG_SHARDS_PATH = "data/kg_shards" # One KG partition per corpus book
     
     # Models
     EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
@@ -20,4 +24,119 @@ class Config:
     
     # Parsing
     CHUNK_SIZE = 300
-    CHUNK_OVERLAP = 50
\ No newline at end of file
+    CHUNK_OVERLAP = 50
+    INGEST_WORKERS = None # None = one process per CPU core
+    INGEST_PAGES_PER_TASK = 8
+    EMBED_BATCH_SIZE = 64
+
+    # Embeddings
+    QUERY_ENCODER = "onnx" # "torch", "onnx" or "onnx_int8"; falls back to torch if the export is unavailable
+    QUERY_ENCODER_THREADS = 1 # ONNX Runtime threads per query; concurrent requests use the other cores
+    QUERY_ENCODER_MIN_COSINE = 0.99 # An export must match the torch model this closely on sample queries
+    ONNX_MODEL_DIR = "data/onnx"
+    EMBED_WORKERS = None # Bulk encoding processes; None = min(4, CPU cores), 1 = in-process
+    EMBED_WINDOW = 2048 # Chunks length-sorted together; smaller corpora are encoded in-process
+
+    # Knowledge Graph build
+    KG_MAX_CONCURRENCY = 4 # Parallel Gemini calls
+    KG_CHUNKS_PER_PROMPT = 4
+    KG_EXTRACTION_MAX_ATTEMPTS = 3 # Builds that may fail on a chunk before it is cached as having no triples
+    KG_MAX_MATCHES = 3 # Entities matched per query
+    KG_MAX_EDGES = 30 # Edges returned per query
+    KG_HYBRID_HOPS = 2 # Hybrid mode pulls 2-hop context
+    KG_RELATION_WEIGHTS = {"related_to": 0.5} # Generic relations rank below specific ones
+    # Cosine at which entity names also merge by embedding (e.g. 0.9); None = plural / determiner merging only.
+    # Short contrasting names (concave / convex, anode / cathode) can pass 0.9: audit canonical_report["merged"]
+    KG_CANONICAL_THRESHOLD = None
+
+    # Answer cache
+    CACHE_ENABLED = True
+    CACHE_MAX_SIZE = 1000
+    CACHE_TTL_SECONDS = 24 * 60 * 60
+    CACHE_SIMILARITY_THRESHOLD = 0.92 # Cosine similarity for a semantic hit
+
+    # Interaction logging
+    LOG_SINK = "sheets" # "sheets", "file", "sqlite" or "none"
+    LOG_FILE_PATH = "data/interactions.jsonl"
+    LOG_SQLITE_PATH = "data/interactions.db"
+    LOG_SPOOL_PATH = "data/log_spool.jsonl" # Rows waiting for the sink to come back
+    LOG_QUEUE_SIZE = 10000 # Rows beyond this are dropped, never waited on
+    LOG_BATCH_SIZE = 50
+    LOG_FLUSH_INTERVAL = 5.0 # Seconds
+    LOG_SLOW_SECONDS = 5.0 # A sink call slower than this counts as degraded
+    LOG_RETRY_SECONDS = 60.0 # How long to spool before trying the sink again
+
+    # Corpus (one vector index and KG partition per book)
+    DEFAULT_SUBJECT = "science" # For books without a subject folder or sidecar JSON
+    DEFAULT_GRADE = 10
+    SHARD_SEARCH_WORKERS = 8 # Threads fanning a search out over shards
+    FILTER_OVERSAMPLE = 4 # Extra hits fetched per shard when filtering on chapter or page
+
+    # Vector index ("flat", "ivf_flat", "hnsw" or "ivf_pq")
+    VECTOR_INDEX_TYPE = "flat"
+    VECTOR_METRIC = "cosine" # "cosine" / "ip" (normalized vectors) or "l2"
+    ANN_MIN_VECTORS = 1000 # Below this an exact index is used regardless
+    IVF_NLIST = 1024 # Capped at n / 39 for small corpora
+    IVF_NPROBE = 16
+    HNSW_M = 32
+    HNSW_EF_CONSTRUCTION = 200
+    HNSW_EF_SEARCH = 64
+    PQ_M = 48 # Sub-quantizers; must divide the embedding dimension (384)
+    PQ_NBITS = 8
+
+    # Batch queries
+    BATCH_MAX_CONCURRENCY = 8 # Parallel Gemini calls for get_responses
+
+    # Metrics (per-stage latency histograms)
+    METRICS_ENABLED = True
+    METRICS_WINDOW = 500 # Observations kept per stage
+
+    # Context assembly (token counts are estimated at ~4 characters per token)
+    CONTEXT_TOKEN_BUDGET = { # Per intent; covers textbook passages, KG facts and history
+        "Quiz": 2500,
+        "Definition": 600,
+        "Numerical": 1000,
+        "Summary": 1500,
+        "General": 1000,
+    }
+    CONTEXT_KG_SHARE = 0.25 # Fraction of the budget KG facts may take when there are passages
+    CONTEXT_HISTORY_TOKENS = 300 # Cap for conversation history
+    CONTEXT_DEDUP_THRESHOLD = 0.95 # Cosine similarity above which a chunk counts as a duplicate
+
+    # Query service (serve.py)
+    SERVICE_URL = os.getenv("SCIENCEBOT_SERVICE_URL") # e.g. "http://127.0.0.1:8765"; unset = run the engine in-process
+    SERVICE_HOST = "127.0.0.1"
+    SERVICE_PORT = 8765
+    SERVICE_TIMEOUT = 120 # Seconds a client waits for an answer
+    MICRO_BATCH_WINDOW = 0.005 # Seconds the first query waits for others to share its encode/search
+    MICRO_BATCH_MAX_SIZE = 64
+
+    # LLM gateway (src/llm_gateway.py): every Gemini call in the process goes through it
+    LLM_MAX_CONCURRENCY = 16 # Gemini calls in flight per engine, across all users and the KG build
+    LLM_TIMEOUT = 60 # Seconds per call (per chunk gap when streaming)
+    LLM_MAX_RETRIES = 5
+    LLM_RETRY_BASE_DELAY = 1.0 # Seconds, doubled on every rate-limit retry
+    LLM_HEDGE_PERCENTILE = 95 # Send a second request once a call is slower than this; None = never hedge
+    LLM_HEDGE_MIN_SAMPLES = 20 # Calls of a kind measured before hedging it
+    LLM_HEDGE_WINDOW = 200 # Recent calls the percentile is taken over
+    LLM_HEDGE_QUIET_SECONDS = 30 # No hedging this long after a rate-limit error
+
+    # Quiz bank (build_quiz_bank.py)
+    QUIZ_BANK_ENABLED = True # Answer Quiz / Definition questions on banked topics without a Gemini call
+    QUIZ_BANK_PATH = "data/quiz_bank.db"
+    QUIZ_BANK_VARIANTS = 3 # Quiz sets per chapter, each on a different part of it, served in rotation
+    QUIZ_BANK_DEFINITIONS = 50 # Best-connected KG entities defined per book
+    QUIZ_BANK_PAGES_PER_TOPIC = 5 # Quiz topic size for pages outside any chapter
+    QUIZ_BANK_CONCURRENCY = 4 # Parallel Gemini calls while building
+
+    # Image questions
+    IMAGE_MAX_SIDE = 1024 # Longest side in pixels sent to Gemini
+    IMAGE_JPEG_QUALITY = 85
+    IMAGE_CACHE_DIR = "data/image_cache" # <sha256 of the prepared JPEG>.json holds caption and labels
+    IMAGE_CAPTIONS = True # One extra Gemini call per new image; the caption and labels feed retrieval
+
+    # Knowledge graph view
+    VIZ_MAX_NODES = 100 # Overview shows the best-connected nodes
+    VIZ_MAX_EDGES = 300
+    VIZ_FOCUS_HOPS = 2 # Neighbourhood shown around the concepts in the latest question
+    VIZ_CACHE_SIZE = 32 # Rendered pages kept in memory
@@ -0,0 +1,158 @@
+import hashlib
+import numpy as np
+from src.config import Config
+
+
+def estimate_tokens(text):
+    """Rough Gemini token count (about 4 characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def format_edge(edge):
+    head, relation, tail = edge
+    return f"{head} --[{relation}]--> {tail}"
+
+
+def merge_overlapping(first, second):
+    """Joins consecutive chunks, dropping the words the second repeats from the first's tail."""
+    first_words = first.split()
+    second_words = second.split()
+    # Chunks carry at most CHUNK_OVERLAP characters, i.e. a handful of words
+    for n in range(min(len(first_words), len(second_words), Config.CHUNK_OVERLAP // 2), 0, -1):
+        if first_words[-n:] == second_words[:n]:
+            return " ".join(first_words + second_words[n:])
+    return first + "\n" + second
+
+
+class ContextBuilder:
+    """
+    Assembles the prompt's textbook, KG and history sections under a per-intent
+    token budget (CONTEXT_TOKEN_BUDGET):
+      1. drop chunks whose text repeats (content hash) or whose stored embedding
+         is a near-duplicate of a better-ranked chunk,
+      2. merge neighbouring chunks from the same page, removing their overlap,
+      3. rank KG edges, preferring facts about concepts in the question or passages,
+      4. pack history, edges and passages until the budget is used up.
+    """
+    def __init__(self, budgets=None, dedup_threshold=None):
+        self.budgets = budgets or Config.CONTEXT_TOKEN_BUDGET
+        self.dedup_threshold = dedup_threshold or Config.CONTEXT_DEDUP_THRESHOLD
+
+    def build(self, q_type, query, chunks=(), edges=(), history=(), embeddings=None):
+        """
+        chunks: ranked search results (dicts with "text", "metadata" and the store's "id")
+        edges: ranked (head, relation, tail) tuples
+        history: formatted conversation lines, oldest first
+        embeddings: the vector store's matrix, indexed by chunk id
+        Returns the three prompt sections plus the tokens used and saved.
+        """
+        raw_tokens = (sum(estimate_tokens(c['text']) for c in chunks)
+                      + sum(estimate_tokens(format_edge(e)) for e in edges)
+                      + sum(estimate_tokens(line) for line in history))
+        budget = self.budgets.get(q_type, self.budgets["General"])
+
+        # Most recent turns first, shown oldest first
+        history_lines = self._pack(list(reversed(history)), min(Config.CONTEXT_HISTORY_TOKENS, budget // 4))[::-1]
+        remaining = budget - sum(estimate_tokens(line) for line in history_lines)
+
+        passages = self.merge_adjacent(self.dedupe(chunks, embeddings))
+        edge_lines = [format_edge(e) for e in self.rank_edges(query, edges, passages)]
+
+        # KG facts get a share of the budget; the passages get whatever they leave
+        kg_budget = int(remaining * Config.CONTEXT_KG_SHARE) if passages else remaining
+        kg_lines = self._pack(edge_lines, kg_budget)
+        remaining -= sum(estimate_tokens(line) for line in kg_lines)
+        passages = self._pack(passages, remaining, truncate_first=True)
+
+        used = (sum(estimate_tokens(p) for p in passages)
+                + sum(estimate_tokens(line) for line in kg_lines)
+                + sum(estimate_tokens(line) for line in history_lines))
+        return {
+            "context_text": "\n".join(passages),
+            "kg_text": "\n".join(kg_lines),
+            "history_text": "".join(history_lines),
+            "tokens": used,
+            "tokens_saved": max(raw_tokens - used, 0),
+        }
+
+    def dedupe(self, chunks, embeddings=None):
+        """Keeps the best-ranked copy of repeated or near-identical chunks."""
+        kept = []
+        digests = set()
+        vectors = []
+        for chunk in chunks:
+            digest = hashlib.sha1(" ".join(chunk['text'].lower().split()).encode('utf-8')).hexdigest()
+            if digest in digests:
+                continue
+            vector = self._vector(chunk, embeddings)
+            if vector is not None and vectors and float(np.max(np.stack(vectors) @ vector)) >= self.dedup_threshold:
+                continue
+            digests.add(digest)
+            kept.append(chunk)
+            if vector is not None:
+                vectors.append(vector)
+        return kept
+
+    @staticmethod
+    def _vector(chunk, embeddings):
+        """The chunk's stored embedding as a unit vector, if we have it."""
+        if embeddings is None or "id" not in chunk:
+            return None
+        vector = np.asarray(embeddings[chunk["id"]], dtype='float32')
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    @staticmethod
+    def merge_adjacent(chunks):
+        """
+        Joins chunks that follow each other on the same page into one passage.
+        Returns passage texts, each placed at its best-ranked chunk's position.
+        """
+        runs = []
+        with_id = sorted(((c["id"], rank, c) for rank, c in enumerate(chunks) if "id" in c), key=lambda t: t[:2])
+        for chunk_id, rank, chunk in with_id:
+            last = runs[-1] if runs else None
+            page = chunk.get("metadata", {}).get("page")
+            if last and chunk_id == last["id"] + 1 and page is not None and page == last["page"]:
+                last["text"] = merge_overlapping(last["text"], chunk["text"])
+                last["rank"] = min(last["rank"], rank)
+                last["id"] = chunk_id
+            else:
+                runs.append({"rank": rank, "text": chunk["text"], "id": chunk_id, "page": page})
+        runs += [{"rank": rank, "text": c["text"]} for rank, c in enumerate(chunks) if "id" not in c]
+        runs.sort(key=lambda run: run["rank"])
+        return [run["text"] for run in runs]
+
+    @staticmethod
+    def rank_edges(query, edges, passages=()):
+        """
+        Drops repeated facts and moves edges whose endpoints are mentioned in the
+        question or the kept passages to the front; expansion order breaks ties.
+        """
+        text = " ".join([query, *passages]).lower()
+        seen = set()
+        ranked = []
+        for rank, (head, relation, tail) in enumerate(edges):
+            key = (head.lower(), relation.lower(), tail.lower())
+            if key in seen:
+                continue
+            seen.add(key)
+            grounded = (head.lower() in text) + (tail.lower() in text)
+            ranked.append((-grounded, rank, (head, relation, tail)))
+        ranked.sort()
+        return [edge for _, _, edge in ranked]
+
+    @staticmethod
+    def _pack(items, budget, truncate_first=False):
+        """Keeps items, in order, while they fit in the token budget."""
+        kept = []
+        for item in items:
+            tokens = estimate_tokens(item)
+            if tokens <= budget:
+                kept.append(item)
+                budget -= tokens
+            elif truncate_first and not kept and budget > 0:
+                # Better a cut-down best passage than no textbook context at all
+                kept.append(item[:budget * 4].rsplit(" ", 1)[0])
+                budget = 0
+        return kept
@@ -0,0 +1,259 @@
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import zip_longest
+import numpy as np
+from src.config import Config
+from src.context_builder import format_edge
+
+# Filter keys that select whole books (shards); any other key filters chunk metadata, e.g. "chapter"
+BOOK_KEYS = ("book", "subject", "grade", "source")
+
+
+def _book(book_id, pdf_path, title, subject, grade, kg_path=None):
+    return {"id": book_id, "pdf_path": pdf_path, "title": title, "subject": subject, "grade": grade,
+            "kg_path": kg_path}
+
+
+def discover_books(corpus_dir=None):
+    """
+    Every PDF under CORPUS_DIR as a book dict. Subject and grade come from a
+    sidecar <name>.json ({"title", "subject", "grade"}) or else from the
+    folders, e.g. corpus/chemistry/grade9/atoms.pdf. Without any corpus PDFs
+    this is the single PDF_PATH textbook with its original index and KG paths.
+    """
+    corpus_dir = corpus_dir or Config.CORPUS_DIR
+    books = []
+    for root, dirs, files in os.walk(corpus_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.lower().endswith(".pdf"):
+                continue
+            pdf_path = os.path.join(root, name)
+            relative = os.path.splitext(os.path.relpath(pdf_path, corpus_dir))[0]
+            folders = relative.split(os.sep)[:-1]
+            book_id = re.sub(r"[^a-z0-9]+", "-", relative.lower()).strip("-")
+
+            grades = [int(m.group(1)) for m in (re.search(r"(\d+)", f) for f in folders) if m]
+            meta = {
+                "title": os.path.splitext(name)[0].replace("_", " "),
+                "subject": folders[0].lower() if folders else Config.DEFAULT_SUBJECT,
+                "grade": grades[0] if grades else Config.DEFAULT_GRADE,
+            }
+            sidecar = os.path.splitext(pdf_path)[0] + ".json"
+            if os.path.exists(sidecar):
+                with open(sidecar, 'r', encoding='utf-8') as f:
+                    meta.update({k: v for k, v in json.load(f).items() if k in meta})
+            books.append(_book(
+                book_id, pdf_path, meta["title"], meta["subject"], int(meta["grade"]),
+                kg_path=os.path.join(Config.KG_SHARDS_PATH, book_id),
+            ))
+    if not books:
+        books.append(single_book(Config.PDF_PATH))
+    return books
+
+
+def single_book(pdf_path="fixture"):
+    """The one-book corpus: the legacy PDF_PATH textbook, or an injected fixture corpus."""
+    book_id = os.path.splitext(os.path.basename(pdf_path))[0]
+    return _book(book_id, pdf_path, book_id, Config.DEFAULT_SUBJECT, Config.DEFAULT_GRADE)
+
+
+def book_metadata(book):
+    """What a book stamps into each chunk's metadata (see PDFIngestor)."""
+    return {"source": book["id"], "book": book["title"], "subject": book["subject"], "grade": book["grade"]}
+
+
+def _matches(metadata, filters):
+    for key, wanted in filters.items():
+        allowed = wanted if isinstance(wanted, (list, tuple, set)) else (wanted,)
+        if metadata.get(key) not in allowed:
+            return False
+    return True
+
+
+def split_filters(filters):
+    """(book-level filters, chunk-level filters)."""
+    filters = filters or {}
+    return ({k: v for k, v in filters.items() if k in BOOK_KEYS},
+            {k: v for k, v in filters.items() if k not in BOOK_KEYS})
+
+
+def select_books(books, filters):
+    """Indexes of the books a filter allows; "book" may name a book's id or its title."""
+    book_filters, _ = split_filters(filters)
+    wanted = book_filters.pop("book", None)
+    selected = []
+    for i, book in enumerate(books):
+        if wanted is not None and not any(_matches({"book": name}, {"book": wanted}) for name in (book["id"], book["title"])):
+            continue
+        if _matches(book_metadata(book), book_filters):
+            selected.append(i)
+    return selected
+
+
+class ShardedEmbeddings:
+    """Embedding rows by global chunk id, read from each shard's (memory-mapped) matrix."""
+    def __init__(self, corpus):
+        self.corpus = corpus
+
+    def __getitem__(self, chunk_id):
+        shard = int(np.searchsorted(self.corpus.offsets, chunk_id, side="right")) - 1
+        return self.corpus.stores[shard].embeddings[chunk_id - self.corpus.offsets[shard]]
+
+    def __len__(self):
+        return int(self.corpus.offsets[-1])
+
+
+class CorpusVectorStore:
+    """
+    One VectorStore shard per book behind the VectorStore search interface.
+    A filter on book / subject / grade only searches the matching shards; a
+    broader search fans out over them in parallel and merges the top-k by
+    score. Hit "id"s are global (shard offset + row), so they stay unique
+    across books. Each shard's index is keyed by its own PDF, so adding a
+    book never rebuilds the others.
+    """
+    def __init__(self, books, stores):
+        self.books = books
+        self.stores = stores
+        self.offsets = np.cumsum([0] + [len(store.chunks) for store in stores])
+        self.chunks = [chunk for store in stores for chunk in store.chunks]
+        self.embeddings = ShardedEmbeddings(self)
+        self.params = stores[0].params
+        self.embedder = stores[0].embedder # Every shard shares one embedding model
+        self._pool = ThreadPoolExecutor(max_workers=Config.SHARD_SEARCH_WORKERS, thread_name_prefix="shard-search")
+
+    @property
+    def normalize(self):
+        return self.stores[0].normalize
+
+    def encode_query(self, query):
+        return self.stores[0].encode_query(query)
+
+    def encode_queries(self, queries):
+        return self.stores[0].encode_queries(queries)
+
+    def shard(self, book_id):
+        """The VectorStore holding one book."""
+        return self.stores[[book["id"] for book in self.books].index(book_id)]
+
+    def search(self, query, k=3, query_vector=None, filters=None):
+        """Top k chunks across the shards matching filters (e.g. {"subject": "physics", "grade": [9, 10]})."""
+        if query_vector is None:
+            query_vector = self.encode_query(query)
+        return self.search_batch(query_vector, k=k, filters=filters)[0]
+
+    def search_batch(self, query_vectors, k=3, filters=None):
+        """One FAISS search per matching shard (in parallel); returns a list of top-k chunk lists."""
+        query_vectors = np.ascontiguousarray(query_vectors, dtype='float32')
+        _, chunk_filters = split_filters(filters)
+        shards = [i for i in select_books(self.books, filters) if self.stores[i].index.ntotal]
+        if not shards:
+            return [[] for _ in range(len(query_vectors))]
+        # Chunk-level filters are applied after the search, so fetch extra (and more if that was not enough)
+        fetch = k * Config.FILTER_OVERSAMPLE if chunk_filters else k
+        largest = max(self.stores[i].index.ntotal for i in shards)
+        while True:
+            results = self._search_shards(query_vectors, shards, fetch, k, chunk_filters)
+            if fetch >= largest or all(len(hits) == k for hits in results):
+                return results
+            fetch *= Config.FILTER_OVERSAMPLE
+
+    def _search_shards(self, query_vectors, shards, fetch, k, chunk_filters):
+        def run(i):
+            return self.stores[i].index.search(query_vectors, min(fetch, self.stores[i].index.ntotal))
+        if len(shards) == 1:
+            found = [run(shards[0])]
+        else:
+            found = list(self._pool.map(run, shards))
+
+        results = []
+        for row in range(len(query_vectors)):
+            hits = [
+                (float(score), shard, int(idx))
+                for shard, (distances, indices) in zip(shards, found)
+                for score, idx in zip(distances[row], indices[row]) if idx != -1
+            ]
+            # Similarity metrics rank high scores first, L2 low distances first
+            hits.sort(key=lambda h: -h[0] if self.normalize else h[0])
+            merged = []
+            for _, shard, idx in hits:
+                chunk = self.stores[shard].chunks[idx]
+                if chunk_filters and not _matches(chunk.get("metadata", {}), chunk_filters):
+                    continue
+                merged.append({**chunk, "id": int(self.offsets[shard] + idx)})
+                if len(merged) == k:
+                    break
+            results.append(merged)
+        return results
+
+
+class CorpusKnowledgeGraph:
+    """
+    One SimpleKnowledgeGraph partition per book behind its query interface.
+    Lookups go to the partitions matching the filter and interleave their
+    best edges; the visualiser gets a merged CompactGraph, rebuilt only when
+    a partition changes.
+    """
+    def __init__(self, books, graphs):
+        self.books = books
+        self.graphs = graphs
+        self._merged = None
+        self._merged_version = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return sum(graph.version for graph in self.graphs)
+
+    def num_nodes(self):
+        return sum(graph.num_nodes() for graph in self.graphs)
+
+    def partition(self, book_id):
+        """The SimpleKnowledgeGraph holding one book."""
+        return self.graphs[[book["id"] for book in self.books].index(book_id)]
+
+    def get_related_edges(self, query, hops=1, max_edges=None, filters=None):
+        """Edges for the query from the matching partitions, each contributing its best edges first."""
+        max_edges = max_edges or Config.KG_MAX_EDGES
+        graphs = [self.graphs[i] for i in select_books(self.books, filters)]
+        if len(graphs) == 1:
+            return graphs[0].get_related_edges(query, hops=hops, max_edges=max_edges)
+        per_graph = [graph.get_related_edges(query, hops=hops, max_edges=max_edges) for graph in graphs]
+        merged = {}
+        for round_edges in zip_longest(*per_graph):
+            for edge in round_edges:
+                if edge is not None:
+                    merged.setdefault(edge, None)
+        return list(merged)[:max_edges]
+
+    def get_related_concepts(self, query, hops=1, max_edges=None, filters=None):
+        """Same as get_related_edges, formatted as "head --[relation]--> tail" strings."""
+        edges = self.get_related_edges(query, hops=hops, max_edges=max_edges, filters=filters)
+        return [format_edge(edge) for edge in edges]
+
+    def get_compact_graph(self):
+        """A CSR view over all partitions."""
+        if len(self.graphs) == 1:
+            return self.graphs[0].get_compact_graph()
+        self._refresh_merged()
+        return self._merged[0]
+
+    def get_matcher(self):
+        if len(self.graphs) == 1:
+            return self.graphs[0].get_matcher()
+        self._refresh_merged()
+        return self._merged[1]
+
+    def _refresh_merged(self):
+        with self._lock:
+            version = self.version
+            if self._merged_version != version:
+                from src.graph_index import CompactGraph
+                from src.knowledge_graph import build_matcher
+                compact = CompactGraph.merge([graph.get_compact_graph() for graph in self.graphs])
+                self._merged = (compact, build_matcher(compact))
+                self._merged_version = version
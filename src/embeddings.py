@@ -0,0 +1,350 @@
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from src.config import Config
+
+QUERY_ENCODERS = ("torch", "onnx", "onnx_int8")
+
+# Sentences an ONNX export must reproduce before it replaces the torch model for queries
+VERIFY_SENTENCES = [
+    "what is photosynthesis",
+    "Define atomic mass and explain how it differs from mass number.",
+    "A ray of light passes from air into glass and bends towards the normal.",
+    "quiz on acids bases and salts",
+]
+
+# Packages an export needs; a failed export is retried only once one of their versions changes
+EXPORT_PACKAGES = ("torch", "onnx", "onnxruntime")
+
+# Per-process model for the bulk encoding pool
+_worker_model = None
+
+
+def _init_worker(model_name, threads):
+    global _worker_model
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch.set_num_threads(threads) # Workers split the cores instead of all fighting for them
+    _worker_model = SentenceTransformer(model_name)
+
+
+def _encode_batch(texts, batch_size):
+    return _worker_model.encode(texts, batch_size=batch_size, convert_to_numpy=True).astype('float32')
+
+
+def _windows(items, size):
+    window = []
+    for item in items:
+        window.append(item)
+        if len(window) >= size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
+def model_dir(model_name=None):
+    """Where the ONNX export of an embedding model lives."""
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", model_name or Config.EMBEDDING_MODEL).strip("-")
+    return os.path.join(Config.ONNX_MODEL_DIR, slug)
+
+
+def export_environment():
+    """Installed versions of EXPORT_PACKAGES (None if missing), read without importing them."""
+    from importlib.metadata import PackageNotFoundError, version
+    versions = {}
+    for package in EXPORT_PACKAGES:
+        try:
+            versions[package] = version(package)
+        except PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+
+def record_export_failure(out_dir, error, model_name=None):
+    """Writes an encoder.json marking the export as failed in this environment."""
+    os.makedirs(out_dir, exist_ok=True)
+    marker = {"model": model_name or Config.EMBEDDING_MODEL, "failed": str(error), "environment": export_environment()}
+    with open(os.path.join(out_dir, "encoder.json"), 'w', encoding='utf-8') as f:
+        json.dump(marker, f, indent=2)
+
+
+def export_onnx(model, out_dir, model_name=None):
+    """
+    Exports the model's transformer to out_dir/model.onnx (plus an int8
+    dynamically quantized model-int8.onnx), with its tokenizer and the
+    pooling settings needed to reproduce model.encode() without torch.
+    encoder.json records how closely each export matches the torch vectors.
+    """
+    pooling_mode = model[1].get_pooling_mode_str()
+    if pooling_mode not in ("mean", "cls", "max"):
+        raise ValueError(f"unsupported pooling mode {pooling_mode!r}")
+
+    staging = f"{out_dir}.tmp-{os.getpid()}"
+    os.makedirs(staging, exist_ok=True)
+    try:
+        _export_to(model, staging, pooling_mode, model_name)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(staging, out_dir)
+    with open(os.path.join(out_dir, "encoder.json"), 'r', encoding='utf-8') as f:
+        print(f"Exported ONNX query encoder to {out_dir} (min cosine vs torch: {json.load(f)['min_cosine']})")
+
+
+def _export_to(model, staging, pooling_mode, model_name):
+    """Writes the export into staging; export_onnx() moves it into place once complete."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    transformer = model[0]
+    tokenizer = transformer.tokenizer
+    sample = tokenizer(VERIFY_SENTENCES[:2], padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs):
+            return self.auto_model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    export_args = dict(input_names=input_names, output_names=["last_hidden_state"],
+                       dynamic_axes=dynamic_axes, opset_version=14)
+    wrapper = LastHiddenState(transformer.auto_model).eval()
+    inputs = tuple(sample[name] for name in input_names)
+    path = os.path.join(staging, "model.onnx")
+    with torch.no_grad():
+        try:
+            torch.onnx.export(wrapper, inputs, path, dynamo=False, **export_args)
+        except TypeError: # Older torch has no dynamo switch
+            torch.onnx.export(wrapper, inputs, path, **export_args)
+
+    quantize_dynamic(path, os.path.join(staging, "model-int8.onnx"), weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(staging) # Writes tokenizer.json for the fast tokenizers library
+    config = {
+        "model": model_name or Config.EMBEDDING_MODEL,
+        "inputs": input_names,
+        "pooling": pooling_mode,
+        "normalize": any(type(module).__name__ == "Normalize" for module in model),
+        "max_seq_length": model.max_seq_length,
+        "dimension": model.get_sentence_embedding_dimension(),
+        "pad_id": tokenizer.pad_token_id,
+        "pad_token": tokenizer.pad_token,
+    }
+    config_path = os.path.join(staging, "encoder.json")
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+
+    # Measured once here, so loading an export later needs no torch
+    reference = model.encode(VERIFY_SENTENCES, convert_to_numpy=True).astype('float32')
+    config["min_cosine"] = {
+        encoder.backend: round(float(min_cosine(reference, encoder.encode(VERIFY_SENTENCES))), 5)
+        for encoder in (OnnxQueryEncoder(staging), OnnxQueryEncoder(staging, quantized=True))
+    }
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+
+
+def min_cosine(a, b):
+    """Smallest row-wise cosine similarity between two embedding matrices."""
+    cosine = np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    return cosine.min()
+
+
+class TorchQueryEncoder:
+    """Queries through the SentenceTransformer itself (the reference path)."""
+    backend = "torch"
+
+    def __init__(self, model):
+        self.model = model
+
+    def encode(self, texts):
+        return self.model.encode(list(texts), batch_size=Config.EMBED_BATCH_SIZE, convert_to_numpy=True).astype('float32')
+
+
+class OnnxQueryEncoder:
+    """
+    The exported model run by ONNX Runtime with the Rust tokenizer: no torch
+    import and far less per-call overhead for the one short query of a request.
+    """
+    def __init__(self, directory, quantized=False):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+        with open(os.path.join(directory, "encoder.json"), 'r', encoding='utf-8') as f:
+            self.config = json.load(f)
+        self.backend = "onnx_int8" if quantized else "onnx"
+        self.dimension = self.config["dimension"]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_id"], pad_token=self.config["pad_token"])
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = Config.QUERY_ENCODER_THREADS
+        path = os.path.join(directory, "model-int8.onnx" if quantized else "model.onnx")
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def encode(self, texts):
+        encodings = self.tokenizer.encode_batch(list(texts))
+        arrays = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {name: arrays[name] for name in self.config["inputs"]})[0]
+
+        mask = arrays["attention_mask"][:, :, None].astype(np.float32)
+        if self.config["pooling"] == "mean":
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        elif self.config["pooling"] == "cls":
+            pooled = hidden[:, 0]
+        else:
+            pooled = np.where(mask > 0, hidden, -1e9).max(axis=1)
+        if self.config["normalize"]:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return np.ascontiguousarray(pooled, dtype='float32')
+
+
+class Embedder:
+    """
+    The embedding model behind VectorStore, shared by every shard.
+
+    Queries go through QUERY_ENCODER: "onnx" / "onnx_int8" run an export of
+    the same model (made once and checked against torch to within
+    QUERY_ENCODER_MIN_COSINE), otherwise, or if that fails, the torch model.
+    Corpora are encoded in length-sorted batches, spread over EMBED_WORKERS
+    processes once there is more than one EMBED_WINDOW of chunks.
+    The torch model itself is only loaded when something needs it.
+    """
+    def __init__(self, model_name=None, query_encoder=None, workers=None):
+        self.model_name = model_name or Config.EMBEDDING_MODEL
+        self.requested_backend = query_encoder or Config.QUERY_ENCODER
+        if self.requested_backend not in QUERY_ENCODERS:
+            raise ValueError(f"Unknown QUERY_ENCODER {self.requested_backend!r}; expected one of {QUERY_ENCODERS}")
+        self.workers = workers or Config.EMBED_WORKERS or min(4, os.cpu_count() or 1)
+        self._model = None
+        self._query_encoder = None
+        self._lock = threading.Lock()
+        self._query_lock = threading.Lock()
+
+    @property
+    def model(self):
+        """The SentenceTransformer (torch is imported on first use)."""
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.model_name)
+            return self._model
+
+    @property
+    def query_backend(self):
+        """The query path actually in use ("torch" after a fallback)."""
+        return self.query_encoder().backend
+
+    def warm(self):
+        """Loads the query encoder now rather than on the first query."""
+        self.query_encoder()
+
+    def dimension(self):
+        encoder = self.query_encoder()
+        return getattr(encoder, "dimension", None) or self.model.get_sentence_embedding_dimension()
+
+    def query_encoder(self):
+        with self._query_lock:
+            if self._query_encoder is None:
+                encoder = None
+                if self.requested_backend != "torch":
+                    try:
+                        encoder = self._load_onnx()
+                    except Exception as e:
+                        print(f"⚠️ {self.requested_backend} query encoder unavailable ({e}); using torch")
+                self._query_encoder = encoder or TorchQueryEncoder(self.model)
+            return self._query_encoder
+
+    def _load_onnx(self):
+        directory = model_dir(self.model_name)
+        config_path = os.path.join(directory, "encoder.json")
+        if os.path.exists(config_path):
+            with open(config_path, 'r', encoding='utf-8') as f:
+                marker = json.load(f)
+            # Don't load torch to retry an export that failed with the same packages installed
+            if "failed" in marker and marker.get("environment") == export_environment():
+                raise RuntimeError(f"ONNX export failed earlier: {marker['failed']} (delete {directory} to retry)")
+            if "failed" in marker:
+                os.remove(config_path)
+        if not os.path.exists(config_path):
+            try:
+                export_onnx(self.model, directory, self.model_name)
+            except Exception as e:
+                record_export_failure(directory, e, self.model_name)
+                raise
+        encoder = OnnxQueryEncoder(directory, quantized=self.requested_backend == "onnx_int8")
+
+        # Only trust an export that reproduced the torch vectors when it was made
+        cosine = encoder.config.get("min_cosine", {}).get(encoder.backend, 0.0)
+        if cosine < Config.QUERY_ENCODER_MIN_COSINE:
+            raise ValueError(f"export differs from torch (min cosine {cosine:.4f})")
+        return encoder
+
+    def encode_queries(self, texts):
+        """(n, dim) float32 query embeddings from the selected query path."""
+        return self.query_encoder().encode(texts)
+
+    def encode_corpus(self, texts):
+        """(n, dim) float32 embeddings in input order, through the bulk path."""
+        parts = [embeddings for _, embeddings in self.iter_encode({"text": t} for t in texts)]
+        return np.vstack(parts) if parts else np.zeros((0, self.dimension()), dtype='float32')
+
+    def iter_encode(self, chunks):
+        """
+        Encodes a stream of chunks one EMBED_WINDOW at a time, yielding
+        (chunks, embeddings) in input order. Sorting a window by length keeps
+        each batch's padding short.
+        """
+        pool = None
+        try:
+            for window in _windows(chunks, Config.EMBED_WINDOW):
+                # A full first window means a corpus big enough to pay for starting workers
+                if pool is None and self.workers > 1 and len(window) >= Config.EMBED_WINDOW:
+                    pool = self._start_pool()
+                yield window, self._encode_sorted([c['text'] for c in window], pool)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+    def _start_pool(self):
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        print(f"Encoding with {self.workers} worker processes ({threads} threads each)...")
+        # spawn, not fork: forking after torch has started its thread pools can deadlock
+        return ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(self.model_name, threads),
+        )
+
+    def _encode_sorted(self, texts, pool=None):
+        batch_size = Config.EMBED_BATCH_SIZE
+        order = np.argsort([len(t) for t in texts], kind="stable")
+        batches = [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+        texts_by_batch = [[texts[j] for j in batch] for batch in batches]
+        if pool is not None:
+            encoded = pool.map(_encode_batch, texts_by_batch, [batch_size] * len(batches))
+        else:
+            model = self.model
+            encoded = (model.encode(t, batch_size=batch_size, convert_to_numpy=True).astype('float32')
+                       for t in texts_by_batch)
+
+        out = None
+        for batch, embeddings in zip(batches, encoded):
+            if out is None:
+                out = np.empty((len(texts), embeddings.shape[1]), dtype='float32')
+            out[batch] = embeddings
+        return out
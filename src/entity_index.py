@@ -0,0 +1,129 @@
+import re
+from collections import deque
+
+# Single-word nodes that would match almost any question
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "of", "in", "on", "to", "and", "or", "it",
+    "what", "how", "why", "which", "this", "that", "with", "for", "by", "as",
+}
+
+# "query occurs in node" is skipped when every query token is this common
+MAX_POSTINGS = 5000
+
+
+def tokenize(text):
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+class EntityMatcher:
+    """
+    Ranked entity lookup over graph node names.
+    A word-level Aho-Corasick automaton finds every node that occurs in the query,
+    and a token inverted index finds nodes that contain the query.
+    """
+    def __init__(self, names, weights=None):
+        self.names = list(names)
+        self.weights = weights or {}
+        self.lengths = []
+
+        # Automaton: goto transitions, failure links, and the pattern ending at each state
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [-1]
+        self.dict_link = [0]
+
+        self.postings = {}
+        self.name_tokens = []
+
+        for name_id, name in enumerate(self.names):
+            tokens = tokenize(name)
+            self.name_tokens.append(tokens)
+            self.lengths.append(len(tokens))
+            if not tokens or (len(tokens) == 1 and tokens[0] in STOPWORDS):
+                continue
+            self._insert(tokens, name_id)
+            for token in set(tokens):
+                self.postings.setdefault(token, []).append(name_id)
+
+        self._link()
+
+    def _insert(self, tokens, name_id):
+        state = 0
+        for token in tokens:
+            nxt = self.goto[state].get(token)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][token] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(-1)
+                self.dict_link.append(0)
+            state = nxt
+        self.output[state] = name_id
+
+    def _link(self):
+        """Breadth-first pass that fills in failure and dictionary links."""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and token not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(token, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                f = self.fail[nxt]
+                self.dict_link[nxt] = f if self.output[f] != -1 else self.dict_link[f]
+
+    def _contained_in_query(self, tokens):
+        """Yields ids of every node whose token sequence occurs in the query."""
+        state = 0
+        for token in tokens:
+            while state and token not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(token, 0)
+
+            hit = state if self.output[state] != -1 else self.dict_link[state]
+            while hit:
+                yield self.output[hit]
+                hit = self.dict_link[hit]
+
+    def _containing_query(self, tokens):
+        """Returns ids of nodes whose token sequence contains the query's."""
+        content = [t for t in tokens if t not in STOPWORDS] or tokens
+        lists = [self.postings.get(t) for t in set(content)]
+        if not lists or any(p is None for p in lists):
+            return []
+        lists.sort(key=len)
+        if len(lists[0]) > MAX_POSTINGS:
+            return []
+
+        candidates = set(lists[0])
+        for posting in lists[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+
+        n = len(tokens)
+        return [
+            i for i in candidates
+            if any(self.name_tokens[i][j:j + n] == tokens for j in range(len(self.name_tokens[i]) - n + 1))
+        ]
+
+    def match(self, query, limit=3):
+        """Returns up to `limit` node names, most specific and best connected first."""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        # Longer matches inside the query are more specific than short ones
+        scored = {}
+        for name_id in self._contained_in_query(tokens):
+            scored[name_id] = (1, self.lengths[name_id], self.weights.get(self.names[name_id], 0))
+        for name_id in self._containing_query(tokens):
+            if name_id not in scored:
+                scored[name_id] = (0, -self.lengths[name_id], self.weights.get(self.names[name_id], 0))
+
+        ranked = sorted(scored, key=scored.get, reverse=True)
+        return [self.names[i] for i in ranked[:limit]]
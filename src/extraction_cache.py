@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from src.config import Config
+
+
+class ExtractionCache:
+    """
+    SQLite store of the triples Gemini extracted from each chunk, keyed by a
+    hash of the chunk text, the extraction prompt version and the model.
+    A rebuild only sends new or changed chunks to Gemini, and an interrupted
+    build resumes from whatever was already stored. Failed extractions are
+    counted per chunk, so one that keeps failing is eventually given up on
+    instead of forcing a rebuild on every start. Shared by every book.
+    """
+    def __init__(self, path=None):
+        self.path = path or Config.KG_EXTRACTION_CACHE_PATH
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("PRAGMA journal_mode=WAL") # Other builds can read while one writes
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS extractions "
+                "(key TEXT PRIMARY KEY, triples TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS failures "
+                "(key TEXT PRIMARY KEY, attempts INTEGER NOT NULL, error TEXT, updated_at REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def key(text, prompt_version):
+        digest = hashlib.sha256(f"{prompt_version}\0{Config.LLM_MODEL}\0".encode('utf-8'))
+        digest.update(text.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get_many(self, keys):
+        """{key: triples} for the keys that are stored."""
+        found = {}
+        keys = list(dict.fromkeys(keys))
+        with sqlite3.connect(self.path) as conn:
+            for i in range(0, len(keys), 500): # Stay under SQLite's bound-parameter limit
+                part = keys[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT key, triples FROM extractions WHERE key IN ({','.join('?' * len(part))})", part
+                )
+                found.update((key, json.loads(triples)) for key, triples in rows)
+        return found
+
+    def put_many(self, items):
+        """Stores (key, triples) pairs; committed before returning."""
+        now = time.time()
+        with sqlite3.connect(self.path) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO extractions VALUES (?, ?, ?)",
+                [(key, json.dumps(triples), now) for key, triples in items]
+            )
+
+    def record_failures(self, keys, error, max_attempts=None):
+        """
+        Counts a failed extraction of each key. Keys that have now failed
+        max_attempts times are stored with no triples; returns those keys.
+        """
+        max_attempts = max_attempts or Config.KG_EXTRACTION_MAX_ATTEMPTS
+        now = time.time()
+        keys = list(dict.fromkeys(keys))
+        with sqlite3.connect(self.path) as conn:
+            conn.executemany(
+                "INSERT INTO failures VALUES (?, 1, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET attempts = attempts + 1, error = excluded.error, "
+                "updated_at = excluded.updated_at",
+                [(key, error, now) for key in keys]
+            )
+            given_up = [
+                key for key in keys
+                if conn.execute("SELECT attempts FROM failures WHERE key = ?", (key,)).fetchone()[0] >= max_attempts
+            ]
+            conn.executemany("INSERT OR REPLACE INTO extractions VALUES (?, '[]', ?)", [(key, now) for key in given_up])
+        return given_up
+
+    def __len__(self):
+        with sqlite3.connect(self.path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
@@ -0,0 +1,91 @@
+import json
+import random
+import re
+import threading
+import time
+
+
+class FakeRateLimitError(Exception):
+    """Mimics the 429 RESOURCE_EXHAUSTED error returned by the Gemini API."""
+    code = 429
+
+    def __init__(self, message="429 RESOURCE_EXHAUSTED (fake)"):
+        super().__init__(message)
+
+
+class FakeServerError(Exception):
+    """Mimics a 503 UNAVAILABLE error; not retried."""
+    code = 503
+
+    def __init__(self, message="503 UNAVAILABLE (fake)"):
+        super().__init__(message)
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class _FakeModels:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def generate_content(self, model, contents, config=None):
+        return self.owner._generate(contents)
+
+    def generate_content_stream(self, model, contents, config=None):
+        text = self.owner._generate(contents).text
+        for word in re.findall(r"\S+\s*", text):
+            yield FakeResponse(word)
+
+
+class FakeLLMClient:
+    """
+    Offline stand-in for genai.Client.
+    Answers deterministically after `latency` seconds and can inject rate-limit
+    errors, server errors (error_prob) and a slow tail: slow_prob of the calls
+    take slow_latency seconds instead.
+    """
+    def __init__(self, latency=0.0, jitter=0.0, rate_limit_prob=0.0, seed=0,
+                 error_prob=0.0, slow_prob=0.0, slow_latency=1.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_prob = rate_limit_prob
+        self.error_prob = error_prob
+        self.slow_prob = slow_prob
+        self.slow_latency = slow_latency
+        self.models = _FakeModels(self)
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _generate(self, contents):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            if self._random.random() < self.slow_prob:
+                delay = self.slow_latency
+            rate_limited = self._random.random() < self.rate_limit_prob
+            failed = self._random.random() < self.error_prob
+
+        time.sleep(delay)
+        if rate_limited:
+            raise FakeRateLimitError()
+        if failed:
+            raise FakeServerError()
+
+        prompt = contents if isinstance(contents, str) else str(contents[0])
+        if "knowledge graph triples" in prompt:
+            return FakeResponse(json.dumps(self._fake_triples(prompt)))
+        return FakeResponse(f"Fake answer for: {prompt.strip()[:80]}")
+
+    def _fake_triples(self, prompt):
+        """Links consecutive capitalised terms in each CHUNK block of the prompt."""
+        triples = []
+        blocks = re.split(r"CHUNK (\d+):", prompt)
+        for i in range(1, len(blocks) - 1, 2):
+            chunk_id = int(blocks[i])
+            terms = re.findall(r"\b[A-Z][a-z]{3,}\b", blocks[i + 1])
+            for head, tail in list(zip(terms, terms[1:]))[:3]:
+                triples.append({"chunk": chunk_id, "head": head, "relation": "related_to", "tail": tail})
+        return triples
@@ -0,0 +1,132 @@
+import networkx as nx
+import numpy as np
+from src.config import Config
+
+
+class CompactGraph:
+    """
+    Read-only CSR view of the knowledge graph for query time.
+    Node and relation names are interned to int32 ids; each node's outgoing and
+    incoming edges are stored pre-sorted by score so expansion only reads the
+    first few entries of a row, however many edges a hub node has.
+    """
+    def __init__(self, node_names, relation_names, heads, rels, tails):
+        self.node_names = list(node_names)
+        self.relation_names = list(relation_names)
+        self.node_ids = {name: i for i, name in enumerate(self.node_names)}
+        self.heads = np.asarray(heads, dtype=np.int32)
+        self.rels = np.asarray(rels, dtype=np.int32)
+        self.tails = np.asarray(tails, dtype=np.int32)
+
+        n = len(self.node_names)
+        self.degree = (np.bincount(self.heads, minlength=n) + np.bincount(self.tails, minlength=n)).astype(np.int32)
+
+        weights = Config.KG_RELATION_WEIGHTS
+        self.relation_weight = np.array(
+            [weights.get(r, 1.0) for r in self.relation_names], dtype=np.float32
+        )
+
+        # Score an edge by its relation weight and how connected the far endpoint is
+        rel_w = self.relation_weight[self.rels] if len(self.rels) else np.zeros(0, dtype=np.float32)
+        self.edge_score_out = (rel_w * np.log1p(self.degree[self.tails])).astype(np.float32)
+        self.edge_score_in = (rel_w * np.log1p(self.degree[self.heads])).astype(np.float32)
+        self.out_indptr, self.out_edges = self._csr(self.heads, self.edge_score_out, n)
+        self.in_indptr, self.in_edges = self._csr(self.tails, self.edge_score_in, n)
+
+    @staticmethod
+    def _csr(rows, scores, n):
+        """Returns (indptr, edge ids) grouped by row, best-scored edges first."""
+        order = np.lexsort((-scores, rows)).astype(np.int32)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+        return indptr, order
+
+    @classmethod
+    def from_networkx(cls, graph):
+        node_names = list(graph.nodes)
+        node_ids = {name: i for i, name in enumerate(node_names)}
+        relation_ids = {}
+        heads, rels, tails = [], [], []
+        for head, tail, data in graph.edges(data=True):
+            relation = data.get('relation', 'related_to')
+            heads.append(node_ids[head])
+            rels.append(relation_ids.setdefault(relation, len(relation_ids)))
+            tails.append(node_ids[tail])
+        return cls(node_names, list(relation_ids), heads, rels, tails)
+
+    def to_networkx(self):
+        graph = nx.DiGraph()
+        graph.add_nodes_from(self.node_names)
+        graph.add_edges_from(
+            (self.node_names[h], self.node_names[t], {'relation': self.relation_names[r]})
+            for h, r, t in zip(self.heads.tolist(), self.rels.tolist(), self.tails.tolist())
+        )
+        return graph
+
+    @property
+    def nbytes(self):
+        arrays = [self.heads, self.rels, self.tails, self.degree, self.edge_score_out,
+                  self.edge_score_in, self.out_indptr, self.out_edges, self.in_indptr, self.in_edges]
+        return sum(a.nbytes for a in arrays)
+
+    def expand(self, seeds, hops=1, max_edges=None):
+        """
+        Bounded k-hop expansion from seed node names.
+        Returns up to max_edges (head, relation, tail) tuples, nearer hops first,
+        then by score.
+        """
+        max_edges = max_edges or Config.KG_MAX_EDGES
+        frontier = [self.node_ids[s] for s in seeds if s in self.node_ids]
+        visited = set(frontier)
+        picked = {}  # edge id -> (hop, -score)
+
+        for hop in range(1, hops + 1):
+            candidates = []
+            for node in frontier:
+                for indptr, edges, scores, far in (
+                    (self.out_indptr, self.out_edges, self.edge_score_out, self.tails),
+                    (self.in_indptr, self.in_edges, self.edge_score_in, self.heads),
+                ):
+                    row = edges[indptr[node]:min(indptr[node + 1], indptr[node] + max_edges)]
+                    for edge in row.tolist():
+                        if edge not in picked:
+                            candidates.append((float(scores[edge]), edge, int(far[edge])))
+
+            # Keep the best edges of this hop; their far endpoints seed the next hop
+            candidates.sort(reverse=True)
+            frontier = []
+            for score, edge, far_node in candidates:
+                if len(picked) >= max_edges:
+                    break
+                if edge in picked:
+                    continue
+                picked[edge] = (hop, -score)
+                if far_node not in visited:
+                    visited.add(far_node)
+                    frontier.append(far_node)
+            if not frontier or len(picked) >= max_edges:
+                break
+
+        ranked = sorted(picked, key=picked.get)
+        return [
+            (self.node_names[self.heads[e]], self.relation_names[self.rels[e]], self.node_names[self.tails[e]])
+            for e in ranked
+        ]
+
+    @classmethod
+    def merge(cls, graphs):
+        """One CompactGraph over several partitions; nodes with the same name are joined."""
+        node_ids, relation_ids = {}, {}
+        heads, rels, tails = [], [], []
+        for graph in graphs:
+            node_map = np.array([node_ids.setdefault(n, len(node_ids)) for n in graph.node_names], dtype=np.int32)
+            rel_map = np.array([relation_ids.setdefault(r, len(relation_ids)) for r in graph.relation_names], dtype=np.int32)
+            if len(graph.heads):
+                heads.append(node_map[graph.heads])
+                rels.append(rel_map[graph.rels])
+                tails.append(node_map[graph.tails])
+        edges = np.zeros((0, 3), dtype=np.int32)
+        if heads:
+            # The same fact extracted from two books is one edge
+            edges = np.unique(np.column_stack([np.concatenate(heads), np.concatenate(rels), np.concatenate(tails)]), axis=0)
+        return cls(list(node_ids), list(relation_ids), edges[:, 0], edges[:, 1], edges[:, 2])
@@ -0,0 +1,115 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+import networkx as nx
+import numpy as np
+from src.config import Config
+
+
+class GraphVisualizer:
+    """
+    Renders the knowledge graph as PyVis HTML for the web UI.
+
+    Work is bounded by VIZ_MAX_NODES / VIZ_MAX_EDGES whatever the graph size:
+    the overview takes the top-degree nodes straight from the CompactGraph
+    arrays, and focused mode takes the k-hop neighbourhood of the concepts
+    matched in a question. Positions are computed once here, so the page
+    opens with physics off, and the HTML is cached by (graph version, focus).
+    """
+    def __init__(self, max_nodes=None, max_edges=None, cache_size=None):
+        self.max_nodes = max_nodes or Config.VIZ_MAX_NODES
+        self.max_edges = max_edges or Config.VIZ_MAX_EDGES
+        self.cache_size = cache_size or Config.VIZ_CACHE_SIZE
+        self._cache = OrderedDict() # (version, seeds, hops) -> rendered dict
+        self._lock = threading.Lock()
+
+    def render(self, kg, question=None, hops=1):
+        """
+        HTML for the overview (question=None) or for the neighbourhood of the
+        concepts matched in question. Returns a dict with "html", "nodes",
+        "edges", "seeds", "bytes", "seconds" and whether it was "cached".
+        """
+        start = time.perf_counter()
+        seeds = ()
+        if question:
+            seeds = tuple(kg.get_matcher().match(question, limit=Config.KG_MAX_MATCHES))
+            if not seeds:
+                return {"html": None, "nodes": 0, "edges": 0, "seeds": seeds, "bytes": 0,
+                        "seconds": time.perf_counter() - start, "cached": False}
+
+        key = (kg.version, seeds, hops if seeds else 0)
+        with self._lock:
+            rendered = self._cache.get(key)
+            if rendered is not None:
+                self._cache.move_to_end(key)
+        if rendered is None:
+            compact = kg.get_compact_graph()
+            edges = self._focus_edges(compact, seeds, hops) if seeds else self._overview_edges(compact)
+            rendered = self._to_html(edges, set(seeds), compact)
+            with self._lock:
+                self._cache[key] = rendered
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            return dict(rendered, seeds=seeds, seconds=time.perf_counter() - start, cached=False)
+        return dict(rendered, seeds=seeds, seconds=time.perf_counter() - start, cached=True)
+
+    def _overview_edges(self, compact):
+        """Edges among the top-degree nodes, best-scored first."""
+        n = len(compact.node_names)
+        if n > self.max_nodes:
+            top = np.argpartition(-compact.degree, self.max_nodes - 1)[:self.max_nodes]
+        else:
+            top = np.arange(n)
+        keep = np.zeros(n, dtype=bool)
+        keep[top] = True
+
+        edge_ids = np.flatnonzero(keep[compact.heads] & keep[compact.tails])
+        if len(edge_ids) > self.max_edges:
+            best = np.argpartition(-compact.edge_score_out[edge_ids], self.max_edges - 1)[:self.max_edges]
+            edge_ids = edge_ids[best]
+        edges = [
+            (compact.node_names[h], compact.relation_names[r], compact.node_names[t])
+            for h, r, t in zip(compact.heads[edge_ids].tolist(), compact.rels[edge_ids].tolist(),
+                               compact.tails[edge_ids].tolist())
+        ]
+        # Keep well-connected nodes that have no edge inside the top set
+        linked = {name for head, _, tail in edges for name in (head, tail)}
+        isolated = [compact.node_names[i] for i in top.tolist() if compact.node_names[i] not in linked]
+        return edges + [(name, None, None) for name in isolated]
+
+    def _focus_edges(self, compact, seeds, hops):
+        # Expansion is a tree-like walk, so capping edges at max_nodes also bounds the node count
+        edges = compact.expand(seeds, hops=hops, max_edges=min(self.max_edges, self.max_nodes))
+        linked = {name for head, _, tail in edges for name in (head, tail)}
+        return edges + [(seed, None, None) for seed in seeds if seed not in linked]
+
+    def _to_html(self, edges, seeds, compact):
+        """Lays the subgraph out once and renders it with physics off."""
+        from pyvis.network import Network
+
+        graph = nx.Graph()
+        for head, relation, tail in edges:
+            graph.add_node(head)
+            if tail is not None:
+                graph.add_edge(head, tail)
+        # Small graph by construction, so a fixed-seed spring layout is cheap and stable between renders
+        scale = 60 * math.sqrt(max(graph.number_of_nodes(), 1))
+        positions = nx.spring_layout(graph, seed=0, scale=scale) if graph.number_of_nodes() else {}
+
+        net = Network(height="600px", width="100%", bgcolor="#222222", font_color="white",
+                      directed=True, cdn_resources="remote")
+        for name, (x, y) in positions.items():
+            degree = int(compact.degree[compact.node_ids[name]]) if name in compact.node_ids else 1
+            net.add_node(name, label=name, x=float(x), y=float(y), physics=False,
+                         size=10 + 4 * math.log1p(degree), color="#ffb000" if name in seeds else "#5fa8d3")
+        links = [(head, relation, tail) for head, relation, tail in edges if tail is not None]
+        for head, relation, tail in links:
+            # Focused views are small enough to label every edge; the overview shows relations on hover
+            labels = {"label": relation} if seeds else {}
+            net.add_edge(head, tail, title=relation, **labels)
+        net.toggle_physics(False)
+
+        html = net.generate_html()
+        return {"html": html, "nodes": graph.number_of_nodes(), "edges": len(links),
+                "bytes": len(html.encode('utf-8'))}
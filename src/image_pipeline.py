@@ -0,0 +1,118 @@
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from PIL import Image, ImageOps
+from src.config import Config
+
+CAPTION_PROMPT = """
+You are labelling a diagram or photo from a 10th Standard Science question.
+Return ONLY a JSON object:
+{"caption": "one sentence saying what the image shows", "labels": ["labelled part or key concept", ...]}
+Use at most 8 labels, copied from the image where it has text labels.
+"""
+
+
+class ImagePipeline:
+    """
+    Prepares uploaded images for Gemini and caches what we learn about them.
+
+    prepare() downsizes to IMAGE_MAX_SIDE and re-encodes as JPEG, so a 4000px
+    phone photo goes out as a few hundred KB. The JPEG's sha256 is the image's
+    identity: artifacts() keeps its caption and labels in
+    IMAGE_CACHE_DIR/<hash>.json, so follow-up questions (and re-uploads) reuse
+    them instead of asking Gemini again.
+    """
+    def __init__(self, cache_dir=None, max_side=None, quality=None, keep=32):
+        self.cache_dir = cache_dir or Config.IMAGE_CACHE_DIR
+        self.max_side = max_side or Config.IMAGE_MAX_SIDE
+        self.quality = quality or Config.IMAGE_JPEG_QUALITY
+        self.keep = keep
+        self._prepared = OrderedDict() # Source digest -> prepared image, for follow-up questions
+        self._lock = threading.Lock()
+
+    def prepare(self, image):
+        """
+        Accepts a PIL image or the uploaded file's bytes. Returns a dict with the
+        JPEG "data", its "hash", pixel "size", "bytes_in" (None for a PIL image),
+        "bytes_out" and the "seconds" it took.
+        """
+        start = time.perf_counter()
+        raw = bytes(image) if isinstance(image, (bytes, bytearray)) else None
+        source_key = hashlib.sha256(raw if raw is not None else image.tobytes()).hexdigest()
+        with self._lock:
+            prepared = self._prepared.get(source_key)
+            if prepared is not None:
+                self._prepared.move_to_end(source_key)
+        if prepared is None:
+            prepared = self._encode(raw, image)
+            with self._lock:
+                self._prepared[source_key] = prepared
+                while len(self._prepared) > self.keep:
+                    self._prepared.popitem(last=False)
+        return dict(prepared, seconds=time.perf_counter() - start)
+
+    def _encode(self, raw, image):
+        if raw is not None:
+            image = Image.open(io.BytesIO(raw))
+        if raw is not None and image.format == "JPEG" and max(image.size) <= self.max_side:
+            # Already small enough (e.g. prepared by a service client); don't re-encode
+            data = raw
+        else:
+            image = ImageOps.exif_transpose(image) # Phone photos store rotation in EXIF
+            if image.mode in ("RGBA", "LA", "P"):
+                # Flatten transparency onto white so line diagrams stay legible
+                image = image.convert("RGBA")
+                background = Image.new("RGB", image.size, "white")
+                background.paste(image, mask=image.getchannel("A"))
+                image = background
+            image = image.convert("RGB")
+            image.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=self.quality, optimize=True)
+            data = buffer.getvalue()
+        return {
+            "data": data,
+            "mime_type": "image/jpeg",
+            "hash": hashlib.sha256(data).hexdigest(),
+            "size": image.size,
+            "bytes_in": len(raw) if raw is not None else None,
+            "bytes_out": len(data),
+        }
+
+    @staticmethod
+    def to_part(prepared):
+        """The prepared image as a Gemini content part."""
+        from google.genai import types
+        return types.Part.from_bytes(data=prepared["data"], mime_type=prepared["mime_type"])
+
+    def artifacts(self, prepared, generate=None):
+        """
+        Caption and labels for a prepared image: read from the cache, or derived
+        once with generate(contents) -> text and saved. {} if neither is possible.
+        """
+        path = os.path.join(self.cache_dir, prepared["hash"] + ".json")
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return dict(json.load(f), cached=True)
+        if generate is None:
+            return {}
+
+        text = generate([CAPTION_PROMPT, self.to_part(prepared)])
+        try:
+            parsed = json.loads(re.sub(r"^```(?:json)?|```$", "", text.strip()).strip())
+            artifacts = {"caption": str(parsed.get("caption", "")), "labels": [str(l) for l in parsed.get("labels", [])][:8]}
+        except (ValueError, AttributeError):
+            artifacts = {"caption": text.strip()[:300], "labels": []}
+        artifacts.update(width=prepared["size"][0], height=prepared["size"][1], bytes=prepared["bytes_out"])
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(artifacts, f, indent=2)
+        os.replace(tmp, path)
+        return dict(artifacts, cached=False)
@@ -1,31 +1,149 @@
 import fitz  # PyMuPDF
+import multiprocessing
+import os
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from src.config import Config
 
+# Each worker process keeps its own open handle per PDF
+_worker_docs = {}
+
+
+def split_text(text, chunk_size=None, overlap=None):
+    """Packs paragraphs into chunks of at most chunk_size characters with word-aligned overlap."""
+    chunk_size = chunk_size or Config.CHUNK_SIZE
+    overlap = Config.CHUNK_OVERLAP if overlap is None else overlap
+
+    chunks = []
+    current = []
+    length = 0
+    carried = 0  # words at the front of current that repeat the previous chunk
+
+    def flush():
+        if len(current) > carried:
+            chunks.append(" ".join(current))
+        # Carry the last few words forward so context isn't cut mid-thought
+        tail = []
+        tail_len = 0
+        for word in reversed(current):
+            if tail_len + len(word) + 1 > overlap:
+                break
+            tail.insert(0, word)
+            tail_len += len(word) + 1
+        return tail, max(tail_len - 1, 0), len(tail)
+
+    for para in text.split('\n\n'):
+        words = para.split()
+        if not words:
+            continue
+
+        # Prefer breaking at a paragraph boundary
+        para_len = len(" ".join(words))
+        if len(current) > carried and length + 1 + para_len > chunk_size:
+            current, length, carried = flush()
+
+        for word in words:
+            if current and length + 1 + len(word) > chunk_size:
+                current, length, carried = flush()
+                if current and length + 1 + len(word) > chunk_size:
+                    current, length, carried = [], 0, 0
+            length += len(word) + (1 if current else 0)
+            current.append(word)
+
+    if len(current) > carried:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def read_chapters(doc):
+    """(first page index, title) of each top-level table-of-contents entry, in page order."""
+    chapters = [(page - 1, title.strip()) for level, title, page in doc.get_toc() if level == 1 and page > 0]
+    return sorted(chapters)
+
+
+def _extract_chunks(pdf_path, start, end, chunk_size, overlap, metadata=None, chapters=()):
+    """Worker: extracts and chunks pages [start, end) of a PDF."""
+    doc = _worker_docs.get(pdf_path)
+    if doc is None:
+        doc = fitz.open(pdf_path)
+        _worker_docs[pdf_path] = doc
+
+    chapter_starts = [page for page, _ in chapters]
+    chunks = []
+    for page_num in range(start, end):
+        text = doc[page_num].get_text()
+        position = bisect_right(chapter_starts, page_num) - 1
+        chapter = chapters[position][1] if position >= 0 else None
+        for clean_text in split_text(text, chunk_size, overlap):
+            if len(clean_text) > 50: # Ignore tiny headers/footers
+                chunks.append({
+                    "text": clean_text,
+                    "metadata": {
+                        "page": page_num + 1,
+                        "source": "textbook",
+                        **(metadata or {}),
+                        "chapter": chapter,
+                    }
+                })
+    return chunks
+
+
 class PDFIngestor:
-    def __init__(self):
-        self.pdf_path = Config.PDF_PATH
+    def __init__(self, pdf_path=None, metadata=None):
+        """metadata (e.g. book, subject, grade) is copied into every chunk's metadata."""
+        self.pdf_path = pdf_path or Config.PDF_PATH
+        self.metadata = metadata or {}
+        self.workers = Config.INGEST_WORKERS or os.cpu_count() or 1
+        self.pages_per_task = Config.INGEST_PAGES_PER_TASK
+
+    def iter_chunks(self):
+        """Yields chunks in page order while pages are extracted in a process pool."""
+        with fitz.open(self.pdf_path) as doc:
+            page_count = doc.page_count
+            chapters = read_chapters(doc)
+
+        step = self.pages_per_task
+        ranges = [(s, min(s + step, page_count)) for s in range(0, page_count, step)]
+        args = (Config.CHUNK_SIZE, Config.CHUNK_OVERLAP, self.metadata, chapters)
+
+        if self.workers <= 1 or len(ranges) <= 1:
+            for start, end in ranges:
+                yield from _extract_chunks(self.pdf_path, start, end, *args)
+            return
+
+        # spawn, not fork: this runs on a warm-up thread while others hold locks (torch, the LLM client)
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            # Only keep a small window of page ranges in flight so memory stays flat
+            remaining = iter(ranges)
+            pending = deque()
+            for start, end in remaining:
+                pending.append(pool.submit(_extract_chunks, self.pdf_path, start, end, *args))
+                if len(pending) >= self.workers * 2:
+                    break
+
+            while pending:
+                chunks = pending.popleft().result()
+                next_range = next(remaining, None)
+                if next_range:
+                    pending.append(pool.submit(_extract_chunks, self.pdf_path, *next_range, *args))
+                yield from chunks
+
+    def iter_batches(self, batch_size=None):
+        """Groups streamed chunks into lists of batch_size for downstream embedding."""
+        batch_size = batch_size or Config.EMBED_BATCH_SIZE
+        batch = []
+        for chunk in self.iter_chunks():
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
 
     def load_and_chunk(self):
         """Extracts text and splits into chunks."""
-        doc = fitz.open(self.pdf_path)
-        chunks = []
-        
         print("Creating chunks...")
-        for page_num, page in enumerate(doc):
-            text = page.get_text()
-            # Simple chunking by paragraphs (double newline)
-            paragraphs = text.split('\n\n')
-            
-            for para in paragraphs:
-                clean_text = para.strip()
-                if len(clean_text) > 50: # Ignore tiny headers/footers
-                    chunks.append({
-                        "text": clean_text,
-                        "metadata": {
-                            "page": page_num + 1,
-                            "source": "textbook"
-                        }
-                    })
-        
+        chunks = list(self.iter_chunks())
         print(f"Total chunks created: {len(chunks)}")
-        return chunks
\ No newline at end of file
+        return chunks
@@ -0,0 +1,125 @@
+import re
+from collections import Counter
+import numpy as np
+from src.config import Config
+
+DETERMINERS = ("the ", "a ", "an ")
+# Words whose final "s" is not a plural (besides -ss, -us and -is, which singular() keeps anyway)
+SINGULAR_S = {
+    "gas", "lens", "species", "series", "physics", "genetics", "optics", "electronics",
+    "thermodynamics", "kinetics", "mathematics", "news", "means",
+}
+
+
+def strip_determiners(name):
+    """'the atomic mass' -> 'atomic mass'."""
+    name = " ".join(re.sub(r"[^\w\s'+-]", " ", name.lower()).split())
+    for determiner in DETERMINERS:
+        if name.startswith(determiner) and len(name) > len(determiner):
+            return name[len(determiner):]
+    return name
+
+
+def singular(word):
+    """Rough English singular for the last word of an entity name."""
+    if word in SINGULAR_S or len(word) <= 3 or not word.endswith("s") or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("es") and word[:-2] in SINGULAR_S: # lenses, gases
+        return word[:-2]
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith(("ches", "shes", "xes", "zes", "sses")):
+        return word[:-2]
+    return word[:-1]
+
+
+def lexical_key(name):
+    """Names with the same key are the same entity: determiners dropped, last word singular."""
+    words = strip_determiners(name).split()
+    if not words:
+        return name
+    words[-1] = singular(words[-1])
+    return " ".join(words)
+
+
+def canonicalize(triples, embed=None, threshold=None):
+    """
+    Merges entity nodes that name the same concept and rewrites the triples.
+
+    Lexical pass: "Atomic mass", "atomic masses" and "the atomic mass" share a
+    lexical_key and become one node named by that key ("atomic mass"), the form
+    EntityMatcher finds for a singular query.
+    Embedding pass (if embed(names) -> vectors is given): each remaining name
+    joins the best-connected earlier name it is at least `threshold` cosine
+    similar to, unless an edge already links the two (they are then distinct
+    concepts). Names are compared to group leaders only, so merges never chain.
+
+    Returns (triples, {old name: canonical name}, report) where report has the
+    node and edge counts before and after (edges as the graph stores them: one
+    per head and tail) and "merged": the embedding merges as
+    [name, merged into, cosine], so they can be audited.
+    """
+    threshold = threshold or Config.KG_CANONICAL_THRESHOLD
+    triples = [tuple(t) for t in triples]
+    names = Counter(name for head, _, tail in triples for name in (head, tail))
+    before = {"nodes": len(names), "edges": len({(head, tail) for head, _, tail in triples})}
+
+    # 1. Lexical groups
+    mapping = {name: lexical_key(name) for name in names}
+    keys = set(mapping.values())
+
+    # 2. Embedding near-duplicates among the lexical groups
+    embedding_merges = []
+    if embed is not None and threshold and len(keys) > 1:
+        import faiss # Only builds need it; the quiz bank uses lexical_key at query time
+        canon = sorted(set(mapping.values()))
+        degree = Counter()
+        linked = set()
+        for head, _, tail in triples:
+            h, t = mapping[head], mapping[tail]
+            degree[h] += 1
+            degree[t] += 1
+            linked.add((h, t))
+            linked.add((t, h))
+
+        vectors = np.ascontiguousarray(embed(canon), dtype='float32')
+        faiss.normalize_L2(vectors)
+        index = faiss.IndexFlatIP(vectors.shape[1])
+        index.add(vectors)
+        lims, scores, ids = index.range_search(vectors, threshold)
+
+        # Best-connected names lead; later names can only join a leader
+        order = sorted(range(len(canon)), key=lambda i: (-degree[canon[i]], canon[i]))
+        rank = {i: r for r, i in enumerate(order)}
+        leader_of = {}
+        for i in order:
+            candidates = [
+                (scores[j], int(ids[j])) for j in range(lims[i], lims[i + 1])
+                if int(ids[j]) != i and rank[int(ids[j])] < rank[i] and leader_of.get(int(ids[j])) == int(ids[j])
+                and (canon[i], canon[int(ids[j])]) not in linked
+            ]
+            if candidates:
+                score, leader_of[i] = max(candidates)
+                embedding_merges.append([canon[i], canon[leader_of[i]], round(float(score), 3)])
+            else:
+                leader_of[i] = i
+        merged = {canon[i]: canon[leader] for i, leader in leader_of.items()}
+        mapping = {name: merged[target] for name, target in mapping.items()}
+
+    # 3. Rewrite; merging can turn an edge into a self-loop or a duplicate
+    rewritten = []
+    seen = set()
+    for head, relation, tail in triples:
+        triple = (mapping[head], relation, mapping[tail])
+        if triple[0] != triple[2] and triple not in seen:
+            seen.add(triple)
+            rewritten.append(list(triple))
+
+    after_nodes = {name for head, _, tail in rewritten for name in (head, tail)}
+    report = {
+        "nodes_before": before["nodes"], "nodes_after": len(after_nodes),
+        "edges_before": before["edges"], "edges_after": len({(head, tail) for head, _, tail in rewritten}),
+        "lexical_merges": len(names) - len(keys), "embedding_merges": len(embedding_merges),
+        "merged": embedding_merges,
+    }
+    return rewritten, mapping, report
@@ -0,0 +1,210 @@
+import json
+import os
+import pickle
+import re
+import numpy as np
+
+# Bump when the on-disk layout changes
+STORE_FORMAT_VERSION = 1
+# Data file names of stores written before meta.json named its files
+LEGACY_FILES = {"nodes": "nodes.txt", "relations": "relations.txt", "edges": "edges.i32"}
+
+
+def _clean(name):
+    """String tables are newline-delimited, so names must fit on one line."""
+    return name.replace("\r", " ").replace("\n", " ")
+
+
+class KGStore:
+    """
+    Columnar, append-only storage for the knowledge graph.
+
+    Layout of the store directory (N = generation, bumped on every rewrite):
+      nodes.N.txt      one entity name per line (string table, id = line number)
+      relations.N.txt  one relation name per line
+      edges.N.i32      raw int32 (head, relation, tail) rows, memory-mappable
+      meta.json        the generation's file names, committed counts and byte
+                       sizes; written last, so a torn append is ignored on load
+                       and truncated on the next append
+    A rewrite goes to new files and commits by replacing meta.json, so a crash
+    leaves the previous generation intact and a loaded memmap is never truncated.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.meta_path = os.path.join(path, "meta.json")
+        self._tables = None
+        self._node_ids = None
+        self._relation_ids = None
+
+    def exists(self):
+        return os.path.exists(self.meta_path)
+
+    def _read_meta(self):
+        with open(self.meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("format") != STORE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported KG store format in {self.path}: {meta.get('format')}")
+        return meta
+
+    def _write_meta(self, meta):
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.meta_path)
+
+    def _files(self, meta):
+        """{"nodes" | "relations" | "edges": path} of the generation meta commits to."""
+        names = meta.get("files", LEGACY_FILES)
+        return {part: os.path.join(self.path, names[part]) for part in LEGACY_FILES}
+
+    def _remove_stale(self, files):
+        """Deletes data files of earlier generations; a memmap of one keeps its (unlinked) file alive."""
+        keep = {os.path.basename(path) for path in files.values()}
+        for name in os.listdir(self.path):
+            if name in keep:
+                continue
+            if name in LEGACY_FILES.values() or re.fullmatch(r"(nodes|relations)\.\d+\.txt|edges\.\d+\.i32", name):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass # Still open elsewhere (Windows); the next rewrite tries again
+
+    def _read_strings(self, path, count, size):
+        with open(path, 'rb') as f:
+            data = f.read(size)
+        return data.decode('utf-8').split("\n")[:count] if count else []
+
+    def load(self):
+        """Returns (node_names, relation_names, edges) with edges as an (n, 3) int32 array."""
+        meta = self._read_meta()
+        files = self._files(meta)
+        nodes = self._read_strings(files["nodes"], meta["nodes"], meta["nodes_bytes"])
+        relations = self._read_strings(files["relations"], meta["relations"], meta["relations_bytes"])
+
+        if meta["edges"]:
+            edges = np.memmap(files["edges"], dtype=np.int32, mode='r', shape=(meta["edges"], 3))
+        else:
+            edges = np.zeros((0, 3), dtype=np.int32)
+
+        # Appends may repeat a (head, tail) pair; like DiGraph.add_edge, the last one wins
+        if not meta.get("compacted", True):
+            keys = edges[:, 0].astype(np.int64) * len(nodes) + edges[:, 2]
+            _, last = np.unique(keys[::-1], return_index=True)
+            edges = np.asarray(edges)[np.sort(len(keys) - 1 - last)]
+
+        # Interning dicts are only built if this instance is later used to append
+        self._tables = (nodes, relations)
+        self._node_ids = None
+        self._relation_ids = None
+        return nodes, relations, edges
+
+    def write(self, node_names, relation_names, edges):
+        """Rewrites the whole store from string tables and an (n, 3) edge array, as a new generation."""
+        os.makedirs(self.path, exist_ok=True)
+        node_names = [_clean(n) for n in node_names]
+        relation_names = [_clean(r) for r in relation_names]
+        edges = np.ascontiguousarray(edges, dtype=np.int32).reshape(-1, 3)
+        try:
+            generation = self._read_meta().get("generation", 0) + 1
+        except (OSError, ValueError):
+            generation = 1
+        names = {"nodes": f"nodes.{generation}.txt", "relations": f"relations.{generation}.txt",
+                 "edges": f"edges.{generation}.i32"}
+
+        nodes_blob = "".join(n + "\n" for n in node_names).encode('utf-8')
+        relations_blob = "".join(r + "\n" for r in relation_names).encode('utf-8')
+        files = self._files({"files": names})
+        for part, blob in (("nodes", nodes_blob), ("relations", relations_blob), ("edges", edges.tobytes())):
+            with open(files[part], 'wb') as f:
+                f.write(blob)
+                f.flush()
+                os.fsync(f.fileno())
+
+        # The commit point: until meta.json names the new files, loads read the previous generation
+        self._write_meta({
+            "format": STORE_FORMAT_VERSION,
+            "nodes": len(node_names),
+            "nodes_bytes": len(nodes_blob),
+            "relations": len(relation_names),
+            "relations_bytes": len(relations_blob),
+            "edges": len(edges),
+            "compacted": True,
+            "generation": generation,
+            "files": names,
+        })
+        self._remove_stale(files)
+        self._node_ids = {name: i for i, name in enumerate(node_names)}
+        self._relation_ids = {name: i for i, name in enumerate(relation_names)}
+
+    def write_graph(self, graph):
+        """Rewrites the store from a NetworkX DiGraph."""
+        node_names = list(graph.nodes)
+        node_ids = {name: i for i, name in enumerate(node_names)}
+        relation_ids = {}
+        edges = [
+            (node_ids[h], relation_ids.setdefault(d.get('relation', 'related_to'), len(relation_ids)), node_ids[t])
+            for h, t, d in graph.edges(data=True)
+        ]
+        self.write(node_names, list(relation_ids), np.array(edges, dtype=np.int32).reshape(-1, 3))
+
+    def append(self, triples):
+        """Appends (head, relation, tail) triples without rewriting existing data."""
+        if not self.exists():
+            self.write([], [], np.zeros((0, 3), dtype=np.int32))
+        meta = self._read_meta()
+        if self._node_ids is None:
+            nodes, relations = self._tables or self.load()[:2]
+            self._node_ids = {name: i for i, name in enumerate(nodes)}
+            self._relation_ids = {name: i for i, name in enumerate(relations)}
+
+        new_nodes, new_relations, rows = [], [], []
+        for head, relation, tail in triples:
+            ids = []
+            for name, table, new in ((head, self._node_ids, new_nodes),
+                                     (relation, self._relation_ids, new_relations),
+                                     (tail, self._node_ids, new_nodes)):
+                name = _clean(name)
+                if name not in table:
+                    table[name] = len(table)
+                    new.append(name)
+                ids.append(table[name])
+            rows.append(ids)
+        if not rows:
+            return
+
+        nodes_blob = "".join(n + "\n" for n in new_nodes).encode('utf-8')
+        relations_blob = "".join(r + "\n" for r in new_relations).encode('utf-8')
+        files = self._files(meta)
+        self._append_bytes(files["nodes"], meta["nodes_bytes"], nodes_blob)
+        self._append_bytes(files["relations"], meta["relations_bytes"], relations_blob)
+        self._append_bytes(files["edges"], meta["edges"] * 12, np.array(rows, dtype=np.int32).tobytes())
+
+        meta.update({
+            "nodes": meta["nodes"] + len(new_nodes),
+            "nodes_bytes": meta["nodes_bytes"] + len(nodes_blob),
+            "relations": meta["relations"] + len(new_relations),
+            "relations_bytes": meta["relations_bytes"] + len(relations_blob),
+            "edges": meta["edges"] + len(rows),
+            "compacted": False,
+        })
+        self._write_meta(meta)
+
+    @staticmethod
+    def _append_bytes(path, committed, blob):
+        """
+        Drops anything past the committed size (a torn append), then appends.
+        Memmaps only cover committed rows, so the truncation never cuts one short.
+        """
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+            f.truncate(committed)
+            f.seek(committed)
+            f.write(blob)
+
+    def migrate_pickle(self, pkl_path):
+        """One-time import of a legacy pickled NetworkX graph. Only use on trusted files."""
+        with open(pkl_path, 'rb') as f:
+            graph = pickle.load(f)
+        self.write_graph(graph)
+        return graph
@@ -1,115 +1,272 @@
 import networkx as nx
-import pickle
 import os
 import json
 import re
-from google import genai
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from google.genai import types
 from src.config import Config
+from src.llm_gateway import LLMGateway
+from src.entity_index import EntityMatcher
+from src.graph_index import CompactGraph
+from src.kg_store import KGStore
+from src.kg_canonical import canonicalize
+from src.extraction_cache import ExtractionCache
+from src.context_builder import format_edge
+
+# Bump when the extraction prompt changes so cached extractions are not reused
+PROMPT_VERSION = 2
+
+
+def build_matcher(compact):
+    """Entity matcher over a CompactGraph's nodes, preferring well-connected ones."""
+    weights = dict(zip(compact.node_names, compact.degree.tolist()))
+    return EntityMatcher(compact.node_names, weights=weights)
+
 
 class SimpleKnowledgeGraph:
-    def __init__(self):
-        self.graph = nx.DiGraph()
-        self.client = genai.Client(api_key=Config.GEMINI_API_KEY)
-        self.graph_path = Config.KG_PATH  # e.g., "data/knowledge_graph.pkl"
+    def __init__(self, client=None, graph_path=None, embedder=None, llm=None):
+        """
+        llm is the engine's LLMGateway; without one, a gateway is made around
+        client (default: a new Gemini client).
+        graph_path selects a per-book partition (default: the single textbook's).
+        embedder (an src.embeddings.Embedder) is reused to canonicalize entity names.
+        """
+        self._graph = nx.DiGraph()
+        self.llm = llm or LLMGateway(client)
+        self.graph_path = graph_path or Config.KG_PATH  # e.g., "data/knowledge_graph" (columnar store)
+        # Only the default store migrates the old single-file pickle
+        self.legacy_path = Config.KG_LEGACY_PATH if graph_path is None else None
+        self.store = KGStore(self.graph_path)
+        self.extraction_cache = None # Opened on the first build
+        self.embedder = embedder
+        self.canonical_report = None # Counts before and after the last canonicalize(), and its embedding merges
+        self.max_workers = Config.KG_MAX_CONCURRENCY
+        self.chunks_per_prompt = Config.KG_CHUNKS_PER_PROMPT
+
+        # Bumped on every change so query-time indexes know to rebuild
+        self.version = 0
+        self._matcher = None
+        self._compact = None
+        self._index_version = -1
+
+    @property
+    def graph(self):
+        """NetworkX view for building and visualisation, materialised on first use."""
+        if self._graph is None:
+            self._graph = self._compact.to_networkx()
+        return self._graph
+
+    @graph.setter
+    def graph(self, value):
+        self._graph = value
+        self.version += 1
+
+    def num_nodes(self):
+        """Node count without materialising the NetworkX graph."""
+        if self._graph is None:
+            return len(self._compact.node_names)
+        return self._graph.number_of_nodes()
 
     def load_graph(self):
         """Loads existing graph if available to save time/cost."""
-        if os.path.exists(self.graph_path):
+        if not self.store.exists() and self.legacy_path and os.path.exists(self.legacy_path):
+            print(f"Migrating pickled Knowledge Graph {self.legacy_path} to {self.graph_path}...")
+            self.store.migrate_pickle(self.legacy_path)
+
+        if self.store.exists():
             print(f"Loading existing Knowledge Graph from {self.graph_path}...")
-            with open(self.graph_path, 'rb') as f:
-                self.graph = pickle.load(f)
+            nodes, relations, edges = self.store.load()
+            # Serve straight from the arrays; NetworkX is only built if something asks for it
+            self._compact = CompactGraph(nodes, relations, edges[:, 0], edges[:, 1], edges[:, 2])
+            self._graph = None
+            self.version += 1
+            self._matcher = build_matcher(self._compact)
+            self._index_version = self.version
             return True
         return False
 
     def save_graph(self):
         """Saves the graph to disk."""
-        with open(self.graph_path, 'wb') as f:
-            pickle.dump(self.graph, f)
+        self.store.write_graph(self.graph)
         print(f"Knowledge Graph saved to {self.graph_path}")
 
+    def add_triples(self, triples):
+        """Adds (head, relation, tail) triples and appends them to the store without a rewrite."""
+        for head, relation, tail in triples:
+            self._add_triple(head, relation, tail)
+        self.store.append(triples)
+
     def build_graph(self, chunks):
         """
         Builds the graph dynamically using Gemini.
+        Extractions are cached per chunk text (see ExtractionCache), so only new
+        or changed chunks are sent, in concurrent batches; an interrupted build
+        resumes from the cache. A chunk whose batch fails is retried on the next
+        start, up to KG_EXTRACTION_MAX_ATTEMPTS builds, then kept with no
+        triples so the graph can be saved. Entity names are canonicalized before saving.
         """
         # 1. Try to load existing graph first
         if self.load_graph():
-            print(f"Graph loaded with {self.graph.number_of_nodes()} nodes.")
+            print(f"Graph loaded with {self.num_nodes()} nodes.")
             return
 
         print("Building Knowledge Graph dynamically (This takes time)...")
-        
-        # Limit chunks for testing to save time/tokens (Remove [:5] for full book)
-        # We process every chunk to extract real relationships.
-        total_chunks = len(chunks)
-        
-        for i, chunk in enumerate(chunks):
-            self._extract_and_add_relations(chunk['text'])
-            print(f"Processed chunk {i+1}/{total_chunks} for KG...")
 
-        self.save_graph()
+        # 2. Reuse extractions of unchanged chunks (identical texts are extracted once)
+        if self.extraction_cache is None:
+            self.extraction_cache = ExtractionCache()
+        keys = [ExtractionCache.key(c['text'], PROMPT_VERSION) for c in chunks]
+        extracted = self.extraction_cache.get_many(keys)
+        todo, queued = [], set()
+        for i, key in enumerate(keys):
+            if key not in extracted and key not in queued:
+                queued.add(key)
+                todo.append(i)
+        print(f"KG extraction: {len(chunks) - len(todo)}/{len(chunks)} chunks cached, {len(todo)} to extract.")
+
+        # 3. Pack several uncached chunks into each prompt and extract them concurrently
+        size = self.chunks_per_prompt
+        batches = [todo[i:i + size] for i in range(0, len(todo), size)]
+        failed = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {
+                pool.submit(self._extract_relations, [chunks[i]['text'] for i in batch]): batch
+                for batch in batches
+            }
+            for n, future in enumerate(as_completed(futures), start=1):
+                try:
+                    per_chunk = future.result()
+                except Exception as e:
+                    batch = futures[future]
+                    print(f"⚠️ KG batch of chunks {batch[0]}-{batch[-1]} failed: {e}")
+                    # The gateway has used up its retries; count the failure across starts
+                    given_up = self.extraction_cache.record_failures([keys[i] for i in batch], str(e))
+                    extracted.update((key, []) for key in given_up)
+                    failed += len(batch) - len(given_up)
+                    if given_up:
+                        print(f"⚠️ Giving up on {len(given_up)} chunk(s) after "
+                              f"{Config.KG_EXTRACTION_MAX_ATTEMPTS} failed builds; kept with no triples.")
+                    continue
+
+                items = [(keys[i], triples) for i, triples in zip(futures[future], per_chunk)]
+                self.extraction_cache.put_many(items)
+                extracted.update(items)
+                print(f"Processed batch {n}/{len(batches)} for KG...")
+
+        # 4. Assemble in chunk order and merge alias / plural entities
+        for key in keys:
+            for head, relation, tail in extracted.get(key, ()):
+                self._add_triple(head, relation, tail)
+        self.canonicalize()
+
+        if failed:
+            # Not saved, so the next start rebuilds; only the failed chunks reach Gemini again
+            print(f"⚠️ {failed} KG chunks failed; restart to retry them.")
+        else:
+            self.save_graph()
         print(f"Graph built with {self.graph.number_of_nodes()} nodes.")
 
-    def _extract_and_add_relations(self, text):
-        """Uses Gemini to extract triples (Subject, Predicate, Object)."""
-        
+    def canonicalize(self):
+        """Merges alias and plural entity nodes in the current graph; returns the before/after report."""
+        triples = [(head, data.get('relation', 'related_to'), tail) for head, tail, data in self.graph.edges(data=True)]
+        embed = self._embed_names if Config.KG_CANONICAL_THRESHOLD else None
+        triples, _, report = canonicalize(triples, embed=embed)
+
+        self.graph = nx.DiGraph()
+        for head, relation, tail in triples:
+            self._add_triple(head, relation, tail)
+        self.canonical_report = report
+        nodes_cut = 1 - report["nodes_after"] / report["nodes_before"] if report["nodes_before"] else 0.0
+        print(f"🧹 Canonicalized entities: {report['nodes_before']} -> {report['nodes_after']} nodes "
+              f"(-{nodes_cut:.0%}), {report['edges_before']} -> {report['edges_after']} edges "
+              f"({report['lexical_merges']} lexical, {report['embedding_merges']} embedding merges)")
+        for name, target, score in report["merged"]:
+            print(f"   🔗 '{name}' merged into '{target}' (cosine {score:.3f})")
+        return report
+
+    def _embed_names(self, names):
+        if self.embedder is None:
+            from src.embeddings import Embedder
+            self.embedder = Embedder()
+        return self.embedder.encode_queries(names)
+
+    def _add_triple(self, head, relation, tail):
+        self.graph.add_edge(head, tail, relation=relation)
+        self.version += 1
+
+    def _refresh_indexes(self):
+        """Rebuilds the query-time indexes if the graph changed since the last build."""
+        if self._index_version != self.version:
+            self._compact = CompactGraph.from_networkx(self.graph)
+            self._matcher = build_matcher(self._compact)
+            self._index_version = self.version
+
+    def get_matcher(self):
+        """Returns the entity matcher for the current graph."""
+        self._refresh_indexes()
+        return self._matcher
+
+    def get_compact_graph(self):
+        """Returns the CSR view of the current graph."""
+        self._refresh_indexes()
+        return self._compact
+
+    def _generate_json(self, prompt):
+        """Calls Gemini for a JSON answer; the gateway retries rate limits. Not hedged: builds are not latency-bound."""
+        return self.llm.generate(
+            prompt,
+            config=types.GenerateContentConfig(response_mime_type="application/json"),
+            kind="kg_extract",
+            hedge=False,
+        )
+
+    def _extract_relations(self, texts):
+        """Uses Gemini to extract triples (Subject, Predicate, Object) from a batch of chunks, as one list per chunk."""
+        blocks = "\n\n".join(f"CHUNK {i}:\n{text[:1000]}" for i, text in enumerate(texts))
+
         prompt = f"""
-        Analyze the following scientific text and extract knowledge graph triples.
+        Analyze the following scientific text chunks and extract knowledge graph triples.
         Return ONLY a JSON list of objects.
-        Format: [{{"head": "entity1", "relation": "relationship", "tail": "entity2"}}]
+        Format: [{{"chunk": 0, "head": "entity1", "relation": "relationship", "tail": "entity2"}}]
         
         Rules:
         1. Entities should be simple concepts (e.g., "Dobereiner", "Triads", "Atomic Mass").
         2. Relations should be verbs or prepositions (e.g., "proposed", "related_to", "depends_on").
-        3. Extract maximum 3 key relationships.
+        3. Extract maximum 3 key relationships per chunk, and set "chunk" to the chunk number.
         4. If no relationships found, return [].
         
-        TEXT:
-        {text[:1000]} 
+        {blocks}
         """
 
-        try:
-            response = self.client.models.generate_content(
-                model=Config.LLM_MODEL,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json"
-                )
-            )
-            
-            # Parse JSON response
-            triples = json.loads(response.text)
-            
-            for item in triples:
-                head = item.get('head', '').lower().strip()
-                tail = item.get('tail', '').lower().strip()
-                relation = item.get('relation', '').lower().strip()
-                
-                if head and tail and relation:
-                    self.graph.add_edge(head, tail, relation=relation)
-                    
-        except Exception as e:
-            # Silently fail on bad chunks to keep the pipeline moving
-            pass
-
-    def get_related_concepts(self, query):
-        """Finds concepts in query and returns neighbors (1-hop)."""
-        query = query.lower()
-        related_info = []
-        
-        # Find partial matches in the graph nodes
-        found_nodes = [node for node in self.graph.nodes if node in query or query in node]
-        
-        # Limit to top 3 matches to avoid noise
-        for node in found_nodes[:3]:
-            # Get outgoing edges (what does this node do?)
-            for neighbor in self.graph.successors(node):
-                relation = self.graph[node][neighbor].get('relation', 'related_to')
-                related_info.append(f"{node} --[{relation}]--> {neighbor}")
-            
-            # Get incoming edges (what affects this node?)
-            for predecessor in self.graph.predecessors(node):
-                relation = self.graph[predecessor][node].get('relation', 'related_to')
-                related_info.append(f"{predecessor} --[{relation}]--> {node}")
-
-        return list(set(related_info)) # Remove duplicates
\ No newline at end of file
+        response = self._generate_json(prompt)
+
+        # Parse JSON response into one triple list per chunk
+        per_chunk = [[] for _ in texts]
+        items = json.loads(response)
+        if not isinstance(items, list):
+            items = [] # e.g. {"triples": [...]}: not the requested shape, so no triples
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            fields = [item.get('head'), item.get('relation'), item.get('tail')]
+            if not all(isinstance(field, str) for field in fields):
+                continue # Null, numeric or list entities are skipped rather than failing the batch
+            head, relation, tail = (field.lower().strip() for field in fields)
+
+            if head and tail and relation:
+                chunk = item.get('chunk')
+                # A triple without a valid chunk number is kept with the batch's first chunk
+                index = chunk if isinstance(chunk, int) and 0 <= chunk < len(texts) else 0
+                per_chunk[index].append([head, relation, tail])
+        return per_chunk
+
+    def get_related_edges(self, query, hops=1, max_edges=None):
+        """Finds concepts in query and returns their ranked k-hop neighbourhood as (head, relation, tail)."""
+        # Ranked matches from the prebuilt index (top 3 to avoid noise)
+        found_nodes = self.get_matcher().match(query, limit=Config.KG_MAX_MATCHES)
+
+        return self.get_compact_graph().expand(found_nodes, hops=hops, max_edges=max_edges)
+
+    def get_related_concepts(self, query, hops=1, max_edges=None):
+        """Same as get_related_edges, formatted as "head --[relation]--> tail" strings."""
+        return [format_edge(edge) for edge in self.get_related_edges(query, hops, max_edges)]
@@ -0,0 +1,360 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import numpy as np
+from src.config import Config
+
+
+# Shortest wait before looking for a spare hedge slot again, so a tiny threshold can't busy-spin
+HEDGE_RECHECK_SECONDS = 0.05
+
+
+class LLMTimeout(TimeoutError):
+    pass
+
+
+def is_rate_limit_error(error):
+    """True for Gemini quota / 429 errors that are worth retrying."""
+    if getattr(error, 'code', None) == 429:
+        return True
+    message = str(error)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message
+
+
+def create_client():
+    """One genai.Client per process: its HTTP connection pool is reused by every call."""
+    from google import genai
+    from google.genai import types
+    return genai.Client(
+        api_key=Config.GEMINI_API_KEY,
+        http_options=types.HttpOptions(timeout=int(Config.LLM_TIMEOUT * 1000)), # Milliseconds
+    )
+
+
+def _prompt_key(contents, config):
+    """Identity of a text-only request for coalescing; None if it has non-text parts (e.g. images)."""
+    parts = [contents] if isinstance(contents, str) else list(contents)
+    if not all(isinstance(part, str) for part in parts):
+        return None
+    digest = hashlib.sha256(Config.LLM_MODEL.encode('utf-8'))
+    digest.update(repr(config).encode('utf-8'))
+    digest.update(json.dumps(parts).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class _SharedStream:
+    """Chunks of one streamed generation, readable by every caller that asked for it."""
+    def __init__(self):
+        self.chunks = []
+        self.started = False # Set once the generation holds a slot; waiting for one is not a timeout
+        self.done = False
+        self.error = None
+        self.changed = threading.Condition()
+
+    def start(self):
+        with self.changed:
+            self.started = True
+            self.changed.notify_all()
+
+    def put(self, chunk=None, error=None, done=False):
+        with self.changed:
+            if chunk is not None:
+                self.chunks.append(chunk)
+            self.error = error or self.error
+            self.done = done or self.done
+            self.changed.notify_all()
+
+    def read(self, timeout):
+        position = 0
+        while True:
+            with self.changed:
+                self.changed.wait_for(lambda: self.started or self.done)
+                if not self.changed.wait_for(lambda: len(self.chunks) > position or self.done, timeout):
+                    raise LLMTimeout(f"no output from Gemini for {timeout:g}s")
+                chunks = self.chunks[position:]
+                finished, error = self.done, self.error
+            for chunk in chunks:
+                yield chunk
+            position += len(chunks)
+            if finished and position == len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class _Attempt:
+    """One backend request of a call: when it got its slot, and whether the caller still wants it."""
+    def __init__(self):
+        self.started = Future() # Resolves to time.monotonic() once it holds a slot
+        self.abandoned = False
+
+
+class LLMGateway:
+    """
+    The one way this process talks to Gemini, shared by the engine, the
+    knowledge-graph build and image captioning:
+      - one client (and connection pool) for every caller
+      - at most LLM_MAX_CONCURRENCY calls in flight, wherever they come from
+      - LLM_TIMEOUT per call from when it gets a slot, raised as LLMTimeout
+      - identical text prompts in flight at the same time are sent once and
+        the answer is shared (single-flight), streamed ones included
+      - exponential backoff with jitter on quota errors (LLM_MAX_RETRIES)
+      - a hedged second request when a call outlives the LLM_HEDGE_PERCENTILE
+        latency of recent calls of the same kind; the first answer wins
+        (generate() only: streams are coalesced, retried and timed out, never hedged)
+    """
+    def __init__(self, client=None, max_concurrency=None, timeout=None, metrics=None):
+        self._client = client
+        self._client_lock = threading.Lock()
+        self.timeout = timeout or Config.LLM_TIMEOUT
+        self.metrics = metrics
+        self.max_concurrency = max_concurrency or Config.LLM_MAX_CONCURRENCY
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._active = 0 # Calls holding a slot
+        # Attempts (hedges included) run here, so a caller can stop waiting on one that hangs
+        self._pool = ThreadPoolExecutor(max_workers=2 * self.max_concurrency + 4, thread_name_prefix="llm")
+        # Streams hold a thread for the whole generation, so they get their own and never queue calls behind them
+        self._stream_pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="llm-stream")
+        # Prompt key -> Future / _SharedStream; apart, as a call and a stream of one prompt can't share an answer
+        self._in_flight_calls = {}
+        self._in_flight_streams = {}
+        self._lock = threading.Lock()
+        self._latencies = {} # Kind -> recent successful call seconds
+        self._last_rate_limit = 0.0
+        self.counts = dict.fromkeys(["calls", "coalesced", "hedged", "hedge_wins", "retries", "timeouts", "errors"], 0)
+
+    @property
+    def client(self):
+        with self._client_lock:
+            if self._client is None:
+                self._client = create_client()
+            return self._client
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    # --- Non-streamed calls ---
+    def generate(self, contents, config=None, kind="answer", hedge=True):
+        """
+        The response text for contents. kind groups calls with similar latency
+        for hedging; pass hedge=False for background work such as KG extraction.
+        """
+        key = _prompt_key(contents, config)
+        if key is None:
+            return self._generate_with_retry(contents, config, kind, hedge)
+
+        with self._lock:
+            shared = self._in_flight_calls.get(key)
+            leader = shared is None
+            if leader:
+                shared = self._in_flight_calls[key] = Future()
+            else:
+                self.counts["coalesced"] += 1
+        if not leader:
+            return shared.result()
+
+        try:
+            text = self._generate_with_retry(contents, config, kind, hedge)
+            shared.set_result(text)
+            return text
+        except BaseException as e:
+            shared.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight_calls.pop(key, None)
+
+    def _generate_with_retry(self, contents, config, kind, hedge):
+        for attempt in range(Config.LLM_MAX_RETRIES + 1):
+            try:
+                return self._hedged(contents, config, kind, hedge)
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    self._count("timeouts" if isinstance(e, LLMTimeout) else "errors")
+                    raise
+                self._last_rate_limit = time.monotonic()
+                if attempt == Config.LLM_MAX_RETRIES:
+                    self._count("errors")
+                    raise
+                self._count("retries")
+                delay = Config.LLM_RETRY_BASE_DELAY * (2 ** attempt)
+                time.sleep(delay + random.uniform(0, delay))
+
+    def _hedged(self, contents, config, kind, hedge):
+        """
+        One call, plus a second one if the first is slower than usual; returns
+        the first answer. The timeout and hedge delay run from when the call
+        gets a slot, not while it queues behind others.
+        """
+        primary = _Attempt()
+        attempts = {self._pool.submit(self._call, contents, config, primary): primary}
+        pending = set(attempts)
+        hedge_after = self._hedge_delay(kind) if hedge else None
+        deadline = hedge_at = None
+        backup = None
+        error = None
+        try:
+            while pending:
+                if deadline is None and primary.started.done():
+                    start = primary.started.result()
+                    deadline = start + self.timeout
+                    hedge_at = start + hedge_after if hedge_after is not None else None
+                if deadline is None:
+                    done, pending = wait(pending | {primary.started}, return_when=FIRST_COMPLETED)
+                    pending.discard(primary.started)
+                    done.discard(primary.started)
+                else:
+                    wait_until = min(hedge_at, deadline) if hedge_at is not None else deadline
+                    done, pending = wait(pending, timeout=max(wait_until - time.monotonic(), 0),
+                                         return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        text, seconds = future.result()
+                    except Exception as e:
+                        error = e # The other attempt may still succeed
+                        continue
+                    if future is backup:
+                        self._count("hedge_wins")
+                    self._record(kind, seconds)
+                    return text
+                if deadline is None:
+                    continue
+                if time.monotonic() >= deadline:
+                    raise LLMTimeout(f"Gemini did not answer within {self.timeout:g}s")
+                if pending and hedge_at is not None and time.monotonic() >= hedge_at:
+                    # Hedges only use spare slots, and stop while Gemini is rate-limiting us
+                    quiet = time.monotonic() - self._last_rate_limit > Config.LLM_HEDGE_QUIET_SECONDS
+                    if quiet and self._active < self.max_concurrency:
+                        attempt = _Attempt()
+                        backup = self._pool.submit(self._call, contents, config, attempt)
+                        attempts[backup] = attempt
+                        pending.add(backup)
+                        self._count("hedged")
+                        hedge_at = None
+                    else:
+                        hedge_at += max(hedge_after, HEDGE_RECHECK_SECONDS) # Look again later
+            raise error
+        finally:
+            # Attempts that haven't reached Gemini yet are no longer wanted: don't send (and bill) them
+            for future, attempt in attempts.items():
+                attempt.abandoned = True
+                future.cancel()
+
+    def _call(self, contents, config, attempt):
+        """One request to the backend, holding a concurrency slot; returns (text, seconds at the backend)."""
+        self._acquire_slot()
+        try:
+            if attempt.abandoned:
+                raise LLMTimeout("the caller stopped waiting before a slot was free")
+            start = time.monotonic()
+            attempt.started.set_result(start)
+            self._count("calls")
+            text = self.client.models.generate_content(model=Config.LLM_MODEL, contents=contents, config=config).text
+            return text, time.monotonic() - start
+        finally:
+            self._release_slot()
+
+    def _acquire_slot(self):
+        if self.metrics is not None:
+            with self.metrics.span("llm_queue"):
+                self._slots.acquire()
+        else:
+            self._slots.acquire()
+        with self._lock:
+            self._active += 1
+
+    def _release_slot(self):
+        with self._lock:
+            self._active -= 1
+        self._slots.release()
+
+    def _hedge_delay(self, kind):
+        """Seconds after which to hedge a call of this kind; None until enough calls are measured."""
+        if Config.LLM_HEDGE_PERCENTILE is None:
+            return None
+        with self._lock:
+            samples = list(self._latencies.get(kind, ()))
+        if len(samples) < Config.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return float(np.percentile(samples, Config.LLM_HEDGE_PERCENTILE))
+
+    def _record(self, kind, seconds):
+        with self._lock:
+            self._latencies.setdefault(kind, deque(maxlen=Config.LLM_HEDGE_WINDOW)).append(seconds)
+
+    # --- Streamed calls ---
+    def stream(self, contents, config=None):
+        """
+        Yields the response text as it is generated. Identical text prompts
+        streaming at the same time share one generation; each caller gets
+        every chunk. Raises LLMTimeout if no chunk arrives for LLM_TIMEOUT
+        once the generation has a slot.
+        Streams are not hedged: a second generation can't take over one whose
+        chunks callers have already read, so a slow stream is only cut short by
+        that timeout.
+        """
+        key = _prompt_key(contents, config)
+        with self._lock:
+            shared = self._in_flight_streams.get(key) if key is not None else None
+            if shared is None:
+                shared = _SharedStream()
+                if key is not None:
+                    self._in_flight_streams[key] = shared
+                self._stream_pool.submit(self._produce, shared, key, contents, config)
+            else:
+                self.counts["coalesced"] += 1
+        return self._read(shared)
+
+    def _read(self, shared):
+        try:
+            yield from shared.read(self.timeout)
+        except LLMTimeout:
+            self._count("timeouts")
+            raise
+
+    def _produce(self, shared, key, contents, config):
+        try:
+            for attempt in range(Config.LLM_MAX_RETRIES + 1):
+                try:
+                    self._acquire_slot()
+                    try:
+                        shared.start()
+                        self._count("calls")
+                        stream = self.client.models.generate_content_stream(
+                            model=Config.LLM_MODEL, contents=contents, config=config
+                        )
+                        for chunk in stream:
+                            if chunk.text:
+                                shared.put(chunk.text)
+                    finally:
+                        self._release_slot()
+                    break
+                except Exception as e:
+                    # Only retried before any output, so callers never see text twice
+                    if shared.chunks or not is_rate_limit_error(e) or attempt == Config.LLM_MAX_RETRIES:
+                        self._count("errors")
+                        shared.put(error=e)
+                        break
+                    self._last_rate_limit = time.monotonic()
+                    self._count("retries")
+                    delay = Config.LLM_RETRY_BASE_DELAY * (2 ** attempt)
+                    time.sleep(delay + random.uniform(0, delay))
+        finally:
+            if key is not None:
+                with self._lock:
+                    self._in_flight_streams.pop(key, None)
+            shared.put(done=True)
+
+    def stats(self):
+        """Call counters plus the current hedge threshold (ms) per kind."""
+        with self._lock:
+            kinds = list(self._latencies)
+            report = dict(self.counts)
+        thresholds = {kind: self._hedge_delay(kind) for kind in kinds}
+        report["hedge_after_ms"] = {kind: round(t * 1000, 1) for kind, t in thresholds.items() if t is not None}
+        return report
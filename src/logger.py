@@ -1,16 +1,26 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from src.config import Config
+import atexit
 import datetime
+import json
 import os
+import queue
+import sqlite3
+import threading
+import time
 
 class GoogleSheetLogger:
+    """Sink that appends interaction rows to the "ScienceBot Logs" Google Sheet."""
     def __init__(self):
+        # Imported here so startup does not pay for them unless this sink is used
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+
         # 1. Define the scope (permissions)
         self.scope = [
             "https://spreadsheets.google.com/feeds",
             "https://www.googleapis.com/auth/drive"
         ]
-        
+
         self.creds_path = "data/credentials.json"
         self.client = None
         self.sheet = None
@@ -21,35 +31,231 @@ class GoogleSheetLogger:
             try:
                 self.creds = ServiceAccountCredentials.from_json_keyfile_name(self.creds_path, self.scope)
                 self.client = gspread.authorize(self.creds)
-                
+
                 # Open the Spreadsheet
                 # Note: You can open by title OR by URL (safer)
                 # self.sheet = self.client.open(self.SHEET_NAME).sheet1
-                
-                # Let's try opening by name first. 
+
+                # Let's try opening by name first.
                 # Ensure your Google Sheet file is named EXACTLY "ScienceBot Logs"
-                self.sheet = self.client.open(self.SHEET_NAME).sheet1 
-                
+                self.sheet = self.client.open(self.SHEET_NAME).sheet1
+
                 print("✅ Connected to Google Sheets")
             except Exception as e:
                 print(f"⚠️ Warning: Could not connect to Google Sheets. Error: {e}")
         else:
             print(f"⚠️ Warning: {self.creds_path} not found.")
 
+    @property
+    def enabled(self):
+        return self.sheet is not None
+
+    def append_rows(self, rows):
+        # One API call for the whole batch instead of one per row
+        self.sheet.append_rows(rows)
+        print(f"📝 Logged {len(rows)} rows to Sheet")
+
+
+class JsonlFileSink:
+    """Local stand-in sink: one JSON row per line."""
+    enabled = True
+
+    def __init__(self, path=None):
+        self.path = path or Config.LOG_FILE_PATH
+
+    def append_rows(self, rows):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps(row) + "\n" for row in rows)
+
+
+class SQLiteSink:
+    """Local stand-in sink backed by a SQLite table."""
+    enabled = True
+
+    def __init__(self, path=None):
+        self.path = path or Config.LOG_SQLITE_PATH
+        with sqlite3.connect(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS interactions "
+                "(timestamp TEXT, q_type TEXT, question TEXT, answer TEXT)"
+            )
+
+    def append_rows(self, rows):
+        # A fresh connection per batch: the sink is only used from the worker thread
+        with sqlite3.connect(self.path) as conn:
+            conn.executemany("INSERT INTO interactions VALUES (?, ?, ?, ?)", rows)
+
+
+class NullSink:
+    """Discards rows; for benchmarks and offline runs."""
+    enabled = True
+
+    def append_rows(self, rows):
+        pass
+
+
+class InteractionLogger:
+    """
+    Non-blocking interaction logger.
+
+    log_interaction only puts the row on a bounded queue. A background worker
+    sends rows to the sink in batches (LOG_BATCH_SIZE rows or every
+    LOG_FLUSH_INTERVAL seconds). If the sink fails or a call takes longer
+    than LOG_SLOW_SECONDS, batches go to an append-only spool file for
+    LOG_RETRY_SECONDS, and the spool is replayed once the sink recovers.
+
+    Backpressure: if the queue is full, the new row is dropped and counted in
+    `dropped`, so logging never adds latency to a response.
+
+    Pass sink_factory instead of sink to connect (e.g. authenticate to Google
+    Sheets) on the worker thread; rows logged meanwhile wait in the queue.
+    """
+    def __init__(self, sink=None, spool_path=None, sink_factory=None):
+        self.sink = sink
+        self.sink_factory = sink_factory
+        self.connect_seconds = None
+        self.spool_path = spool_path or Config.LOG_SPOOL_PATH
+        self.batch_size = Config.LOG_BATCH_SIZE
+        self.flush_interval = Config.LOG_FLUSH_INTERVAL
+        self.queue = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+
+        self.sent = 0
+        self.spooled = 0
+        self.dropped = 0
+        self._sink_down_until = 0.0
+        self._stop = threading.Event()
+
+        self._worker = threading.Thread(target=self._run, name="interaction-logger", daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
     def log_interaction(self, question, answer, q_type="General"):
-        if not self.sheet:
+        if self.sink is not None and not self.sink.enabled:
             return
 
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
+
         # Prepare the row
         row = [timestamp, q_type, question, answer]
-        
+
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def _connect(self):
+        start = time.monotonic()
+        try:
+            self.sink = self.sink_factory()
+        except Exception as e:
+            print(f"⚠️ Warning: Could not create log sink, logging disabled. Error: {e}")
+            self.sink = NullSink()
+            self.sink.enabled = False
+        self.connect_seconds = round(time.monotonic() - start, 3)
+
+    def _run(self):
+        if self.sink is None:
+            self._connect()
+        while not self._stop.is_set() or not self.queue.empty():
+            batch = self._next_batch()
+            if batch:
+                self._deliver(batch)
+            elif self.sink.enabled and os.path.exists(self.spool_path) and time.time() >= self._sink_down_until:
+                self._replay_spool()
+
+    def _next_batch(self):
+        """Collects rows until the batch is full or the flush interval passes."""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0 or (self._stop.is_set() and self.queue.empty()):
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _send(self, rows):
+        """Sends rows to the sink; returns False (and backs off) if it is down or slow."""
+        if time.time() < self._sink_down_until:
+            return False
+        start = time.monotonic()
         try:
-            # Append the row to the sheet
-            self.sheet.append_row(row)
-            print("📝 Logged to Sheet")
+            self.sink.append_rows(rows)
         except Exception as e:
-            print(f"❌ Logging failed: {e}")
+            print(f"❌ Logging failed, spooling locally: {e}")
+            self._sink_down_until = time.time() + Config.LOG_RETRY_SECONDS
+            return False
+        if time.monotonic() - start > Config.LOG_SLOW_SECONDS:
+            # Delivered, but spool for a while so the queue doesn't back up behind a slow sink
+            self._sink_down_until = time.time() + Config.LOG_RETRY_SECONDS
+        self.sent += len(rows)
+        return True
+
+    def _deliver(self, rows):
+        if not self.sink.enabled:
+            return  # Rows queued while connecting to a sink that turned out unavailable
+        # Older spooled rows go first to keep the log roughly in order
+        if os.path.exists(self.spool_path):
+            self._replay_spool()
+        if os.path.exists(self.spool_path) or not self._send(rows):
+            self._spool(rows)
+
+    def _spool(self, rows):
+        with open(self.spool_path, 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps(row) + "\n" for row in rows)
+        self.spooled += len(rows)
+
+    def _replay_spool(self):
+        """Resends spooled rows; whatever is left stays in the spool file."""
+        if time.time() < self._sink_down_until:
+            return
+        with open(self.spool_path, 'r', encoding='utf-8') as f:
+            rows = []
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # Torn line from a crash
+
+        sent = 0
+        while sent < len(rows) and self._send(rows[sent:sent + self.batch_size]):
+            sent += self.batch_size
+
+        if sent >= len(rows):
+            os.remove(self.spool_path)
+        else:
+            tmp = self.spool_path + ".tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(row) + "\n" for row in rows[sent:])
+            os.replace(tmp, self.spool_path)
+
+    def close(self, timeout=10):
+        """Drains the queue and stops the worker."""
+        self._stop.set()
+        self._worker.join(timeout)
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "sent": self.sent,
+            "spooled": self.spooled,
+            "dropped": self.dropped,
+        }
+
+
+def create_logger(sink=None):
+    """Builds the InteractionLogger for Config.LOG_SINK ("sheets", "file", "sqlite" or "none")."""
+    if sink is None:
+        sinks = {
+            "sheets": GoogleSheetLogger,
+            "file": JsonlFileSink,
+            "sqlite": SQLiteSink,
+            "none": NullSink,
+        }
+        return InteractionLogger(sink_factory=sinks[Config.LOG_SINK])
+    return InteractionLogger(sink)
 
-# Note: Create a Google Sheet named "ScienceBot Logs" and share it with the client_email inside credentials.json
\ No newline at end of file
+# Note: Create a Google Sheet named "ScienceBot Logs" and share it with the client_email inside credentials.json
@@ -0,0 +1,95 @@
+import json
+import threading
+import time
+from collections import defaultdict, deque
+import numpy as np
+from src.config import Config
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullSpan:
+    """Shared no-op span so disabled instrumentation costs one method call."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Metrics:
+    """
+    Rolling in-memory histograms of stage timings and per-request counters.
+    Each series keeps the last METRICS_WINDOW observations.
+    """
+    def __init__(self, enabled=None, window=None):
+        self.enabled = Config.METRICS_ENABLED if enabled is None else enabled
+        window = window or Config.METRICS_WINDOW
+        self.timings = defaultdict(lambda: deque(maxlen=window))
+        self.counters = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def span(self, name):
+        """Context manager that records how long the block took under `name`."""
+        return _Span(self, name) if self.enabled else _NULL_SPAN
+
+    def observe_time(self, name, seconds):
+        if self.enabled:
+            with self._lock:
+                self.timings[name].append(seconds)
+
+    def count(self, name, value):
+        """Records a per-request quantity such as chunks retrieved or prompt size."""
+        if self.enabled:
+            with self._lock:
+                self.counters[name].append(value)
+
+    @staticmethod
+    def _summary(values, scale=1.0):
+        arr = np.asarray(values, dtype=np.float64) * scale
+        return {
+            "count": len(arr),
+            "mean": round(float(arr.mean()), 3),
+            "p50": round(float(np.percentile(arr, 50)), 3),
+            "p95": round(float(np.percentile(arr, 95)), 3),
+            "p99": round(float(np.percentile(arr, 99)), 3),
+            "last": round(float(arr[-1]), 3),
+        }
+
+    def snapshot(self):
+        """Summaries of every series; timings are in milliseconds."""
+        with self._lock:
+            timings = {k: list(v) for k, v in self.timings.items() if v}
+            counters = {k: list(v) for k, v in self.counters.items() if v}
+        return {
+            "timings_ms": {k: self._summary(v, 1000) for k, v in timings.items()},
+            "counters": {k: self._summary(v) for k, v in counters.items()},
+        }
+
+    def to_json(self, extra=None):
+        report = self.snapshot()
+        if extra:
+            report.update(extra)
+        return json.dumps(report, indent=2)
+
+    def reset(self):
+        with self._lock:
+            self.timings.clear()
+            self.counters.clear()
@@ -0,0 +1,110 @@
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from src.config import Config
+
+
+class MicroBatcher:
+    """
+    Collects calls made from many threads into batches. The first waiting item
+    holds the batch open for up to `window` seconds (or until max_size items),
+    then `fn` runs once on the list of items and must return one result per item.
+    Items that arrive while a batch is running form the next batch.
+    """
+    def __init__(self, fn, window=None, max_size=None, name="micro-batcher"):
+        self.fn = fn
+        self.window = Config.MICRO_BATCH_WINDOW if window is None else window
+        self.max_size = max_size or Config.MICRO_BATCH_MAX_SIZE
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.items = 0
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item):
+        future = Future()
+        self.queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        """Blocks until the batch containing item has been processed."""
+        return self.submit(item).result()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    batch.append(self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                results = self.fn([item for item, _ in batch])
+                if len(results) != len(batch):
+                    # zip() would leave the unmatched callers waiting forever
+                    raise RuntimeError(f"{self._worker.name}: {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+            self.batches += 1
+            self.items += len(batch)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+class BatchingVectorStore:
+    """
+    VectorStore proxy for many concurrent users: encode_query and search calls
+    from different threads share one forward pass and one FAISS search per
+    micro-batch. Everything else is passed through to the wrapped store.
+    """
+    def __init__(self, store, window=None, max_size=None):
+        self.store = store
+        self._encoder = MicroBatcher(self._encode_many, window, max_size, name="batch-encode")
+        self._searcher = MicroBatcher(self._search_many, window, max_size, name="batch-search")
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def encode_query(self, query):
+        return self._encoder(query)
+
+    def search(self, query, k=3, query_vector=None, filters=None):
+        if query_vector is None:
+            query_vector = self.encode_query(query)
+        return self._searcher((query_vector[0], k, filters))
+
+    def _encode_many(self, queries):
+        vectors = self.store.encode_queries(queries)
+        return [vectors[i:i + 1] for i in range(len(queries))]
+
+    def _search_many(self, items):
+        # One search per distinct filter at the largest k anyone asked for, then trimmed per caller
+        groups = {}
+        for i, (_, _, filters) in enumerate(items):
+            groups.setdefault(json.dumps(filters, sort_keys=True), []).append(i)
+        results = [None] * len(items)
+        for members in groups.values():
+            k_max = max(items[i][1] for i in members)
+            found = self.store.search_batch(np.stack([items[i][0] for i in members]), k=k_max,
+                                            filters=items[members[0]][2])
+            for i, hits in zip(members, found):
+                results[i] = hits[:items[i][1]]
+        return results
+
+    def batch_stats(self):
+        return {"encode": self._encoder.stats(), "search": self._searcher.stats()}
@@ -0,0 +1,260 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.config import Config
+from src.kg_canonical import lexical_key
+
+# Intents the bank answers
+KINDS = ("Quiz", "Definition")
+# Words around the topic in "give me 5 questions on refraction"
+QUIZ_WORDS = re.compile(
+    r"\b(?:\d+\s+(?=questions?|mcqs?)|give|me|make|create|generate|set|some|few|short|a|an|the|quiz|quizzes|"
+    r"questions?|test|exam|mcqs?|on|about|for|from|of|please)\b"
+)
+# "what is a lens?" / "define refraction" / "meaning of acid"
+DEFINITION_PREFIX = re.compile(
+    r"^(?:please\s+)?(?:what\s+is\s+meant\s+by|what\s+is|what\s+are|what's|define|"
+    r"(?:give\s+)?(?:the\s+)?(?:definition|meaning)\s+of)\s+"
+)
+
+
+def topic_key(query, kind):
+    """The bank key a Quiz / Definition question asks about, e.g. "quiz on Lenses" -> "lens"; None if there is none."""
+    query = query.lower().strip().rstrip("?.! ")
+    if kind == "Quiz":
+        topic = QUIZ_WORDS.sub(" ", query)
+    else:
+        match = DEFINITION_PREFIX.match(query)
+        if match is None:
+            return None
+        topic = query[match.end():]
+    key = lexical_key(" ".join(topic.split()))
+    return key or None
+
+
+def quiz_topics(chunks, pages_per_topic=None):
+    """
+    [(topic, [chunk indexes])] in book order: one topic per chapter; pages
+    outside any chapter are grouped in ranges of QUIZ_BANK_PAGES_PER_TOPIC.
+    """
+    n = pages_per_topic or Config.QUIZ_BANK_PAGES_PER_TOPIC
+    topics = {}
+    for i, chunk in enumerate(chunks):
+        meta = chunk["metadata"]
+        title = meta.get("chapter")
+        if not title:
+            first = (meta["page"] - 1) // n * n + 1
+            title = f"pages {first}-{first + n - 1}"
+        topics.setdefault(lexical_key(title), (title, []))[1].append(i)
+    return list(topics.values())
+
+
+def _split(items, parts):
+    """items in up to `parts` contiguous slices of near-equal length."""
+    parts = max(1, min(parts, len(items)))
+    size, extra = divmod(len(items), parts)
+    slices, start = [], 0
+    for i in range(parts):
+        end = start + size + (i < extra)
+        slices.append(items[start:end])
+        start = end
+    return slices
+
+
+class QuizBank:
+    """
+    SQLite store of pre-generated Quiz sets (several per chapter) and
+    definitions of each book's key KG entities, with the chunks they were
+    generated from and the model that wrote them. Filled by build_bank() /
+    build_quiz_bank.py; the engine answers matching questions from it without
+    retrieval or a Gemini call, rotating through a topic's variants.
+    """
+    def __init__(self, path=None):
+        self.path = path or Config.QUIZ_BANK_PATH
+        self.hits = 0
+        self.misses = 0
+        self._turns = {} # (kind, topic key) -> answers served, for rotation
+        self._lock = threading.Lock()
+
+    def _create(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("PRAGMA journal_mode=WAL") # The engine keeps reading while a build writes
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "book TEXT NOT NULL, kind TEXT NOT NULL, topic TEXT NOT NULL, topic_key TEXT NOT NULL, "
+                "variant INTEGER NOT NULL, text TEXT NOT NULL, source_hash TEXT NOT NULL, "
+                "chunk_ids TEXT NOT NULL, pages TEXT, model TEXT NOT NULL, created_at REAL NOT NULL, "
+                "PRIMARY KEY (book, kind, topic_key, variant))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_topic ON entries (kind, topic_key)")
+
+    def lookup(self, query, kind, book_ids=None):
+        """
+        A banked answer to the question, or None. Quiz topics also match part
+        of a chapter title ("quiz on refraction" -> "reflection and refraction").
+        book_ids limits the answer to those books.
+        """
+        key = topic_key(query, kind) if kind in KINDS else None
+        if key is None or not os.path.exists(self.path):
+            return self._miss()
+        with sqlite3.connect(self.path) as conn:
+            rows = self._rows(conn, kind, key, book_ids)
+            if not rows and kind == "Quiz":
+                keys = [k for (k,) in conn.execute(
+                    "SELECT DISTINCT topic_key FROM entries WHERE kind = ? AND model = ?", (kind, Config.LLM_MODEL)
+                )]
+                partial = [k for k in keys if f" {key} " in f" {k} " or f" {k} " in f" {key} "]
+                for k in sorted(partial, key=lambda k: (abs(len(k) - len(key)), k)):
+                    rows = self._rows(conn, kind, k, book_ids)
+                    if rows:
+                        key = k
+                        break
+            if not rows:
+                return self._miss()
+            with self._lock:
+                turn = self._turns.get((kind, key), 0)
+                self._turns[(kind, key)] = turn + 1
+                self.hits += 1
+            return conn.execute("SELECT text FROM entries WHERE rowid = ?", (rows[turn % len(rows)],)).fetchone()[0]
+
+    @staticmethod
+    def _rows(conn, kind, key, book_ids):
+        rows = conn.execute(
+            "SELECT rowid, book FROM entries WHERE kind = ? AND topic_key = ? AND model = ? ORDER BY book, variant",
+            (kind, key, Config.LLM_MODEL)
+        ).fetchall()
+        return [rowid for rowid, book in rows if book_ids is None or book in book_ids]
+
+    def _miss(self):
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _existing(self, book_ids):
+        """{(book, kind, topic key, variant): source hash} for the given books."""
+        with sqlite3.connect(self.path) as conn:
+            rows = conn.execute(
+                f"SELECT book, kind, topic_key, variant, source_hash FROM entries "
+                f"WHERE book IN ({','.join('?' * len(book_ids))})", list(book_ids)
+            )
+            return {tuple(row[:4]): row[4] for row in rows}
+
+    def _put(self, entry, text):
+        with sqlite3.connect(self.path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (entry["book"], entry["kind"], entry["topic"], entry["topic_key"], entry["variant"], text,
+                 entry["source_hash"], json.dumps(entry["chunk_ids"]), entry["pages"], Config.LLM_MODEL, time.time())
+            )
+
+    def _remove(self, keys):
+        with sqlite3.connect(self.path) as conn:
+            conn.executemany("DELETE FROM entries WHERE book = ? AND kind = ? AND topic_key = ? AND variant = ?", keys)
+
+    def _remove_books_except(self, book_ids):
+        with sqlite3.connect(self.path) as conn:
+            cursor = conn.execute(
+                f"DELETE FROM entries WHERE book NOT IN ({','.join('?' * len(book_ids))})", list(book_ids)
+            )
+            return cursor.rowcount
+
+    def stats(self):
+        entries = {}
+        if os.path.exists(self.path):
+            with sqlite3.connect(self.path) as conn:
+                entries = dict(conn.execute("SELECT kind, COUNT(*) FROM entries GROUP BY kind"))
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+def _entry(book, kind, topic, variant, prompt, chunk_ids, pages):
+    """chunk_ids are the book's own chunk indexes, so adding another book changes no hash."""
+    digest = hashlib.sha256(f"{Config.LLM_MODEL}\0{json.dumps(chunk_ids)}\0".encode('utf-8'))
+    digest.update(prompt.encode('utf-8'))
+    return {"book": book["id"], "kind": kind, "topic": topic, "topic_key": lexical_key(topic), "variant": variant,
+            "prompt": prompt, "source_hash": digest.hexdigest(), "chunk_ids": chunk_ids,
+            "pages": f"{min(pages)}-{max(pages)}" if pages else None}
+
+
+def _quiz_entries(engine, shard, book, variants):
+    """One entry per quiz variant: each variant quizzes a different part of the chapter."""
+    store = engine.vector_store.stores[shard]
+    offset = int(engine.vector_store.offsets[shard])
+    entries = []
+    for topic, indexes in quiz_topics(store.chunks):
+        query = f"Give me a quiz on {topic}"
+        for variant, part in enumerate(_split(indexes, variants)):
+            chunks = [{**store.chunks[i], "id": offset + i} for i in part]
+            context = engine.context_builder.build("Quiz", query, chunks, embeddings=engine.vector_store.embeddings)
+            prompt = engine.build_prompt("Quiz", query, context["context_text"], context["kg_text"])
+            pages = [c["metadata"]["page"] for c in chunks]
+            entries.append(_entry(book, "Quiz", topic, variant, prompt, part, pages))
+    return entries
+
+
+def _definition_entries(engine, shard, book, count):
+    """One entry for each of the book's `count` best-connected KG entities, with the context a live answer would get."""
+    compact = engine.kg.graphs[shard].get_compact_graph()
+    ranked = sorted(zip(compact.node_names, compact.degree.tolist()), key=lambda item: (-item[1], item[0]))
+    offset = int(engine.vector_store.offsets[shard])
+    filters = {"source": book["id"]}
+    entries = []
+    for name, _ in ranked[:count]:
+        query = f"What is {name}?"
+        hits = engine.vector_store.search(query, k=engine.k_for("Definition"), filters=filters)
+        context = engine.retrieve_context(query, "Definition", "hybrid", vector_results=hits, filters=filters)
+        prompt = engine.build_prompt("Definition", query, context["context_text"], context["kg_text"])
+        pages = [hit["metadata"]["page"] for hit in hits]
+        entries.append(_entry(book, "Definition", name, 0, prompt, [hit["id"] - offset for hit in hits], pages))
+    return entries
+
+
+def build_bank(engine, bank=None, book_ids=None, variants=None, definitions=None):
+    """
+    Brings the bank up to date with a ready engine's corpus: generates entries
+    whose prompt (chunks, KG facts, template) or model changed, keeps the rest,
+    and drops topics and books that are gone. book_ids limits the refresh to
+    those books. Returns {"generated", "kept", "removed", "failed"}.
+    """
+    bank = bank or QuizBank()
+    variants = variants or Config.QUIZ_BANK_VARIANTS
+    definitions = Config.QUIZ_BANK_DEFINITIONS if definitions is None else definitions
+    bank._create()
+    shards = [(i, book) for i, book in enumerate(engine.books) if book_ids is None or book["id"] in book_ids]
+
+    entries = []
+    for shard, book in shards:
+        entries += _quiz_entries(engine, shard, book, variants)
+        if definitions:
+            entries += _definition_entries(engine, shard, book, definitions)
+    existing = bank._existing([book["id"] for _, book in shards])
+    wanted = {(e["book"], e["kind"], e["topic_key"], e["variant"]): e for e in entries}
+    todo = [e for key, e in wanted.items() if existing.get(key) != e["source_hash"]]
+    stale = [key for key in existing if key not in wanted]
+    print(f"📝 Quiz bank: {len(wanted)} entries for {len(shards)} book(s) | "
+          f"{len(wanted) - len(todo)} up to date | {len(todo)} to generate | {len(stale)} to remove")
+
+    counts = {"generated": 0, "kept": len(wanted) - len(todo), "removed": 0, "failed": 0}
+    llm = engine.get_llm()
+    with ThreadPoolExecutor(max_workers=Config.QUIZ_BANK_CONCURRENCY) as pool:
+        futures = {pool.submit(llm.generate, e["prompt"], kind="bank", hedge=False): e for e in todo}
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                bank._put(entry, future.result()) # Stored as it arrives, so an interrupted build resumes
+                counts["generated"] += 1
+            except Exception as e:
+                counts["failed"] += 1
+                print(f"⚠️ {entry['kind']} '{entry['topic']}' ({entry['book']}) failed: {e}")
+
+    bank._remove(stale)
+    counts["removed"] = len(stale)
+    if book_ids is None:
+        counts["removed"] += bank._remove_books_except([book["id"] for book in engine.books])
+    return counts
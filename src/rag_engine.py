@@ -1,28 +1,205 @@
-from google import genai
 from src.config import Config
-from src.vector_store import VectorStore
-from src.knowledge_graph import SimpleKnowledgeGraph
-from src.ingestion import PDFIngestor
-from src.logger import GoogleSheetLogger # <--- UPDATED IMPORT
+from src.answer_cache import AnswerCache
+from src.context_builder import ContextBuilder
+from src.corpus import discover_books, select_books, single_book, split_filters
+from src.image_pipeline import ImagePipeline
+from src.logger import create_logger
+from src.metrics import Metrics
+from src.quiz_bank import KINDS as BANK_KINDS, QuizBank
 from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import json
+import threading
+import time
+
+# Parts of the engine that warm up in the background
+COMPONENTS = ("llm", "vector", "kg")
 
 class RAGEngine:
-    def __init__(self):
-        # Initialize Gemini Client
-        self.client = genai.Client(api_key=Config.GEMINI_API_KEY)
-        
-        # Initialize Logger (Google Sheets)
-        self.logger = GoogleSheetLogger() # <--- UPDATED INITIALIZATION
+    def __init__(self, client=None, logger=None, chunks=None, wait=False, micro_batch=False):
+        """
+        client, logger and chunks can be injected for offline runs (fake LLM, null sink, fixture corpus).
+        micro_batch=True shares query encoding and FAISS searches between
+        concurrent callers (see src/micro_batch.py); the query service turns it on.
+        The corpus is every book under CORPUS_DIR (see src/corpus.py), each with
+        its own vector index and KG partition; queries take filters such as
+        {"subject": "physics", "grade": 10} to search only matching books.
+
+        Returns immediately: the Gemini client, vector index and knowledge graph
+        load in background threads (torch, FAISS and genai are only imported
+        there). Use status() / wait_ready() to follow them; wait=True blocks
+        until everything is up. Queries asked earlier use whatever retrieval is
+        ready, e.g. KG-only while the vector index is still loading.
+        """
+        self._created = time.perf_counter()
+        self.startup_phases = {} # Phase name -> seconds
+        self._state = dict.fromkeys(COMPONENTS, "loading")
+        self._state_changed = threading.Condition()
+
+        self.client = client
+        self.llm = None # LLMGateway around the client (see src/llm_gateway.py), shared with the KG build
+        self.micro_batch = micro_batch
+        self.books = [single_book()] if chunks is not None else discover_books()
         
-        # Initialize Data Components
-        self.ingestor = PDFIngestor()
-        self.vector_store = VectorStore()
-        self.kg = SimpleKnowledgeGraph()
+        # Initialize Logger (batched in the background; it connects to Google Sheets on its own thread)
+        self.logger = logger or create_logger()
         
-        # Load Data (Runs only once on startup)
-        chunks = self.ingestor.load_and_chunk()
-        self.vector_store.create_index(chunks)
-        self.kg.build_graph(chunks)
+        # Data Components (filled in by the warm-up threads)
+        self.vector_store = None
+        self.kg = None
+        self.cache = AnswerCache()
+        self.quiz_bank = QuizBank() if Config.QUIZ_BANK_ENABLED else None # Pre-generated quizzes / definitions
+        self.context_builder = ContextBuilder()
+        self.image_pipeline = ImagePipeline()
+        self.metrics = Metrics()
+
+        self._start("llm", self._warm_llm)
+        self._start("vector", self._warm_vectors, chunks)
+        self._start("kg", self._warm_kg)
+        if wait:
+            self.wait_ready()
+
+    # --- Startup / readiness ---
+    def _start(self, name, target, *args):
+        def run():
+            try:
+                target(*args)
+                state = "ready"
+            except Exception as e:
+                state = f"failed: {e}"
+                print(f"❌ Startup of {name} failed: {e}")
+            self.startup_phases[f"{name}_ready"] = round(time.perf_counter() - self._created, 3)
+            with self._state_changed:
+                self._state[name] = state
+                self._state_changed.notify_all()
+            print(f"⏱️ {name} {state} after {self.startup_phases[f'{name}_ready']:.2f}s")
+
+        threading.Thread(target=run, name=f"warmup-{name}", daemon=True).start()
+
+    @contextmanager
+    def _phase(self, name):
+        """Records how long one startup step took."""
+        start = time.perf_counter()
+        yield
+        # Summed when a phase repeats per book
+        self.startup_phases[name] = round(self.startup_phases.get(name, 0) + time.perf_counter() - start, 3)
+
+    def _warm_llm(self):
+        from src.llm_gateway import LLMGateway, create_client
+        if self.client is None:
+            with self._phase("import_genai"):
+                import google.genai # Timed on its own; create_client() then reuses it
+            with self._phase("llm_client"):
+                self.client = create_client()
+        self.llm = LLMGateway(self.client, metrics=self.metrics)
+
+    def _warm_vectors(self, chunks):
+        with self._phase("import_vector_store"):
+            from src.vector_store import VectorStore, compute_index_key
+            from src.ingestion import PDFIngestor
+            from src.corpus import CorpusVectorStore, book_metadata
+        with self._phase("embedding_model"):
+            first = VectorStore()
+            first.embedder.warm() # The query encoder (ONNX needs no torch)
+        # One shard per book, all sharing the embedding model
+        stores = [first] + [VectorStore(embedder=first.embedder) for _ in self.books[1:]]
+
+        for book, store in zip(self.books, stores):
+            if chunks is not None:
+                # Injected fixture corpus: indexed in memory only
+                with self._phase("vector_index_build"):
+                    store.create_index(chunks)
+                continue
+            # Reuse the saved index when the book's PDF, metadata, model and chunking are unchanged
+            index_key = compute_index_key(book["pdf_path"], book_metadata(book))
+            with self._phase("vector_index_load"):
+                loaded = store.load_index(index_key)
+            if not loaded:
+                # Pages stream out of the ingestion pool straight into the encoder
+                print(f"📘 Indexing {book['id']}...")
+                with self._phase("vector_index_build"):
+                    store.create_index(PDFIngestor(book["pdf_path"], book_metadata(book)).iter_chunks())
+                    store.save_index(index_key)
+        store = CorpusVectorStore(self.books, stores)
+        print(f"📚 Corpus: {len(self.books)} book(s), {len(store.chunks)} chunks")
+        if self.micro_batch:
+            from src.micro_batch import BatchingVectorStore
+            store = BatchingVectorStore(store)
+        self.vector_store = store
+
+    def _warm_kg(self):
+        self.wait_ready("llm")
+        with self._phase("import_kg"):
+            from src.knowledge_graph import SimpleKnowledgeGraph
+            from src.corpus import CorpusKnowledgeGraph
+        graphs = []
+        for shard, book in enumerate(self.books):
+            kg = SimpleKnowledgeGraph(llm=self.llm, graph_path=book["kg_path"])
+            with self._phase("kg_load"):
+                loaded = kg.load_graph()
+            if not loaded:
+                # A first build extracts from the book's chunks, so it waits for the vector store
+                if not self.wait_ready("vector"):
+                    raise RuntimeError("no chunks to build the knowledge graph from")
+                kg.embedder = self.vector_store.embedder # Shared for entity canonicalization
+                with self._phase("kg_build"):
+                    kg.build_graph(self.vector_store.stores[shard].chunks)
+            graphs.append(kg)
+        self.kg = CorpusKnowledgeGraph(self.books, graphs)
+
+    def is_ready(self, component):
+        return self._state[component] == "ready"
+
+    def wait_ready(self, *components, timeout=None):
+        """Blocks until the components (default: all) finish warming up; True if all are ready."""
+        components = components or COMPONENTS
+        with self._state_changed:
+            self._state_changed.wait_for(
+                lambda: all(self._state[c] != "loading" for c in components), timeout
+            )
+        return all(self.is_ready(c) for c in components)
+
+    def status(self):
+        """Component -> "loading", "ready" or "failed: ..."."""
+        status = dict(self._state)
+        status["logger"] = "ready" if getattr(self.logger, "sink", True) is not None else "loading"
+        return status
+
+    def startup_report(self):
+        """Seconds per startup phase; "<component>_ready" is measured from engine creation."""
+        phases = dict(self.startup_phases)
+        connect = getattr(self.logger, "connect_seconds", None)
+        if connect is not None:
+            phases["logger_connect"] = connect
+        return {"status": self.status(), "phases_s": phases}
+
+    def _retrieval_mode(self, search_mode):
+        """
+        The search mode to actually run: the requested retrieval if it is ready,
+        otherwise whichever one is. Only blocks if neither has finished loading.
+        """
+        sources = ("vector", "kg")
+        with self._state_changed:
+            self._state_changed.wait_for(
+                lambda: any(self.is_ready(s) for s in sources) or all(self._state[s] != "loading" for s in sources)
+            )
+        wanted = sources if search_mode == "hybrid" else (search_mode,)
+        ready = [s for s in wanted if self.is_ready(s)] or [s for s in sources if self.is_ready(s)]
+        mode = "hybrid" if len(ready) == 2 else (ready[0] if ready else "none")
+        if mode != search_mode:
+            print(f"⏳ {search_mode.upper()} search not ready yet; using {mode.upper()}")
+        return mode
+
+    def get_llm(self):
+        """The LLM gateway, waiting for it if the Gemini client is still being created."""
+        if not self.wait_ready("llm"):
+            raise RuntimeError(f"Gemini client unavailable ({self._state['llm']})")
+        return self.llm
+
+    def _generate_text(self, contents):
+        """One non-streamed Gemini call for internal use (e.g. image captions)."""
+        return self.get_llm().generate(contents, kind="caption")
 
     def route_query(self, query):
         """Decides if the user wants a Quiz or an Explanation."""
@@ -33,35 +210,80 @@ class RAGEngine:
         elif any(w in query for w in ["summary", "summarize"]): return "Summary"
         else: return "General"
 
-    def get_response(self, query, search_mode="hybrid", chat_history=[], image=None):
-        # 1. Route Intent
-        q_type = self.route_query(query)
-        context_text = ""
-        kg_text = ""
-        
-        # 2. Format Chat History (Context Window)
-        history_text = ""
-        for msg in chat_history[-5:]:
-            role = "Student" if msg["role"] == "user" else "Tutor"
-            history_text += f"{role}: {msg['content']}\n"
+    def _uses_history(self, query, q_type, chat_history):
+        """True if earlier turns feed the prompt, which makes the answer uncacheable."""
+        if q_type == "Quiz":
+            return False  # The quiz prompt ignores the conversation
+        previous = chat_history
+        # The web UI appends the current question before calling us
+        if previous and previous[-1]["role"] == "user" and previous[-1]["content"] == query:
+            previous = previous[:-1]
+        return len(previous) > 0
 
-        print(f"\n🔍 SEARCH MODE: {search_mode.upper()} | INTENT: {q_type} | IMAGE: {image is not None}")
+    def k_for(self, q_type):
+        """Chunks to retrieve for an intent (more for quizzes)."""
+        return 10 if q_type == "Quiz" else 3
+
+    @staticmethod
+    def _cache_mode(search_mode, filters):
+        """Answers are cached per search mode and book filter."""
+        return f"{search_mode}|{json.dumps(filters, sort_keys=True)}" if filters else search_mode
+
+    def retrieve_context(self, query, q_type, search_mode, query_vector=None, vector_results=None, history=(),
+                         filters=None):
+        """
+        Retrieves chunks and KG edges from the books matching filters, then packs
+        them (with any history lines) into the intent's token budget. Returns the
+        ContextBuilder result. Pass vector_results to skip the vector search.
+        """
+        chunks = []
+        edges = []
 
-        # 3. Retrieve Context (Fetch MORE for Quizzes)
-        k_val = 10 if q_type == "Quiz" else 3 
-        
         # Only search if there is a substantial text query
         if len(query.strip()) > 2:
             if search_mode in ["vector", "hybrid"]:
-                vector_results = self.vector_store.search(query, k=k_val)
-                context_text = "\n".join([c['text'] for c in vector_results])
+                if vector_results is None:
+                    if query_vector is None:
+                        with self.metrics.span("query_embedding"):
+                            query_vector = self.vector_store.encode_query(query)
+                    with self.metrics.span("vector_search"):
+                        vector_results = self.vector_store.search(
+                            query, k=self.k_for(q_type), query_vector=query_vector, filters=filters
+                        )
+                chunks = vector_results
+                self.metrics.count("chunks_retrieved", len(chunks))
             
             if search_mode in ["kg", "hybrid"]:
-                kg_results = self.kg.get_related_concepts(query)
-                kg_text = "\n".join(kg_results)
+                hops = Config.KG_HYBRID_HOPS if search_mode == "hybrid" else 1
+                with self.metrics.span("kg_lookup"):
+                    edges = self.kg.get_related_edges(query, hops=hops, filters=filters)
+                self.metrics.count("kg_edges", len(edges))
 
-        # 4. Construct Prompt based on Intent (SPLIT LOGIC)
-        
+        # Dedupe, merge and pack under the budget, reusing the stored chunk embeddings
+        embeddings = self.vector_store.embeddings if chunks else None
+        with self.metrics.span("context_build"):
+            context = self.context_builder.build(q_type, query, chunks, edges, history, embeddings)
+        self.metrics.count("context_tokens", context["tokens"])
+        self.metrics.count("tokens_saved", context["tokens_saved"])
+        return context
+
+    def _bank_answer(self, query, q_type, filters=None):
+        """A pre-generated Quiz or Definition answer from the quiz bank, or None."""
+        if self.quiz_bank is None or q_type not in BANK_KINDS:
+            return None
+        book_filters, chunk_filters = split_filters(filters)
+        if chunk_filters:
+            return None # Banked answers cover a whole chapter or book
+        book_ids = {self.books[i]["id"] for i in select_books(self.books, filters)} if book_filters else None
+        try:
+            with self.metrics.span("bank_lookup"):
+                return self.quiz_bank.lookup(query, q_type, book_ids)
+        except Exception as e:
+            print(f"⚠️ Quiz bank lookup failed: {e}")
+            return None
+
+    def build_prompt(self, q_type, query, context_text, kg_text, history_text=""):
+        """Builds the Quiz or Tutor prompt for the intent."""
         if q_type == "Quiz":
             # --- QUIZ MODE PROMPT (Strict Q&A List) ---
             prompt_text = f"""
@@ -112,22 +334,252 @@ class RAGEngine:
             6. **Visuals:** If describing a diagram (like a cell or circuit), break it down step-by-step.
             7. **Tone:** Encouraging and clear.
             """
+        return prompt_text
 
-        # 5. Generate Answer
-        try:
-            content_payload = [prompt_text]
-            if image:
-                content_payload.append(image)
+    def _prepare_request(self, query, search_mode, chat_history, image, filters=None):
+        """Routes, checks the cache, retrieves context and builds the Gemini payload."""
+        # 1. Route Intent (and fall back to the retrieval that has finished loading)
+        q_type = self.route_query(query)
+        search_mode = self._retrieval_mode(search_mode)
 
-            response = self.client.models.generate_content(
-                model=Config.LLM_MODEL,
-                contents=content_payload
-            )
-            answer = response.text
-        except Exception as e:
-            answer = f"Error: {e}"
+        standalone = image is None and not self._uses_history(query, q_type, chat_history)
+        cacheable = Config.CACHE_ENABLED and standalone
+        request = {"q_type": q_type, "mode": self._cache_mode(search_mode, filters), "cacheable": cacheable,
+                   "query_vector": None, "cached": None}
+
+        # 1a. Quiz Bank (pre-generated quizzes and definitions: no retrieval, no Gemini call)
+        if standalone:
+            request["cached"] = self._bank_answer(query, q_type, filters)
+            if request["cached"] is not None:
+                print(f"\n📝 QUIZ BANK HIT | INTENT: {q_type}")
+                return request
+
+        # 1b. Answer Cache (skipped for images and follow-up questions)
+        if cacheable:
+            if len(query.strip()) > 2 and self.is_ready("vector"):
+                with self.metrics.span("query_embedding"):
+                    request["query_vector"] = self.vector_store.encode_query(query)
+            with self.metrics.span("cache_lookup"):
+                request["cached"] = self.cache.get(query, request["mode"], q_type, request["query_vector"])
+            if request["cached"] is not None:
+                print(f"\n⚡ CACHE HIT | INTENT: {q_type}")
+                return request
+        query_vector = request["query_vector"]
+
+        # 1c. Image: downsized once and captioned once (cached by content hash); the caption feeds retrieval
+        retrieval_query = query
+        image_part = None
+        if image is not None:
+            image_part, image_text = self._prepare_image(image)
+            retrieval_query = f"{query} {image_text}".strip()
         
+        # 2. Format Chat History (Context Window; the newest turns that fit the budget are kept)
+        history = []
+        if q_type != "Quiz":
+            for msg in chat_history[-5:]:
+                role = "Student" if msg["role"] == "user" else "Tutor"
+                history.append(f"{role}: {msg['content']}\n")
+
+        print(f"\n🔍 SEARCH MODE: {search_mode.upper()} | INTENT: {q_type} | IMAGE: {image is not None}"
+              f"{f' | FILTER: {filters}' if filters else ''}")
+
+        # 3. Retrieve Context (Fetch MORE for Quizzes), deduped and packed to the intent's token budget
+        context = self.retrieve_context(retrieval_query, q_type, search_mode, query_vector, history=history,
+                                         filters=filters)
+        print(f"✂️ Context: {context['tokens']} tokens ({context['tokens_saved']} saved)")
+
+        # 4. Construct Prompt based on Intent (SPLIT LOGIC)
+        with self.metrics.span("prompt_build"):
+            prompt_text = self.build_prompt(
+                q_type, query, context["context_text"], context["kg_text"], context["history_text"]
+            )
+        self.metrics.count("prompt_chars", len(prompt_text))
+
+        content_payload = [prompt_text]
+        if image_part is not None:
+            content_payload.append(image_part)
+        request["contents"] = content_payload
+        return request
+
+    def _prepare_image(self, image):
+        """Returns (Gemini part, caption and labels as retrieval text) and reports the upload size."""
+        with self.metrics.span("image_prepare"):
+            prepared = self.image_pipeline.prepare(image)
+        artifacts = {}
+        if Config.IMAGE_CAPTIONS:
+            with self.metrics.span("image_caption"):
+                try:
+                    artifacts = self.image_pipeline.artifacts(prepared, self._generate_text)
+                except Exception as e:
+                    print(f"⚠️ Could not caption image: {e}")
+
+        self.metrics.count("image_bytes_out", prepared["bytes_out"])
+        original = ""
+        if prepared["bytes_in"]:
+            self.metrics.count("image_bytes_in", prepared["bytes_in"])
+            original = f"{prepared['bytes_in'] / 1024:.0f} KB -> "
+        width, height = prepared["size"]
+        print(f"🖼️ IMAGE {prepared['hash'][:12]}: {width}x{height}, {original}{prepared['bytes_out'] / 1024:.0f} KB "
+              f"in {prepared['seconds'] * 1000:.0f} ms{' | caption cached' if artifacts.get('cached') else ''}")
+        image_text = " ".join([artifacts.get("caption", ""), *artifacts.get("labels", [])]).strip()
+        return self.image_pipeline.to_part(prepared), image_text
+
+    def _finish_request(self, request, query, answer, ok):
+        """Caches a successful answer and logs the interaction."""
+        if ok and request["cacheable"]:
+            self.cache.put(query, request["mode"], request["q_type"], answer, request["query_vector"])
+
         # 6. Log to Google Sheets
-        self.logger.log_interaction(query, answer, q_type)
-        
-        return answer
\ No newline at end of file
+        with self.metrics.span("logging"):
+            self.logger.log_interaction(query, answer, request["q_type"])
+
+    def get_response(self, query, search_mode="hybrid", chat_history=[], image=None, filters=None):
+        with self.metrics.span("total"):
+            request = self._prepare_request(query, search_mode, chat_history, image, filters)
+            if request["cached"] is not None:
+                self.logger.log_interaction(query, request["cached"], request["q_type"])
+                return request["cached"]
+
+            # 5. Generate Answer
+            ok = False
+            try:
+                with self.metrics.span("llm"):
+                    answer = self.get_llm().generate(request["contents"])
+                ok = True
+            except Exception as e:
+                answer = f"Error: {e}"
+
+            self._finish_request(request, query, answer, ok)
+            return answer
+
+    def get_responses(self, queries, search_mode="hybrid", max_concurrency=None, filters=None):
+        """
+        Answers many independent queries (e.g. a chapter quiz) in stages:
+        one batched encode, one vectorized search, KG lookups, then concurrent
+        Gemini calls. Returns one dict per query, in input order; a failure
+        sets that item's "error" instead of failing the batch.
+        """
+        max_concurrency = max_concurrency or Config.BATCH_MAX_CONCURRENCY
+        search_mode = self._retrieval_mode(search_mode)
+        items = [{"query": q, "q_type": self.route_query(q), "answer": None, "error": None} for q in queries]
+        cache_mode = self._cache_mode(search_mode, filters)
+        requests = [{"q_type": it["q_type"], "mode": cache_mode, "cacheable": Config.CACHE_ENABLED,
+                     "query_vector": None, "cached": None}
+                    for it in items]
+        searchable = [i for i, it in enumerate(items) if len(it["query"].strip()) > 2]
+
+        # 1. Encode every query in one forward pass
+        if searchable and self.is_ready("vector"):
+            try:
+                vectors = self.vector_store.encode_queries([items[i]["query"] for i in searchable])
+                for row, i in enumerate(searchable):
+                    requests[i]["query_vector"] = vectors[row:row + 1]
+            except Exception as e:
+                for i in searchable:
+                    items[i]["error"] = f"Error: {e}"
+
+        # 2. Serve what we can from the quiz bank and the cache
+        for it, request in zip(items, requests):
+            if it["error"] is None:
+                request["cached"] = self._bank_answer(it["query"], it["q_type"], filters)
+            if it["error"] is None and request["cached"] is None and request["cacheable"]:
+                request["cached"] = self.cache.get(it["query"], cache_mode, it["q_type"], request["query_vector"])
+            if request["cached"] is not None:
+                it["answer"] = request["cached"]
+
+        # 3. One vectorized search for the rest (k is the largest any intent needs)
+        pending = [i for i in searchable if items[i]["error"] is None and items[i]["answer"] is None]
+        vector_results = {}
+        if pending and search_mode in ["vector", "hybrid"]:
+            try:
+                k_max = max(self.k_for(items[i]["q_type"]) for i in pending)
+                matrix = [requests[i]["query_vector"][0] for i in pending]
+                for i, results in zip(pending, self.vector_store.search_batch(matrix, k=k_max, filters=filters)):
+                    vector_results[i] = results[:self.k_for(items[i]["q_type"])]
+            except Exception as e:
+                for i in pending:
+                    items[i]["error"] = f"Error: {e}"
+
+        # 4. KG lookups and prompts
+        for i, (it, request) in enumerate(zip(items, requests)):
+            if it["error"] is not None or it["answer"] is not None:
+                continue
+            try:
+                context = self.retrieve_context(
+                    it["query"], it["q_type"], search_mode,
+                    request["query_vector"], vector_results.get(i, []), filters=filters
+                )
+                request["contents"] = [
+                    self.build_prompt(it["q_type"], it["query"], context["context_text"], context["kg_text"])
+                ]
+            except Exception as e:
+                it["error"] = f"Error: {e}"
+
+        # 5. Concurrent Gemini calls
+        def generate(i):
+            with self.metrics.span("llm"):
+                return self.get_llm().generate(requests[i]["contents"])
+
+        todo = [i for i, it in enumerate(items) if it["error"] is None and it["answer"] is None]
+        print(f"\n📚 BATCH: {len(items)} queries | {len(items) - len(todo)} cached or failed | {len(todo)} to generate")
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            futures = {i: pool.submit(generate, i) for i in todo}
+            for i, future in futures.items():
+                try:
+                    items[i]["answer"] = future.result()
+                    self._finish_request(requests[i], items[i]["query"], items[i]["answer"], True)
+                except Exception as e:
+                    items[i]["error"] = f"Error: {e}"
+
+        for it, request in zip(items, requests):
+            if request["cached"] is not None:
+                self.logger.log_interaction(it["query"], it["answer"], it["q_type"])
+        return items
+
+    def stream_response(self, query, search_mode="hybrid", chat_history=[], image=None, filters=None):
+        """Same as get_response, but yields text chunks as Gemini produces them."""
+        start = time.perf_counter()
+        request = self._prepare_request(query, search_mode, chat_history, image, filters)
+        if request["cached"] is not None:
+            # Logged before yielding: a consumer that stops reading never resumes the generator
+            self.metrics.observe_time("total", time.perf_counter() - start)
+            self.logger.log_interaction(query, request["cached"], request["q_type"])
+            yield request["cached"]
+            return
+
+        # 5. Generate Answer (streamed; the gateway holds an LLM slot until the stream ends)
+        parts = []
+        ok = False
+        llm_start = time.perf_counter()
+        try:
+            for text in self.get_llm().stream(request["contents"]):
+                if not parts:
+                    # Per request: the engine is shared between sessions, so no "latest TTFT" attribute
+                    self.metrics.observe_time("llm_first_token", time.perf_counter() - llm_start)
+                    print(f"⏱️ First token after {time.perf_counter() - start:.2f}s")
+                parts.append(text)
+                yield text
+            ok = True
+        except Exception as e:
+            error = f"Error: {e}"
+            parts.append(error)
+            yield error
+        finally:
+            # Runs once the stream is exhausted (or abandoned by the caller)
+            self.metrics.observe_time("llm", time.perf_counter() - llm_start)
+            self._finish_request(request, query, "".join(parts), ok)
+            self.metrics.observe_time("total", time.perf_counter() - start)
+
+    def stats(self):
+        """Stage latencies and counters, plus cache, logger and startup stats, as one dict."""
+        report = self.metrics.snapshot()
+        report["startup"] = self.startup_report()
+        report["cache"] = self.cache.stats()
+        report["logger"] = self.logger.stats()
+        if self.llm is not None:
+            report["llm"] = self.llm.stats()
+        if self.quiz_bank is not None:
+            report["quiz_bank"] = self.quiz_bank.stats()
+        if hasattr(self.vector_store, "batch_stats"):
+            report["micro_batch"] = self.vector_store.batch_stats()
+        return report
@@ -0,0 +1,126 @@
+import base64
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.config import Config
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    JSON API in front of one shared RAGEngine:
+      GET  /health  component status, KG size and the corpus books
+      GET  /stats   RAGEngine.stats()
+      POST /query   {"query", "mode", "history", "image", "filters"} -> {"answer"}
+      POST /stream  same body; answer chunks as NDJSON lines (one JSON string each,
+                    or a final {"error"} object if the answer fails midway)
+      POST /batch   {"queries", "mode", "filters"} -> {"results"}
+    "image" is the base64-encoded image file (ServiceClient sends it already downsized);
+    "filters" selects books, e.g. {"subject": "physics", "grade": 10}.
+    """
+    protocol_version = "HTTP/1.1"
+    engine = None # Set by serve()
+
+    def do_GET(self):
+        if self.path == "/health":
+            kg_nodes = self.engine.kg.num_nodes() if self.engine.is_ready("kg") else None
+            self._send_json({"status": self.engine.status(), "kg_nodes": kg_nodes, "books": self.engine.books})
+        elif self.path == "/stats":
+            self._send_json(self.engine.stats())
+        else:
+            self._send_json({"error": f"unknown path {self.path}"}, 404)
+
+    def do_POST(self):
+        try:
+            body = self._read_json()
+            if self.path == "/query":
+                answer = self.engine.get_response(*self._query_args(body))
+                self._send_json({"answer": answer})
+            elif self.path == "/stream":
+                self._send_stream(self.engine.stream_response(*self._query_args(body)))
+            elif self.path == "/batch":
+                results = self.engine.get_responses(body["queries"], search_mode=body.get("mode", "hybrid"),
+                                                    filters=body.get("filters"))
+                self._send_json({"results": results})
+            else:
+                self._send_json({"error": f"unknown path {self.path}"}, 404)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True # The client is gone; nothing to send
+        except (ValueError, KeyError) as e:
+            self._send_json({"error": f"bad request: {e}"}, 400)
+        except Exception as e:
+            self._send_json({"error": str(e)}, 500)
+
+    def _query_args(self, body):
+        image = base64.b64decode(body["image"]) if body.get("image") else None
+        return body["query"], body.get("mode", "hybrid"), body.get("history", []), image, body.get("filters")
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload, status=200):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, chunks):
+        """
+        Pulls the first chunk before the headers, so retrieval errors still get
+        an error status from do_POST. Once the headers are out, an error ends
+        the body with an {"error"} line; a client that hung up just closes the
+        connection.
+        """
+        chunks = iter(chunks)
+        first = next(chunks, None)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            if first is not None:
+                self._write_chunk(first)
+            for chunk in chunks:
+                self._write_chunk(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+            return
+        except Exception as e:
+            try:
+                self._write_chunk({"error": str(e)})
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+                return
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close() # Lets the engine finish and log the request
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, payload):
+        data = (json.dumps(payload, ensure_ascii=False) + "\n").encode('utf-8')
+        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass # One line per request is too noisy for a classroom burst; see /stats instead
+
+
+def serve(host=None, port=None, engine=None):
+    """Runs the query service until interrupted. Each request gets its own thread."""
+    if engine is None:
+        from src.rag_engine import RAGEngine
+        engine = RAGEngine(micro_batch=True)
+    QueryHandler.engine = engine
+
+    server = ThreadingHTTPServer((host or Config.SERVICE_HOST, port or Config.SERVICE_PORT), QueryHandler)
+    server.daemon_threads = True
+    print(f"✅ ScienceBot service listening on http://{server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        engine.logger.close()
@@ -0,0 +1,123 @@
+import base64
+import http.client
+import json
+import time
+from urllib.parse import urlparse
+from src.config import Config
+from src.image_pipeline import ImagePipeline
+
+
+class ServiceError(Exception):
+    pass
+
+
+class RemoteKG:
+    """The bit of SimpleKnowledgeGraph the UIs read, answered by the service."""
+    def __init__(self, client):
+        self.client = client
+
+    def num_nodes(self):
+        return self.client._request("GET", "/health")["kg_nodes"] or 0
+
+
+class ServiceClient:
+    """
+    Client for the query service (serve.py) with the RAGEngine calls that
+    web_app.py and app.py use, so either can run against a shared server.
+    """
+    remote = True
+
+    def __init__(self, url=None, timeout=None):
+        parsed = urlparse(url or Config.SERVICE_URL)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.timeout = timeout or Config.SERVICE_TIMEOUT
+        self.kg = RemoteKG(self)
+        self.image_pipeline = ImagePipeline()
+        self._books = None
+
+    @property
+    def books(self):
+        """The service's corpus books (fetched once)."""
+        if self._books is None:
+            self._books = self._request("GET", "/health")["books"]
+        return self._books
+
+    def _connect(self, method, path, payload=None):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        if response.status != 200:
+            message = response.read().decode('utf-8', 'replace')
+            conn.close()
+            raise ServiceError(f"{method} {path} failed with {response.status}: {message}")
+        return conn, response
+
+    def _request(self, method, path, payload=None):
+        conn, response = self._connect(method, path, payload)
+        try:
+            return json.loads(response.read())
+        finally:
+            conn.close()
+
+    def _query_payload(self, query, search_mode, chat_history, image, filters):
+        payload = {"query": query, "mode": search_mode, "history": list(chat_history), "filters": filters}
+        if image is not None:
+            # Downsize before upload; the service passes the small JPEG through untouched
+            data = self.image_pipeline.prepare(image)["data"]
+            payload["image"] = base64.b64encode(data).decode('ascii')
+        return payload
+
+    def get_response(self, query, search_mode="hybrid", chat_history=[], image=None, filters=None):
+        payload = self._query_payload(query, search_mode, chat_history, image, filters)
+        return self._request("POST", "/query", payload)["answer"]
+
+    def stream_response(self, query, search_mode="hybrid", chat_history=[], image=None, filters=None):
+        payload = self._query_payload(query, search_mode, chat_history, image, filters)
+        conn, response = self._connect("POST", "/stream", payload)
+        try:
+            for line in response:
+                if line.strip():
+                    chunk = json.loads(line)
+                    # The service reports a failure after the first chunk in-band, like the engine does
+                    yield f"Error: {chunk['error']}" if isinstance(chunk, dict) else chunk
+        finally:
+            conn.close()
+
+    def get_responses(self, queries, search_mode="hybrid", max_concurrency=None, filters=None):
+        payload = {"queries": list(queries), "mode": search_mode, "filters": filters}
+        return self._request("POST", "/batch", payload)["results"]
+
+    def status(self):
+        return self._request("GET", "/health")["status"]
+
+    def is_ready(self, component):
+        return self.status().get(component) == "ready"
+
+    def wait_ready(self, *components, timeout=None):
+        """Polls the service until the components (default: all) are no longer loading."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            status = self.status()
+            names = components or [c for c in status if c != "logger"]
+            if all(status[c] != "loading" for c in names):
+                return all(status[c] == "ready" for c in names)
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.5)
+
+    def stats(self):
+        return self._request("GET", "/stats")
+
+    def startup_report(self):
+        return self.stats()["startup"]
+
+
+def create_engine():
+    """A ServiceClient if SERVICE_URL is set, otherwise an in-process RAGEngine."""
+    if Config.SERVICE_URL:
+        print(f"Using ScienceBot service at {Config.SERVICE_URL}")
+        return ServiceClient()
+    from src.rag_engine import RAGEngine
+    return RAGEngine()
@@ -1,37 +1,277 @@
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from src.config import Config
-import pickle
+from src.embeddings import Embedder
+import hashlib
+import json
 import os
+import shutil
+import time
+
+# Bump when the on-disk layout of a saved index changes
+INDEX_FORMAT_VERSION = 3 # 3: chunks carry book, subject, grade and chapter metadata
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+
+def index_params():
+    """Index type, metric and tuning parameters selected in Config."""
+    if Config.VECTOR_INDEX_TYPE not in INDEX_TYPES:
+        raise ValueError(f"Unknown VECTOR_INDEX_TYPE {Config.VECTOR_INDEX_TYPE!r}; expected one of {INDEX_TYPES}")
+    return {
+        "type": Config.VECTOR_INDEX_TYPE,
+        "metric": Config.VECTOR_METRIC,
+        "nlist": Config.IVF_NLIST,
+        "nprobe": Config.IVF_NPROBE,
+        "hnsw_m": Config.HNSW_M,
+        "ef_construction": Config.HNSW_EF_CONSTRUCTION,
+        "ef_search": Config.HNSW_EF_SEARCH,
+        "pq_m": Config.PQ_M,
+        "pq_nbits": Config.PQ_NBITS,
+    }
+
+
+def compute_index_key(pdf_path=None, metadata=None):
+    """Hashes the PDF, its book metadata, embedding model, chunking and index parameters into an index key."""
+    pdf_path = pdf_path or Config.PDF_PATH
+    digest = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+
+    params = {
+        "format": INDEX_FORMAT_VERSION,
+        "model": Config.EMBEDDING_MODEL,
+        "chunk_size": Config.CHUNK_SIZE,
+        "chunk_overlap": Config.CHUNK_OVERLAP,
+        "index": index_params(),
+        "metadata": metadata or {},
+    }
+    digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def _metric(params):
+    return faiss.METRIC_L2 if params["metric"] == "l2" else faiss.METRIC_INNER_PRODUCT
+
+
+def build_faiss_index(embeddings, params):
+    """
+    Builds the FAISS index described by params from an (n, dim) float32 matrix.
+    Returns (index, params actually used); IVF lists are capped by the data size.
+    """
+    params = dict(params)
+    n, dimension = embeddings.shape
+    metric = _metric(params)
+
+    if params["type"] != "flat" and n < Config.ANN_MIN_VECTORS:
+        print(f"Only {n} vectors; using an exact index instead of {params['type']}.")
+        params["type"] = "flat"
+
+    if params["type"] == "flat":
+        index = faiss.IndexFlat(dimension, metric)
+    elif params["type"] == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, params["hnsw_m"], metric)
+        index.hnsw.efConstruction = params["ef_construction"]
+    else:
+        # FAISS wants roughly 39 training points per list
+        params["nlist"] = max(1, min(params["nlist"], n // 39))
+        quantizer = faiss.IndexFlat(dimension, metric)
+        if params["type"] == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dimension, params["nlist"], metric)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dimension, params["nlist"], params["pq_m"], params["pq_nbits"], metric)
+        index.train(embeddings)
+
+    index.add(embeddings)
+    apply_search_params(index, params)
+    return index, params
+
+
+def apply_search_params(index, params):
+    """Sets query-time knobs (nprobe / efSearch) that FAISS does not persist."""
+    space = faiss.ParameterSpace()
+    if params["type"] in ("ivf_flat", "ivf_pq"):
+        space.set_index_parameter(index, "nprobe", min(params["nprobe"], params["nlist"]))
+    elif params["type"] == "hnsw":
+        space.set_index_parameter(index, "efSearch", params["ef_search"])
+
+
+def evaluate_index(index, embeddings, params, query_vectors=None, k=10):
+    """
+    Recall@k of an index against exact search over the same embeddings,
+    plus single-query p50/p99 latency in milliseconds.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    if query_vectors is None:
+        rng = np.random.default_rng(0)
+        sample = rng.choice(len(embeddings), size=min(200, len(embeddings)), replace=False)
+        query_vectors = embeddings[sample]
+
+    exact = faiss.IndexFlat(embeddings.shape[1], _metric(params))
+    exact.add(embeddings)
+    _, truth = exact.search(query_vectors, k)
+
+    latencies = []
+    hits = 0
+    for i in range(len(query_vectors)):
+        start = time.perf_counter()
+        _, found = index.search(query_vectors[i:i + 1], k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(found[0].tolist()) & set(truth[i].tolist()))
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "index": params["type"],
+        "queries": len(query_vectors),
+        f"recall@{k}": hits / (k * len(query_vectors)),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+    }
+
 
 class VectorStore:
-    def __init__(self):
-        self.model = SentenceTransformer(Config.EMBEDDING_MODEL)
+    def __init__(self, embedder=None):
+        """Pass embedder to share one embedding model between shards."""
+        # Loads nothing yet; torch is only imported if this store has to encode with it
+        self.embedder = embedder or Embedder()
         self.index = None
         self.chunks = [] # To store the actual text corresponding to vectors
+        self.embeddings = None
+        self.index_dir = Config.VECTOR_DB_PATH
+        self.params = index_params()
+
+    @property
+    def model(self):
+        return self.embedder.model
+
+    @property
+    def normalize(self):
+        return self.params["metric"] != "l2"
+
+    def _normalized(self, embeddings):
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+        if self.normalize:
+            faiss.normalize_L2(embeddings)
+        return embeddings
+
+    def _encode(self, texts):
+        """Query embeddings (see Config.QUERY_ENCODER)."""
+        return self._normalized(self.embedder.encode_queries(texts))
 
     def create_index(self, chunks):
-        """Creates FAISS index from text chunks."""
+        """Creates FAISS index from text chunks (a list or a streaming iterator)."""
         print("Generating embeddings (this might take a moment on M3)...")
-        texts = [c['text'] for c in chunks]
-        embeddings = self.model.encode(texts, convert_to_numpy=True)
-        
-        # FAISS setup
-        dimension = embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(dimension)
-        self.index.add(embeddings)
-        self.chunks = chunks
-        
-        print("Vector Database built successfully.")
-
-    def search(self, query, k=3):
-        """Returns top k relevant chunks."""
-        query_vector = self.model.encode([query], convert_to_numpy=True)
+        self.params = index_params()
+        self.chunks = []
+        dimension = self.embedder.dimension()
+        # A flat index can be filled while chunks stream in; trained ones need every vector first
+        streaming = self.params["type"] == "flat"
+        self.index = faiss.IndexFlat(dimension, _metric(self.params)) if streaming else None
+        parts = []
+
+        # Encode window by window (length-sorted, across worker processes) while PDF extraction continues
+        for window, embeddings in self.embedder.iter_encode(chunks):
+            embeddings = self._normalized(embeddings)
+            if self.index is not None:
+                self.index.add(embeddings)
+            self.chunks.extend(window)
+            parts.append(embeddings)
+
+        self.embeddings = np.vstack(parts) if parts else np.zeros((0, dimension), dtype='float32')
+        if not streaming:
+            self.index, self.params = build_faiss_index(self.embeddings, self.params)
+
+        print(f"Vector Database built successfully ({len(self.chunks)} chunks, {self.params['type']}).")
+
+    def save_index(self, key):
+        """Writes index, embeddings and chunk metadata to VECTOR_DB_PATH/<key>."""
+        target = os.path.join(self.index_dir, key)
+        staging = f"{target}.tmp-{os.getpid()}"
+        os.makedirs(staging, exist_ok=True)
+
+        faiss.write_index(self.index, os.path.join(staging, "index.faiss"))
+        np.save(os.path.join(staging, "embeddings.npy"), self.embeddings)
+        with open(os.path.join(staging, "chunks.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.chunks, f)
+        with open(os.path.join(staging, "manifest.json"), 'w', encoding='utf-8') as f:
+            json.dump({
+                "format": INDEX_FORMAT_VERSION,
+                "key": key,
+                "model": Config.EMBEDDING_MODEL,
+                "count": len(self.chunks),
+                "dimension": int(self.embeddings.shape[1]),
+                "index": self.params,
+            }, f, indent=2)
+
+        # Swap the finished directory in so readers never see a half-written index
+        if os.path.exists(target):
+            shutil.rmtree(staging)
+            print(f"Vector index {key} already saved by another process.")
+            return
+        os.replace(staging, target)
+        print(f"Vector index saved to {target}")
+
+    def load_index(self, key):
+        """Memory-maps a saved index if one exists for this key."""
+        target = os.path.join(self.index_dir, key)
+        manifest_path = os.path.join(target, "manifest.json")
+        if not os.path.exists(manifest_path):
+            return False
+
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("format") != INDEX_FORMAT_VERSION:
+            return False
+
+        print(f"Loading Vector index from {target}...")
+        self.params = manifest["index"]
+        self.index = self._read_index(os.path.join(target, "index.faiss"))
+        apply_search_params(self.index, self.params)
+        # mmap keeps one copy of the matrix in the page cache for every worker
+        self.embeddings = np.load(os.path.join(target, "embeddings.npy"), mmap_mode='r')
+        with open(os.path.join(target, "chunks.json"), 'r', encoding='utf-8') as f:
+            self.chunks = json.load(f)
+        return True
+
+    def _read_index(self, path):
+        """Reads a FAISS index, memory-mapped where this FAISS build supports it."""
+        mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        try:
+            return faiss.read_index(path, mmap_flag | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            return faiss.read_index(path)
+
+    def encode_query(self, query):
+        """Embeds a single query as a (1, dim) float32 array."""
+        return self._encode([query])
+
+    def encode_queries(self, queries):
+        """Embeds many queries in one batched forward pass."""
+        return self._encode(list(queries))
+
+    def _result(self, idx):
+        """A search hit: the chunk plus its row "id" in the index and embedding matrix."""
+        return {**self.chunks[idx], "id": int(idx)}
+
+    def search_batch(self, query_vectors, k=3):
+        """One vectorized FAISS search; returns a list of top-k chunk lists."""
+        distances, indices = self.index.search(np.ascontiguousarray(query_vectors, dtype='float32'), k)
+        return [[self._result(idx) for idx in row if idx != -1] for row in indices]
+
+    def search(self, query, k=3, query_vector=None):
+        """Returns top k relevant chunks. Pass query_vector to reuse an existing embedding."""
+        if query_vector is None:
+            query_vector = self.encode_query(query)
         distances, indices = self.index.search(query_vector, k)
-        
+
         results = []
         for i, idx in enumerate(indices[0]):
             if idx != -1:
-                results.append(self.chunks[idx])
-        return results
\ No newline at end of file
+                results.append(self._result(idx))
+        return results
+
+    def evaluate(self, queries=None, k=10):
+        """Recall@k and latency of the loaded index; queries default to stored chunk vectors."""
+        query_vectors = self._encode(list(queries)) if queries is not None else None
+        return evaluate_index(self.index, self.embeddings, self.params, query_vectors, k)
@@ -1,9 +1,9 @@
 import streamlit as st
-import time
-from pyvis.network import Network
 import streamlit.components.v1 as components
-from src.rag_engine import RAGEngine
-import tempfile
+from src.config import Config
+from src.graph_viz import GraphVisualizer
+from src.service_client import create_engine
+import json
 from PIL import Image
 import os
 
@@ -27,6 +27,16 @@ else:
 
 STUDENT_AVATAR = "🧑‍🎓"
 
+# --- INITIALIZE ENGINE ---
+@st.cache_resource
+def load_engine():
+    # Returns at once; the index and graph keep loading in the background.
+    # With SCIENCEBOT_SERVICE_URL set, this is a client of the shared query service (serve.py).
+    return create_engine()
+
+if "engine" not in st.session_state:
+    st.session_state.engine = load_engine()
+
 # --- SIDEBAR SETTINGS ---
 with st.sidebar:
     # Display Teacher Image in Sidebar
@@ -46,6 +56,21 @@ with st.sidebar:
     
     mode_map = {"Hybrid (Best)": "hybrid", "Vector Only": "vector", "Knowledge Graph Only": "kg"}
     selected_mode = mode_map[mode]
+
+    # 1b. Book Filter (only when the corpus has more than one book)
+    filters = None
+    books = st.session_state.engine.books
+    if len(books) > 1:
+        subjects = sorted({b["subject"] for b in books})
+        grades = sorted({b["grade"] for b in books})
+        chosen_subjects = st.multiselect("Subjects", subjects, default=subjects)
+        chosen_grades = st.multiselect("Grades", grades, default=grades)
+        filters = {}
+        if set(chosen_subjects) != set(subjects):
+            filters["subject"] = chosen_subjects
+        if set(chosen_grades) != set(grades):
+            filters["grade"] = chosen_grades
+        filters = filters or None
     
     st.divider()
     
@@ -54,7 +79,9 @@ with st.sidebar:
     uploaded_file = st.file_uploader("Upload a diagram or question", type=["jpg", "png", "jpeg"])
     
     image_input = None
+    image_bytes = None
     if uploaded_file:
+        image_bytes = uploaded_file.getvalue() # Sent as-is; the engine downsizes and caches it by hash
         image_input = Image.open(uploaded_file)
         st.image(image_input, caption="Uploaded Image", use_container_width=True)
         st.caption("Image will be sent with your next question.")
@@ -64,41 +91,38 @@ with st.sidebar:
     # 3. Stats
     st.markdown("### 📊 System Status")
     if "engine" in st.session_state:
-        node_count = st.session_state.engine.kg.graph.number_of_nodes()
-        st.metric("KG Nodes", node_count)
+        engine = st.session_state.engine
+        icons = {"ready": "✅", "loading": "⏳"}
+        for component, state in engine.status().items():
+            st.caption(f"{icons.get(state, '❌')} {component}: {state}")
+        if engine.is_ready("kg"):
+            node_count = engine.kg.num_nodes()
+            st.metric("KG Nodes", node_count)
+        with st.expander("Startup time (s)"):
+            st.json(engine.startup_report()["phases_s"])
+
+        # Per-stage latency (rolling window of recent requests)
+        stats = engine.stats()
+        if stats["timings_ms"]:
+            st.caption("Stage latency (ms)")
+            st.table({
+                stage: {"p50": t["p50"], "p95": t["p95"], "n": t["count"]}
+                for stage, t in stats["timings_ms"].items()
+            })
+        st.download_button(
+            "Export stats (JSON)",
+            data=json.dumps(stats, indent=2),
+            file_name="sciencebot_stats.json",
+            mime="application/json"
+        )
     
     st.caption("Running on: MacBook M3")
 
-# --- INITIALIZE ENGINE ---
+# --- VISUALIZATION ---
 @st.cache_resource
-def load_engine():
-    return RAGEngine()
-
-if "engine" not in st.session_state:
-    with st.spinner("🧠 Loading Textbook & Building Graph..."):
-        st.session_state.engine = load_engine()
-        st.success("System Ready!")
-
-# --- VISUALIZATION FUNCTION ---
-def visualize_graph(engine):
-    net = Network(height="600px", width="100%", bgcolor="#222222", font_color="white", directed=True)
-    if engine.kg.graph.number_of_nodes() > 100:
-        degrees = dict(engine.kg.graph.degree())
-        top_nodes = sorted(degrees, key=degrees.get, reverse=True)[:100]
-        G_sub = engine.kg.graph.subgraph(top_nodes)
-        net.from_nx(G_sub)
-    else:
-        net.from_nx(engine.kg.graph)
-    
-    net.repulsion(node_distance=120, central_gravity=0.33, spring_length=110, spring_strength=0.10, damping=0.95)
-    try:
-        path = tempfile.gettempdir() + "/knowledge_graph.html"
-        net.save_graph(path)
-        with open(path, 'r', encoding='utf-8') as f:
-            source_code = f.read()
-        return source_code
-    except Exception as e:
-        return None
+def load_visualizer():
+    # Shared by every session; pages are cached by graph version and focus
+    return GraphVisualizer()
 
 # --- MAIN INTERFACE ---
 st.title("🔬 10th Standard Science Chatbot")
@@ -127,22 +151,24 @@ with tab1:
 
         # Generate Response
         with st.chat_message("assistant", avatar=TEACHER_AVATAR):
+            if selected_mode != "kg" and not st.session_state.engine.is_ready("vector"):
+                st.caption("⏳ Textbook index still loading; answering from the Knowledge Graph for now.")
             message_placeholder = st.empty()
             full_response = ""
             
             with st.spinner("Thinking..."):
-                # Call engine with Image (if uploaded)
-                response = st.session_state.engine.get_response(
+                # Call engine with Image (if uploaded); chunks render as Gemini produces them
+                stream = st.session_state.engine.stream_response(
                     prompt, 
                     search_mode=selected_mode,
                     chat_history=st.session_state.messages,
-                    image=image_input
+                    image=image_bytes,
+                    filters=filters
                 )
                 
                 # Streaming Output
-                for chunk in response.split():
-                    full_response += chunk + " "
-                    time.sleep(0.02) 
+                for chunk in stream:
+                    full_response += chunk
                     message_placeholder.markdown(full_response + "▌")
                 
                 message_placeholder.markdown(full_response)
@@ -153,8 +179,27 @@ with tab1:
 # === TAB 2: VISUALIZATION ===
 with tab2:
     st.header("Interactive Knowledge Graph")
-    if st.button("Generate Graph Visualization"):
-        with st.spinner("Rendering Physics..."):
-            html_data = visualize_graph(st.session_state.engine)
-            if html_data:
-                components.html(html_data, height=650, scrolling=True)
\ No newline at end of file
+    if getattr(st.session_state.engine, "remote", False):
+        st.info("The graph view needs the engine in this process; it is not available through the query service.")
+    elif not st.session_state.engine.is_ready("kg"):
+        st.info("⏳ The Knowledge Graph is still loading. Check back in a moment.")
+    else:
+        questions = [m["content"] for m in st.session_state.get("messages", []) if m["role"] == "user"]
+        view = st.radio(
+            "View",
+            ["Concepts in my last question", "Most connected concepts"] if questions else ["Most connected concepts"],
+            horizontal=True
+        )
+        if st.button("Generate Graph Visualization"):
+            focus = questions[-1] if view.startswith("Concepts") else None
+            with st.spinner("Rendering graph..."):
+                rendered = load_visualizer().render(st.session_state.engine.kg, focus, hops=Config.VIZ_FOCUS_HOPS)
+            if rendered["html"]:
+                components.html(rendered["html"], height=650, scrolling=True)
+                timing = "cached" if rendered["cached"] else f"rendered in {rendered['seconds'] * 1000:.0f} ms"
+                st.caption(
+                    f"{rendered['nodes']} concepts, {rendered['edges']} links, "
+                    f"{rendered['bytes'] / 1024:.0f} KB, {timing}"
+                )
+            else:
+                st.info("No concepts from your last question were found in the Knowledge Graph.")
\ No newline at end of file